@@ -25,5 +25,6 @@ from slixmpp.xmlstream.matcher import *
 from slixmpp.basexmpp import BaseXMPP
 from slixmpp.clientxmpp import ClientXMPP
 from slixmpp.componentxmpp import ComponentXMPP
+from slixmpp.pool import ConnectionPool
 
 from slixmpp.version import __version__, __version_info__
@@ -14,6 +14,7 @@ from slixmpp.jid import JID
 from slixmpp.stanza import StreamFeatures, Iq
 from slixmpp.basexmpp import BaseXMPP
 from slixmpp.exceptions import XMPPError
+from slixmpp.util.sasl.mechanisms import clear_scram_keys
 from slixmpp.types import JidStr
 from slixmpp.xmlstream import XMLStream
 from slixmpp.xmlstream.stanzabase import StanzaBase
@@ -135,6 +136,10 @@ class ClientXMPP(BaseXMPP):
 
     @password.setter
     def password(self, value: str) -> None:
+        old = self.credentials.get('password')
+        if old and old != value:
+            # Forget the SCRAM keys derived from the old password.
+            clear_scram_keys(old)
         self.credentials['password'] = value
 
     def connect(self, address: Optional[Tuple[str, int]] = None,  # type: ignore
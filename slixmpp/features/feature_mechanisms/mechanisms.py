@@ -11,7 +11,7 @@ from slixmpp.stanza import StreamFeatures
 from slixmpp.xmlstream import register_stanza_plugin
 from slixmpp.plugins import BasePlugin
 from slixmpp.xmlstream.matcher import MatchXPath
-from slixmpp.xmlstream.handler import Callback
+from slixmpp.xmlstream.handler import Callback, CoroutineCallback
 from slixmpp.features.feature_mechanisms import stanza
 
 from typing import ClassVar, Set
@@ -75,9 +75,9 @@ class FeatureMechanisms(BasePlugin):
                          self._handle_fail,
                          instream=True))
         self.xmpp.register_handler(
-                Callback('SASL Challenge',
-                         MatchXPath(stanza.Challenge.tag_name()),
-                         self._handle_challenge))
+                CoroutineCallback('SASL Challenge',
+                                  MatchXPath(stanza.Challenge.tag_name()),
+                                  self._handle_challenge))
 
         self.xmpp.register_feature('mechanisms',
                 self._handle_sasl_auth,
@@ -198,11 +198,17 @@ class FeatureMechanisms(BasePlugin):
 
         return True
 
-    def _handle_challenge(self, stanza):
+    async def _handle_challenge(self, stanza):
         """SASL challenge received. Process and send response."""
         resp = self.stanza.Response(self.xmpp)
         try:
-            resp['value'] = self.mech.process(stanza['value'])
+            if self.mech.cpu_bound:
+                # Deriving the SCRAM keys may take a while.
+                resp['value'] = await self.xmpp.run_in_executor(
+                    self.mech.process, stanza['value'],
+                )
+            else:
+                resp['value'] = self.mech.process(stanza['value'])
         except sasl.SASLCancelled:
             self.stanza.Abort(self.xmpp).send()
         except sasl.SASLMutualAuthFailed:
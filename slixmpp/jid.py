@@ -13,6 +13,7 @@ import socket
 from functools import lru_cache
 from typing import (
     Optional,
+    Tuple,
     Union,
 )
 
@@ -44,8 +45,11 @@ JID_UNESCAPE_TRANSFORMATIONS = {'\\20': ' ',
                                 '\\5c': '\\'}
 
 
-# TODO: Find the best cache size for a standard usage.
-@lru_cache(maxsize=1024)
+#: The default number of parsed JIDs kept in cache, see
+#: :func:`set_cache_size`.
+DEFAULT_CACHE_SIZE = 1024
+
+
 def _parse_jid(data: str):
     """
     Parse string data into the node, domain, and resource
@@ -70,6 +74,44 @@ def _parse_jid(data: str):
     return node, domain, resource
 
 
+def _split_jid(data: str) -> Tuple[str, str, str, str, str]:
+    """
+    Parse string data into the node, domain, resource, bare and full
+    forms of a JID.
+
+    :raises InvalidJID:
+    """
+    node, domain, resource = _parse_jid(data)
+    bare = node + '@' + domain if node else domain
+    full = bare + '/' + resource if resource else bare
+    return node, domain, resource, bare, full
+
+
+_cached_split_jid = lru_cache(maxsize=DEFAULT_CACHE_SIZE)(_split_jid)
+
+
+def set_cache_size(maxsize: Optional[int]) -> None:
+    """Set the number of parsed JID strings kept in cache.
+
+    JIDs created from the same string share the same component
+    strings, and only the first one goes through stringprep.
+    Applications seeing many distinct addresses, like components,
+    benefit from a larger cache. The current cache is discarded.
+
+    :param maxsize: The number of cached JID strings, ``0`` to disable
+                    the cache, or ``None`` for no limit.
+    """
+    global _cached_split_jid
+    _cached_split_jid = lru_cache(maxsize=maxsize)(_split_jid)
+
+
+def cache_info():
+    """Return the statistics of the JID cache, as a
+    :func:`functools.lru_cache` ``CacheInfo`` tuple of
+    hits, misses, maxsize and currsize."""
+    return _cached_split_jid.cache_info()
+
+
 def _validate_node(node: Optional[str]):
     """Validate the local, or username, portion of a JID.
 
@@ -318,12 +360,14 @@ class JID:
             self._full = ''
             return
         elif not isinstance(jid, JID):
-            self._node, self._domain, self._resource = _parse_jid(jid)
+            (self._node, self._domain, self._resource,
+             self._bare, self._full) = _cached_split_jid(jid)
         else:
             self._node = jid._node
             self._domain = jid._domain
             self._resource = jid._resource
-        self._update_bare_full()
+            self._bare = jid._bare
+            self._full = jid._full
 
     def unescape(self):
         """Return an unescaped JID object.
@@ -356,7 +400,7 @@ class JID:
 
     @bare.setter
     def bare(self, value: str):
-        node, domain, resource = _parse_jid(value)
+        node, domain, resource, _, _ = _cached_split_jid(value)
         assert not resource
         self._node = node
         self._domain = domain
@@ -396,8 +440,8 @@ class JID:
 
     @full.setter
     def full(self, value: str):
-        self._node, self._domain, self._resource = _parse_jid(value)
-        self._update_bare_full()
+        (self._node, self._domain, self._resource,
+         self._bare, self._full) = _cached_split_jid(value)
 
     user = node
     local = node
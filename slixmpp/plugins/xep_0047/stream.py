@@ -66,7 +66,7 @@ class IBBytestream(object):
             msg['ibb_data']['sid'] = self.sid
             msg['ibb_data']['seq'] = seq
             msg['ibb_data']['data'] = data
-            msg.send()
+            msg.send(lane='bulk')
         else:
             iq = self.xmpp.Iq()
             iq['type'] = 'set'
@@ -75,7 +75,7 @@ class IBBytestream(object):
             iq['ibb_data']['sid'] = self.sid
             iq['ibb_data']['seq'] = seq
             iq['ibb_data']['data'] = data
-            await iq.send(timeout=timeout)
+            await iq.send(timeout=timeout, lane='bulk')
         return len(data)
 
     async def sendall(self, data: bytes, timeout: Optional[int] = None):
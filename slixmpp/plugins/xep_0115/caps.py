@@ -40,6 +40,9 @@ class XEP_0115(BasePlugin):
         'caps_node': None,
         'broadcast': True,
         'cache': None,
+        # Verification strings longer than this are hashed in the
+        # executor of the stream.
+        'offload_size': 64 * 1024,
     }
 
     def plugin_init(self):
@@ -228,7 +231,7 @@ class XEP_0115(BasePlugin):
                 log.debug("No FORM_TYPE found, ignoring form for caps")
                 caps.xml.remove(stanza.xml)
 
-        verstring = self.generate_verstring(caps, hash)
+        verstring = await self.generate_verstring_async(caps, hash)
         if verstring != check_verstring:
             log.debug("Verification strings do not match: %s, %s" % (
                 verstring, check_verstring))
@@ -241,7 +244,26 @@ class XEP_0115(BasePlugin):
         hash = self.hashes.get(hash, None)
         if hash is None:
             return None
+        return self._hash_verstring(hash, self._verstring_input(info))
 
+    async def generate_verstring_async(self, info, hash):
+        """Same as generate_verstring, without blocking the event loop
+        on disco info larger than the ``offload_size`` setting."""
+        hash = self.hashes.get(hash, None)
+        if hash is None:
+            return None
+        data = self._verstring_input(info)
+        if len(data) <= self.offload_size:
+            return self._hash_verstring(hash, data)
+        return await self.xmpp.run_in_executor(self._hash_verstring,
+                                               hash, data)
+
+    @staticmethod
+    def _hash_verstring(hash, data):
+        binary = hash(data).digest()
+        return base64.b64encode(binary).decode('utf-8')
+
+    def _verstring_input(self, info):
         S = ''
 
         # Convert None to '' in the identities
@@ -283,8 +305,7 @@ class XEP_0115(BasePlugin):
                             vals = [vals]
                         S += '<'.join(sorted(vals)) + '<'
 
-        binary = hash(S.encode('utf8')).digest()
-        return base64.b64encode(binary).decode('utf-8')
+        return S.encode('utf8')
 
     async def update_caps(self, jid: OptJidStr = None,
                           node: Optional[str] = None,
@@ -301,7 +322,7 @@ class XEP_0115(BasePlugin):
             info = await self.xmpp['xep_0030'].get_info(jid, node, local=True)
             if isinstance(info, Iq):
                 info = info['disco_info']
-            ver = self.generate_verstring(info, self.hash)
+            ver = await self.generate_verstring_async(info, self.hash)
             await self.xmpp['xep_0030'].set_info(
                 jid=jid,
                 node='%s#%s' % (self.caps_node, ver),
@@ -11,6 +11,7 @@ from slixmpp.plugins.xep_0198.stanza import Failed
 from slixmpp.plugins.xep_0198.stanza import StreamManagement
 from slixmpp.plugins.xep_0198.stanza import Ack, RequestAck
 
+from slixmpp.plugins.xep_0198.queue import UnackedQueue
 from slixmpp.plugins.xep_0198.stream_management import XEP_0198
 
 
@@ -0,0 +1,183 @@
+# Slixmpp: The Slick XMPP Library
+# Copyright (C) 2012 Nathanael C. Fritz, Lance J.T. Stout
+# This file is part of Slixmpp.
+# See the file LICENSE for copying permission.
+from __future__ import annotations
+
+import collections
+import tempfile
+
+from typing import (
+    Deque,
+    IO,
+    Iterator,
+    Optional,
+)
+
+
+class UnackedQueue:
+
+    """
+    The outgoing stanzas which were not acked by the server yet, in
+    the order they were sent, stored as the serialized bytes written
+    to the stream.
+
+    The oldest stanzas may be moved to a temporary file with
+    :meth:`spill`, or forgotten with :meth:`drop`, so that the memory
+    used stays bounded when the server is slow to ack. Forgotten
+    stanzas are still counted, so that acks stay in sync with the
+    server, but they are ``None`` when popped or iterated over.
+
+    Once the acked stanzas make up more than half of the temporary
+    file, and more than ``compact_size`` bytes, the remaining ones are
+    moved to its start, so that it does not grow for as long as the
+    server is slow to ack.
+
+    :param spill_dir: The directory of the temporary file, defaults to
+                      the directory chosen by :mod:`tempfile`.
+    :param compact_size: The size, in bytes, of acked stanzas from which
+                         the temporary file may be compacted.
+    """
+
+    def __init__(self, spill_dir: Optional[str] = None,
+                 compact_size: int = 65536):
+        self.spill_dir = spill_dir
+        self.compact_size = compact_size
+        #: The number of forgotten stanzas, which are the oldest ones.
+        self.dropped = 0
+        self._spilled: Deque[int] = collections.deque()
+        self._spilled_size = 0
+        self._file: Optional[IO[bytes]] = None
+        self._read_pos = 0
+        self._memory: Deque[bytes] = collections.deque()
+        self._memory_size = 0
+
+    def __len__(self) -> int:
+        return self.dropped + len(self._spilled) + len(self._memory)
+
+    def __iter__(self) -> Iterator[Optional[bytes]]:
+        """Iterate over the stanzas, from the oldest, reading the
+        spilled ones from the disk."""
+        for _ in range(self.dropped):
+            yield None
+        if self._spilled:
+            assert self._file is not None
+            self._file.seek(self._read_pos)
+            for length in list(self._spilled):
+                yield self._file.read(length)
+        yield from list(self._memory)
+
+    @property
+    def memory_count(self) -> int:
+        """The number of stanzas kept in memory."""
+        return len(self._memory)
+
+    @property
+    def memory_size(self) -> int:
+        """The size, in bytes, of the stanzas kept in memory."""
+        return self._memory_size
+
+    @property
+    def spilled_count(self) -> int:
+        """The number of stanzas moved to the disk."""
+        return len(self._spilled)
+
+    @property
+    def spilled_size(self) -> int:
+        """The size, in bytes, of the stanzas moved to the disk."""
+        return self._spilled_size
+
+    def append(self, data: bytes) -> None:
+        """Add a stanza which was just sent."""
+        self._memory.append(data)
+        self._memory_size += len(data)
+
+    def popleft(self, read: bool = True) -> Optional[bytes]:
+        """Remove the oldest stanza, which was acked, and return it.
+
+        :param read: If ``False``, return ``None`` instead of reading
+                     a spilled stanza from the disk.
+        :raises IndexError: If the queue is empty.
+        """
+        if self.dropped:
+            self.dropped -= 1
+            return None
+        if self._spilled:
+            return self._pop_spilled(read)
+        data = self._memory.popleft()
+        self._memory_size -= len(data)
+        return data
+
+    def _pop_spilled(self, read: bool) -> Optional[bytes]:
+        assert self._file is not None
+        length = self._spilled.popleft()
+        data = None
+        if read:
+            self._file.seek(self._read_pos)
+            data = self._file.read(length)
+        self._read_pos += length
+        self._spilled_size -= length
+        if not self._spilled:
+            self._truncate()
+        elif self._read_pos > max(self._spilled_size, self.compact_size):
+            self._compact()
+        return data
+
+    def _compact(self) -> None:
+        """Move the spilled stanzas to the start of the file."""
+        assert self._file is not None
+        read_pos = self._read_pos
+        write_pos = 0
+        while True:
+            self._file.seek(read_pos)
+            chunk = self._file.read(65536)
+            if not chunk:
+                break
+            read_pos += len(chunk)
+            self._file.seek(write_pos)
+            self._file.write(chunk)
+            write_pos += len(chunk)
+        self._file.truncate(write_pos)
+        self._read_pos = 0
+
+    def spill(self) -> None:
+        """Move the oldest stanza kept in memory to the disk."""
+        data = self._memory.popleft()
+        self._memory_size -= len(data)
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(dir=self.spill_dir)
+        self._file.seek(0, 2)
+        self._file.write(data)
+        self._spilled.append(len(data))
+        self._spilled_size += len(data)
+
+    def drop(self) -> None:
+        """Forget the oldest stanza still stored, spilled or not."""
+        if self._spilled:
+            self._pop_spilled(read=False)
+        else:
+            data = self._memory.popleft()
+            self._memory_size -= len(data)
+        self.dropped += 1
+
+    def _truncate(self) -> None:
+        if self._file is not None:
+            self._file.seek(0)
+            self._file.truncate()
+        self._read_pos = 0
+
+    def clear(self) -> None:
+        """Forget every stanza."""
+        self.dropped = 0
+        self._spilled.clear()
+        self._spilled_size = 0
+        self._truncate()
+        self._memory.clear()
+        self._memory_size = 0
+
+    def close(self) -> None:
+        """Forget every stanza, and remove the temporary file."""
+        self.clear()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
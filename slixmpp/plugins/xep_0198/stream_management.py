@@ -5,14 +5,14 @@
 # See the file LICENSE for copying permission.
 import asyncio
 import logging
-import collections
 
 from slixmpp.stanza import Message, Presence, Iq, StreamFeatures
-from slixmpp.xmlstream import register_stanza_plugin
+from slixmpp.xmlstream import register_stanza_plugin, ET
 from slixmpp.xmlstream.handler import Callback, Waiter
 from slixmpp.xmlstream.matcher import MatchXPath, MatchMany
 from slixmpp.plugins.base import BasePlugin
 from slixmpp.plugins.xep_0198 import stanza
+from slixmpp.plugins.xep_0198.queue import UnackedQueue
 
 
 log = logging.getLogger(__name__)
@@ -54,6 +54,29 @@ class XEP_0198(BasePlugin):
         #: requested when enabling stream management. Defaults to ``True``.
         'allow_resume': True,
 
+        #: The maximum number of unacked stanzas to keep in memory, or
+        #: ``0`` for no limit.
+        'max_unacked': 0,
+
+        #: The maximum size, in bytes, of the unacked stanzas to keep in
+        #: memory, or ``0`` for no limit.
+        'max_unacked_bytes': 0,
+
+        #: Control what happens to the oldest unacked stanzas once one
+        #: of the limits above is reached: if ``True``, they are moved
+        #: to a temporary file, otherwise they are forgotten and will
+        #: not be resent when resuming the stream. Defaults to ``False``.
+        'spill_to_disk': False,
+
+        #: The directory of the temporary file used by ``spill_to_disk``,
+        #: defaults to the one chosen by :mod:`tempfile`.
+        'spill_dir': None,
+
+        #: The fraction of the limits above from which acks are requested
+        #: more often than every ``window`` stanzas, up to every stanza
+        #: once a limit is reached. ``None`` keeps the ``window``.
+        'ack_pressure': 0.5,
+
         'order': 10100,
         'resume_order': 9000
     }
@@ -70,7 +93,8 @@ class XEP_0198(BasePlugin):
 
         self.enabled_in = False
         self.enabled_out = False
-        self.unacked_queue = collections.deque()
+        self.unacked_queue = UnackedQueue(self.spill_dir)
+        self.queue_full = False
 
         register_stanza_plugin(StreamFeatures, stanza.StreamManagement)
         self.xmpp.register_stanza(stanza.Enable)
@@ -123,7 +147,7 @@ class XEP_0198(BasePlugin):
                     instream=True))
 
         self.xmpp.add_filter('in', self._handle_incoming)
-        self.xmpp.add_filter('out_sync', self._handle_outgoing)
+        self.xmpp.add_filter('out_serialized', self._handle_outgoing)
 
         self.xmpp.add_event_handler('disconnected', self.disconnected)
         self.xmpp.add_event_handler('session_end', self.session_end)
@@ -137,7 +161,7 @@ class XEP_0198(BasePlugin):
         self.xmpp.del_event_handler('disconnected', self.disconnected)
         self.xmpp.del_event_handler('session_end', self.session_end)
         self.xmpp.del_filter('in', self._handle_incoming)
-        self.xmpp.del_filter('out_sync', self._handle_outgoing)
+        self.xmpp.del_filter('out_serialized', self._handle_outgoing)
         self.xmpp.remove_handler('Stream Management Enabled')
         self.xmpp.remove_handler('Stream Management Resumed')
         self.xmpp.remove_handler('Stream Management Failed')
@@ -149,6 +173,7 @@ class XEP_0198(BasePlugin):
         self.xmpp.remove_stanza(stanza.Resumed)
         self.xmpp.remove_stanza(stanza.Ack)
         self.xmpp.remove_stanza(stanza.RequestAck)
+        self.unacked_queue.close()
 
     def disconnected(self, event):
         """Reset enabled state until we can resume/reenable."""
@@ -164,6 +189,7 @@ class XEP_0198(BasePlugin):
         self.enabled_in = False
         self.enabled_out = False
         self.unacked_queue.clear()
+        self.queue_full = False
         self.sm_id = None
         self.handled = 0
         self.seq = 0
@@ -252,8 +278,15 @@ class XEP_0198(BasePlugin):
         self.xmpp.features.add('stream_management')
         self.enabled_in = True
         self._handle_ack(stanza)
-        for id, stanza in self.unacked_queue:
-            self.xmpp.send(stanza, use_filters=False)
+        lost = 0
+        for data in self.unacked_queue:
+            if data is None:
+                lost += 1
+            else:
+                self.xmpp.send(data.decode('utf-8'), use_filters=False)
+        if lost:
+            log.warning('%s unacked stanzas were dropped from the queue'
+                        ' and could not be resent', lost)
         self.xmpp.event('session_resumed', stanza)
         self.xmpp.end_session_on_disconnect = False
 
@@ -268,12 +301,15 @@ class XEP_0198(BasePlugin):
         self.enabled_in = False
         self.enabled_out = False
         self.unacked_queue.clear()
+        self.queue_full = False
         self.xmpp.event('sm_failed', stanza)
 
     def _handle_ack(self, ack):
         """Process a server ack by freeing acked stanzas from the queue.
 
-        Raises a :term:`stanza_acked` event for each acked stanza.
+        Raises a :term:`stanza_acked` event for each acked stanza which
+        was not forgotten, with a stanza object rebuilt from the bytes
+        sent, only if the event has handlers.
         """
         if ack['h'] == self.last_ack:
             return
@@ -292,10 +328,14 @@ class XEP_0198(BasePlugin):
             log.error('Inconsistent sequence numbers from the server,'
                       ' ignoring and replacing ours with them.')
             num_acked = len(self.unacked_queue)
+        notify = self.xmpp.event_handled('stanza_acked')
         for x in range(num_acked):
-            seq, stanza = self.unacked_queue.popleft()
-            self.xmpp.event('stanza_acked', stanza)
+            data = self.unacked_queue.popleft(read=notify)
+            if notify and data is not None:
+                self.xmpp.event('stanza_acked', self._parse(data))
         self.last_ack = ack['h']
+        if self.queue_full and self._fill() < 1:
+            self.queue_full = False
 
     def _handle_request_ack(self, req):
         """Handle an ack request by sending an ack."""
@@ -311,25 +351,89 @@ class XEP_0198(BasePlugin):
             self.handled = (self.handled + 1) % MAX_SEQ
         return stanza
 
-    def _handle_outgoing(self, stanza):
-        """Store outgoing stanzas in a queue to be acked."""
+    def _handle_outgoing(self, stanza, data):
+        """Store the bytes of outgoing stanzas in a queue to be acked."""
         from slixmpp.plugins.xep_0198 import stanza as st
         if isinstance(stanza, (st.Enable, st.Resume)):
             self.enabled_out = True
             self.unacked_queue.clear()
+            self.queue_full = False
             log.debug("enabling outgoing SM: %s" % stanza)
 
         if not self.enabled_out:
-            return stanza
+            return data
 
         if isinstance(stanza, (Message, Presence, Iq)):
-            seq = None
             # Sequence numbers are mod 2^32
             self.seq = (self.seq + 1) % MAX_SEQ
-            seq = self.seq
-            self.unacked_queue.append((seq, stanza))
-            self.window_counter -= 1
-            if self.window_counter == 0:
+            self.unacked_queue.append(data)
+            self._check_limits()
+            self.window_counter = min(self.window_counter,
+                                      self._ack_window()) - 1
+            if self.window_counter <= 0:
                 self.window_counter = self.window
                 self.request_ack()
-        return stanza
+        return data
+
+    def _parse(self, data):
+        """Rebuild a stanza object from its serialized bytes."""
+        xml = ET.fromstring('<stream xmlns="%s">%s</stream>' % (
+            self.xmpp.default_ns, data.decode('utf-8')))
+        return self.xmpp._build_stanza(xml[0])
+
+    def _fill(self):
+        """Return the fraction of the limits used by the unacked queue."""
+        queue = self.unacked_queue
+        fill = 0
+        if self.max_unacked:
+            fill = len(queue) / self.max_unacked
+        if self.max_unacked_bytes:
+            size = queue.memory_size + queue.spilled_size
+            fill = max(fill, size / self.max_unacked_bytes)
+        return fill
+
+    def _ack_window(self):
+        """Return the number of stanzas to send before requesting an ack,
+        shrinking from ``window`` to 1 as the unacked queue fills up."""
+        if not self.ack_pressure:
+            return self.window
+        fill = self._fill()
+        if fill < self.ack_pressure:
+            return self.window
+        if fill >= 1:
+            return 1
+        return max(1, int(self.window * (1 - fill) / (1 - self.ack_pressure)))
+
+    def _over_limits(self):
+        queue = self.unacked_queue
+        if not queue.memory_count:
+            return False
+        if self.max_unacked and queue.memory_count > self.max_unacked:
+            return True
+        if self.max_unacked_bytes and \
+                queue.memory_size > self.max_unacked_bytes:
+            return True
+        return False
+
+    def _check_limits(self):
+        """Spill or drop the oldest unacked stanzas kept in memory when
+        over the limits.
+
+        Raises an :term:`sm_queue_full` event when they are first reached.
+        """
+        if not self._over_limits():
+            return
+        if not self.queue_full:
+            self.queue_full = True
+            if not self.spill_to_disk:
+                log.warning('Unacked queue full, forgetting the oldest'
+                            ' stanzas until the server acks them')
+            self.xmpp.event('sm_queue_full', self.unacked_queue)
+            # Ask for an ack right away.
+            self.window_counter = 1
+        queue = self.unacked_queue
+        while self._over_limits():
+            if self.spill_to_disk:
+                queue.spill()
+            else:
+                queue.drop()
@@ -5,6 +5,7 @@
 from base64 import b64encode
 import hashlib
 import logging
+import os
 
 from slixmpp.plugins import BasePlugin
 from slixmpp.plugins.xep_0300 import stanza, Hash
@@ -24,6 +25,9 @@ class XEP_0300(BasePlugin):
     stanza = stanza
     default_config = {
         'block_size': 1024 * 1024,  # One MiB
+        # Files larger than this are hashed in the executor of the
+        # stream by compute_hash_async.
+        'offload_size': 1024 * 1024,
         'preferred': 'sha-256',
         'enable_sha-1': False,
         'enable_sha-256': True,
@@ -71,14 +75,36 @@ class XEP_0300(BasePlugin):
     def compute_hash(self, filename, function=None):
         if function is None:
             function = self.preferred
-        h = self._hashlib_function[function]()
+        digest = self._hash_file(filename, function, self.block_size)
+        return self._hash_element(function, digest)
+
+    async def compute_hash_async(self, filename, function=None):
+        """Same as compute_hash, without blocking the event loop on
+        files larger than the ``offload_size`` setting."""
+        if function is None:
+            function = self.preferred
+        if os.path.getsize(filename) <= self.offload_size:
+            digest = self._hash_file(filename, function, self.block_size)
+        else:
+            digest = await self.xmpp.run_in_executor(
+                self._hash_file, filename, function, self.block_size,
+            )
+        return self._hash_element(function, digest)
+
+    @classmethod
+    def _hash_file(cls, filename, function, block_size):
+        h = cls._hashlib_function[function]()
         with open(filename, 'rb') as f:
             while True:
-                block = f.read(self.block_size)
+                block = f.read(block_size)
                 if not block:
                     break
                 h.update(block)
+        return h.digest()
+
+    @staticmethod
+    def _hash_element(function, digest):
         hash_elem = Hash()
         hash_elem['algo'] = function
-        hash_elem['value'] = b64encode(h.digest())
+        hash_elem['value'] = b64encode(digest)
         return hash_elem
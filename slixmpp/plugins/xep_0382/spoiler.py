@@ -20,6 +20,7 @@ class XEP_0382(BasePlugin):
     def plugin_init(self) -> None:
         stanza.register_plugins()
         Message.sub_interfaces.add('spoiler')
+        Message.reset_accessors()
 
     def session_bind(self, jid: JID):
         self.xmpp['xep_0030'].add_feature(stanza.NS)
@@ -27,3 +28,4 @@ class XEP_0382(BasePlugin):
     def plugin_end(self):
         self.xmpp.plugin['xep_0030'].del_feature(feature=stanza.NS)
         Message.sub_interfaces.remove('spoiler')
+        Message.reset_accessors()
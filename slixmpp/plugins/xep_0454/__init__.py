@@ -12,7 +12,7 @@
 
 from typing import IO, Optional, Tuple
 
-from os import urandom
+from os import urandom, path
 from pathlib import Path
 from io import BytesIO, SEEK_END
 
@@ -39,6 +39,11 @@ class XEP_0454(BasePlugin):
     name = 'xep_0454'
     description = 'XEP-0454: OMEMO Media Sharing'
     dependencies = {'xep_0363'}
+    default_config = {
+        # Files larger than this are encrypted or decrypted in the
+        # executor of the stream by upload_file and decrypt_file.
+        'offload_size': 1024 * 1024,
+    }
 
     @staticmethod
     def encrypt(input_file: Optional[IO[bytes]] = None, filename: Optional[Path] = None) -> Tuple[bytes, str]:
@@ -65,16 +70,17 @@ class XEP_0454(BasePlugin):
         if input_file is None:
             input_file = open(filename, 'rb')
 
-        payload = b''
+        payload = BytesIO()
         while True:
-            buf = input_file.read(4096)
+            buf = input_file.read(65536)
             if not buf:
                 break
-            payload += aes_gcm.update(buf)
+            payload.write(aes_gcm.update(buf))
 
-        payload += aes_gcm.finalize() + aes_gcm.tag
+        payload.write(aes_gcm.finalize())
+        payload.write(aes_gcm.tag)
         fragment = aes_gcm_iv.hex() + aes_gcm_key.hex()
-        return (payload, fragment)
+        return (payload.getvalue(), fragment)
 
     @staticmethod
     def decrypt(input_file: IO[bytes], fragment: str) -> bytes:
@@ -104,17 +110,44 @@ class XEP_0454(BasePlugin):
         input_file.seek(0)
 
         count = size - 16
-        plain = b''
-        while count >= 0:
-            buf = input_file.read(4096)
+        plain = BytesIO()
+        while count > 0:
+            buf = input_file.read(65536)
             count -= len(buf)
             if count <= 0:
                 buf += input_file.read()
                 buf = buf[:-16]
-            plain += aes_gcm.update(buf)
-        plain += aes_gcm.finalize()
+            plain.write(aes_gcm.update(buf))
+        plain.write(aes_gcm.finalize())
 
-        return plain
+        return plain.getvalue()
+
+    async def decrypt_file(self, input_file: IO[bytes],
+                           fragment: str) -> bytes:
+        """
+            Decrypts file-like, like `XEP_0454.decrypt`, in the executor
+            of the stream if it is larger than ``offload_size``.
+
+            :param input_file: Binary file stream on the file, containing the
+                               tag (16 bytes) at the end.
+            :param fragment: 88 hex chars string composed of iv (24 chars)
+                             + key (64 chars).
+        """
+        if self._input_size(input_file, None) > self.offload_size:
+            return await self.xmpp.run_in_executor(
+                self.decrypt, input_file, fragment,
+            )
+        return self.decrypt(input_file, fragment)
+
+    @staticmethod
+    def _input_size(input_file: Optional[IO[bytes]],
+                    filename: Optional[Path]) -> int:
+        if input_file is None:
+            return path.getsize(filename)
+        position = input_file.tell()
+        size = input_file.seek(0, SEEK_END) - position
+        input_file.seek(position)
+        return size
 
     @staticmethod
     def format_url(url: str, fragment: str) -> str:
@@ -152,7 +185,14 @@ class XEP_0454(BasePlugin):
             `XEP_0363.upload_file` call.
         """
         input_file = kwargs.get('input_file')
-        payload, fragment = self.encrypt(input_file, filename)
+        if _size is None:
+            _size = self._input_size(input_file, filename)
+        if _size > self.offload_size:
+            payload, fragment = await self.xmpp.run_in_executor(
+                self.encrypt, input_file, filename,
+            )
+        else:
+            payload, fragment = self.encrypt(input_file, filename)
 
         # Prepare kwargs for upload_file call
         new_filename = urandom(12).hex()  # Random filename to hide user-provided path
@@ -0,0 +1,194 @@
+# slixmpp.pool
+# ~~~~~~~~~~~~
+# This module provides a manager for many client connections
+# running on the same event loop.
+# Part of Slixmpp: The Slick XMPP Library
+# :copyright: (c) 2011 Nathanael C. Fritz
+# :license: MIT, see LICENSE for more details
+from __future__ import annotations
+
+import asyncio
+import logging
+import ssl
+
+from collections import Counter
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+    Type,
+)
+
+from slixmpp.basexmpp import BaseXMPP
+from slixmpp.clientxmpp import ClientXMPP
+from slixmpp.types import JidStr
+from slixmpp.xmlstream.resolver import DNSCache
+from slixmpp.xmlstream.timers import TimerWheel
+
+log = logging.getLogger(__name__)
+
+#: The events counted in :meth:`ConnectionPool.stats`.
+COUNTED_EVENTS = (
+    'connected',
+    'connection_failed',
+    'disconnected',
+    'session_start',
+    'session_end',
+    'failed_auth',
+)
+
+
+class ConnectionPool:
+
+    """
+    Manager of many XMPP clients running on the same event loop, like
+    the accounts of a bridge or of a load test.
+
+    The clients of a pool share:
+
+    - the SSL contexts, configured once for each set of SSL settings
+      (see :meth:`~.XMLStream.get_ssl_context`),
+    - a :class:`~.DNSCache`, so that the servers are not resolved for
+      each client,
+    - a :class:`~.TimerWheel` for the callbacks given to
+      :meth:`~.XMLStream.schedule`, like keepalives,
+    - the list of plugins to register.
+
+    They are connected a few at a time by :meth:`connect_all`, and
+    reconnect after a random delay so that they do not all reconnect at
+    once after a network failure.
+
+    :param client_class: The class of the clients created by
+                         :meth:`add`, defaults to
+                         :class:`~.ClientXMPP`.
+    :param plugins: The plugins to register on each client.
+    :param plugin_config: The configuration of those plugins, by name.
+    :param connect_interval: The delay, in seconds, between two
+                             connections in :meth:`connect_all`.
+    :param reconnect_jitter: See :attr:`~.XMLStream.reconnect_jitter`.
+    :param ssl_contexts: The shared SSL contexts, by settings.
+    :param dns_cache: The shared DNS cache.
+    :param timers: The shared timer.
+    """
+
+    #: The clients, by the JID they were added with.
+    clients: Dict[str, BaseXMPP]
+
+    def __init__(self, client_class: Type[BaseXMPP] = ClientXMPP, *,
+                 plugins: Iterable[str] = (),
+                 plugin_config: Optional[Dict[str, Dict[str, Any]]] = None,
+                 connect_interval: float = 0.05,
+                 reconnect_jitter: float = 0.5,
+                 ssl_contexts: Optional[Dict[Tuple[Any, ...],
+                                             ssl.SSLContext]] = None,
+                 dns_cache: Optional[DNSCache] = None,
+                 timers: Optional[TimerWheel] = None,
+                 loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.client_class = client_class
+        self.plugins = list(plugins)
+        self.plugin_config = plugin_config or {}
+        self.connect_interval = connect_interval
+        self.reconnect_jitter = reconnect_jitter
+        self.ssl_contexts = ssl_contexts if ssl_contexts is not None else {}
+        self.dns_cache = dns_cache if dns_cache is not None else DNSCache()
+        self.timers = timers if timers is not None else TimerWheel(loop=loop)
+        self.loop = loop
+        self.clients = {}
+        self._events: Counter = Counter()
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    def __iter__(self) -> Iterator[BaseXMPP]:
+        return iter(list(self.clients.values()))
+
+    def __getitem__(self, jid: JidStr) -> BaseXMPP:
+        return self.clients[str(jid)]
+
+    def add(self, jid: JidStr, password: str, **kwargs: Any) -> BaseXMPP:
+        """Create a client, with the shared resources and plugins of
+        the pool.
+
+        The other arguments are given to the client class.
+        """
+        client = self.client_class(jid, password, **kwargs)  # type: ignore[call-arg]
+        self.setup(client, str(jid))
+        return client
+
+    def setup(self, client: BaseXMPP, key: Optional[str] = None) -> None:
+        """Add an existing client to the pool."""
+        if self.loop is not None:
+            client.loop = self.loop
+        client.ssl_contexts = self.ssl_contexts
+        client.dns_cache = self.dns_cache
+        client.timers = self.timers
+        client.reconnect_jitter = self.reconnect_jitter
+        for name in self.plugins:
+            client.register_plugin(name, self.plugin_config.get(name))
+        for event in COUNTED_EVENTS:
+            client.add_event_handler(event, self._counter(event))
+        self.clients[key or str(client.boundjid)] = client
+
+    def remove(self, jid: JidStr) -> BaseXMPP:
+        """Remove a client from the pool, without disconnecting it."""
+        return self.clients.pop(str(jid))
+
+    def _counter(self, event: str) -> Any:
+        def count(data: Any) -> None:
+            self._events[event] += 1
+        return count
+
+    async def connect_all(self, **kwargs: Any) -> None:
+        """Connect every client which is not connected, waiting
+        :attr:`connect_interval` seconds between two of them.
+
+        The arguments are given to :meth:`~.XMLStream.connect`.
+        """
+        first = True
+        for client in self:
+            if client.is_connected() or client.is_connecting():
+                continue
+            if not first and self.connect_interval:
+                await asyncio.sleep(self.connect_interval)
+            first = False
+            client.connect(**kwargs)
+
+    async def disconnect_all(self, wait: float = 2.0) -> None:
+        """Disconnect every client, and wait until they are."""
+        waiting = [client.disconnect(wait) for client in self
+                   if client.is_connected() or client.is_connecting()]
+        if waiting:
+            await asyncio.gather(*waiting, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return aggregate statistics of the clients.
+
+        Along with the current counts, the ``events`` key counts the
+        :data:`COUNTED_EVENTS` fired by the clients since they were
+        added.
+        """
+        connected = 0
+        sessions = 0
+        queued = 0
+        for client in self.clients.values():
+            if client.is_connected():
+                connected += 1
+            if getattr(client, 'sessionstarted', False):
+                sessions += 1
+            queued += client.waiting_queue.qsize()
+        return {
+            'clients': len(self.clients),
+            'connected': connected,
+            'sessions': sessions,
+            'send_queue': queued,
+            'timers': len(self.timers),
+            'dns_cache': {
+                'entries': len(self.dns_cache),
+                'hits': self.dns_cache.hits,
+                'misses': self.dns_cache.misses,
+            },
+            'events': dict(self._events),
+        }
@@ -3,6 +3,10 @@
 # Copyright (C) 2010  Nathanael C. Fritz
 # This file is part of Slixmpp.
 # See the file LICENSE for copying permission.
-from slixmpp.roster.item import RosterItem
+from slixmpp.roster.item import RosterItem, CompactRosterItem, GroupTable
+from slixmpp.roster.index import PresenceIndex
 from slixmpp.roster.single import RosterNode
 from slixmpp.roster.multi import Roster
+from slixmpp.roster.backend import (
+    AsyncRosterBackend, SQLiteRosterBackend, WriteBehindBuffer,
+)
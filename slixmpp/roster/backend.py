@@ -0,0 +1,337 @@
+# Slixmpp: The Slick XMPP Library
+# Copyright (C) 2010  Nathanael C. Fritz
+# This file is part of Slixmpp.
+# See the file LICENSE for copying permission.
+import asyncio
+import json
+import logging
+import sqlite3
+
+from concurrent.futures import ThreadPoolExecutor
+
+from slixmpp.xmlstream.executor import run_in_executor
+
+
+log = logging.getLogger(__name__)
+
+
+#: The state fields of a roster item which are persisted.
+STATE_FIELDS = ('name', 'groups', 'from', 'to', 'pending_in',
+                'pending_out', 'whitelisted')
+
+
+class AsyncRosterBackend(object):
+
+    """
+    Interface of an asynchronous roster datastore, which works on
+    many roster items at once.
+
+    Such a datastore is used through a WriteBehindBuffer, which
+    provides the synchronous interface expected by RosterItem (see
+    its documentation).
+
+    Methods:
+        load_all    -- Return the state of every stored roster item.
+        save_many   -- Store the state of many roster items.
+        delete_many -- Remove many roster items.
+        close       -- Release the resources of the datastore.
+    """
+
+    async def load_all(self, owner=None):
+        """
+        Return the state of the stored roster items, as a dictionary
+        mapping owner JIDs to dictionaries mapping item JIDs to their
+        state (see STATE_FIELDS).
+
+        Arguments:
+            owner -- Only return the items of this roster owner.
+        """
+        raise NotImplementedError
+
+    async def save_many(self, items):
+        """
+        Store the state of roster items, replacing any stored state.
+
+        Arguments:
+            items -- A list of (owner_jid, jid, item_state) tuples.
+        """
+        raise NotImplementedError
+
+    async def delete_many(self, items):
+        """
+        Remove roster items.
+
+        Arguments:
+            items -- A list of (owner_jid, jid) tuples.
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        """Release the resources of the datastore."""
+
+
+class WriteBehindBuffer(object):
+
+    """
+    Datastore interface for RosterItem, which keeps the roster in
+    memory and writes the changes to an AsyncRosterBackend in batches.
+
+    The roster is read at once with preload(), instead of one query per
+    item. Saving an item only marks it as changed, so that any number
+    of saves of the same item between two flushes make a single write.
+    Changes are written every `interval` seconds, as soon as
+    `max_pending` items changed, and on disconnection.
+
+    Usage:
+        buffer = WriteBehindBuffer(SQLiteRosterBackend('roster.db'))
+        await buffer.start(xmpp)
+        xmpp.roster.set_backend(buffer, save=False)
+
+    Attributes:
+        backend     -- The AsyncRosterBackend to write to.
+        interval    -- The time, in seconds, between two flushes.
+        max_pending -- The number of changed items which triggers
+                       an early flush.
+
+    Methods:
+        preload -- Read the roster from the backend.
+        start   -- Read the roster, and start flushing on an interval.
+        stop    -- Stop flushing on an interval, and flush.
+        flush   -- Write the changed items to the backend.
+    """
+
+    def __init__(self, backend, interval=1.0, max_pending=1000):
+        """
+        Create a new write-behind buffer.
+
+        Arguments:
+            backend     -- The AsyncRosterBackend to write to.
+            interval    -- The time, in seconds, between two flushes.
+                           Defaults to 1 second.
+            max_pending -- The number of changed items which triggers
+                           an early flush. Defaults to 1000.
+        """
+        self.backend = backend
+        self.interval = interval
+        self.max_pending = max_pending
+        self.xmpp = None
+        self._items = {}
+        self._dirty = {}
+        self._deleted = set()
+        self._flushing = None
+        self._lock = None
+
+    @property
+    def pending(self):
+        """The number of changed items not yet written."""
+        return len(self._dirty) + len(self._deleted)
+
+    async def preload(self, owner=None):
+        """
+        Read the roster from the backend.
+
+        Arguments:
+            owner -- Only read the items of this roster owner.
+        """
+        items = await self.backend.load_all(owner)
+        for node, entries in items.items():
+            self._items.setdefault(node, {}).update(entries)
+
+    async def start(self, xmpp):
+        """
+        Read the roster from the backend, then flush every `interval`
+        seconds and on disconnection.
+
+        Arguments:
+            xmpp -- The main Slixmpp instance.
+        """
+        await self.preload()
+        self.xmpp = xmpp
+        xmpp.add_event_handler('disconnected', self._flush_soon)
+        xmpp.schedule('Roster flush', self.interval,
+                      self._flush_soon, repeat=True)
+
+    async def stop(self):
+        """Stop flushing on an interval, and flush."""
+        if self.xmpp is not None:
+            self.xmpp.cancel_schedule('Roster flush')
+            self.xmpp.del_event_handler('disconnected', self._flush_soon)
+            self.xmpp = None
+        await self.flush()
+
+    def _flush_soon(self, event=None):
+        if self.pending and (self._flushing is None or self._flushing.done()):
+            self._flushing = asyncio.ensure_future(self.flush())
+            self._flushing.add_done_callback(self._flushed)
+
+    def _flushed(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            log.error('Error while saving the roster:',
+                      exc_info=task.exception())
+
+    async def flush(self):
+        """Write the changed items to the backend."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while self.pending:
+                dirty, self._dirty = self._dirty, {}
+                deleted, self._deleted = self._deleted, set()
+                saved = [(owner, jid, _copy_state(state))
+                         for (owner, jid), state in dirty.items()]
+                try:
+                    if deleted:
+                        await self.backend.delete_many(list(deleted))
+                    if saved:
+                        await self.backend.save_many(saved)
+                except BaseException:
+                    # Keep the changes, unless newer ones were made.
+                    for key, state in dirty.items():
+                        if key not in self._deleted:
+                            self._dirty.setdefault(key, state)
+                    self._deleted |= deleted - set(self._dirty)
+                    raise
+
+    def entries(self, owner, db_state=None):
+        """
+        Return the owners of the rosters, or the items of a roster.
+
+        Arguments:
+            owner -- The roster owner, or None for the list of owners.
+        """
+        if owner is None:
+            return list(self._items)
+        return list(self._items.get(owner, ()))
+
+    def load(self, owner, jid, db_state):
+        """
+        Return the state of a roster item, if it is known.
+
+        See the documentation of RosterItem for the arguments.
+        """
+        return self._items.get(owner, {}).get(jid)
+
+    def save(self, owner, jid, item_state, db_state):
+        """
+        Mark a roster item as changed.
+
+        See the documentation of RosterItem for the arguments.
+        """
+        key = (owner, jid)
+        if item_state.get('removed', False):
+            self._items.get(owner, {}).pop(jid, None)
+            self._dirty.pop(key, None)
+            self._deleted.add(key)
+        else:
+            self._items.setdefault(owner, {})[jid] = item_state
+            self._deleted.discard(key)
+            self._dirty[key] = item_state
+        if self.pending >= self.max_pending:
+            self._flush_soon()
+
+
+class SQLiteRosterBackend(AsyncRosterBackend):
+
+    """
+    Roster datastore in an SQLite database.
+
+    Queries run one at a time in a dedicated thread, so that they do
+    not block the event loop.
+
+    Attributes:
+        path -- The path of the database, or ':memory:'.
+    """
+
+    def __init__(self, path):
+        """
+        Open, and create if needed, a roster database.
+
+        Arguments:
+            path -- The path of the database, or ':memory:'.
+        """
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._db = None
+
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS roster ('
+                ' owner TEXT NOT NULL, jid TEXT NOT NULL,'
+                ' name TEXT NOT NULL, groups TEXT NOT NULL,'
+                ' "from" INTEGER NOT NULL, "to" INTEGER NOT NULL,'
+                ' pending_in INTEGER NOT NULL, pending_out INTEGER NOT NULL,'
+                ' whitelisted INTEGER NOT NULL,'
+                ' PRIMARY KEY (owner, jid))'
+            )
+        return self._db
+
+    def _run(self, func, *args):
+        return run_in_executor(self._executor, func, *args)
+
+    def _load_all(self, owner):
+        query = 'SELECT owner, jid, name, groups, "from", "to", ' \
+                'pending_in, pending_out, whitelisted FROM roster'
+        if owner is None:
+            rows = self._connect().execute(query)
+        else:
+            rows = self._connect().execute(query + ' WHERE owner = ?',
+                                           (owner,))
+        result = {}
+        for row in rows:
+            result.setdefault(row[0], {})[row[1]] = {
+                'name': row[2],
+                'groups': json.loads(row[3]),
+                'from': bool(row[4]),
+                'to': bool(row[5]),
+                'pending_in': bool(row[6]),
+                'pending_out': bool(row[7]),
+                'whitelisted': bool(row[8]),
+            }
+        return result
+
+    def _save_many(self, items):
+        db = self._connect()
+        with db:
+            db.executemany(
+                'INSERT OR REPLACE INTO roster VALUES '
+                '(?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(owner, jid, state['name'] or '',
+                  json.dumps(list(state['groups'] or [])),
+                  bool(state['from']), bool(state['to']),
+                  bool(state['pending_in']), bool(state['pending_out']),
+                  bool(state['whitelisted']))
+                 for owner, jid, state in items],
+            )
+
+    def _delete_many(self, items):
+        db = self._connect()
+        with db:
+            db.executemany('DELETE FROM roster WHERE owner = ? AND jid = ?',
+                           items)
+
+    def _close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def load_all(self, owner=None):
+        return await self._run(self._load_all, owner)
+
+    async def save_many(self, items):
+        await self._run(self._save_many, items)
+
+    async def delete_many(self, items):
+        await self._run(self._delete_many, items)
+
+    async def close(self):
+        await self._run(self._close)
+        self._executor.shutdown(wait=False)
+
+
+def _copy_state(state):
+    """Return a copy of the persisted fields of a roster item's state."""
+    copy = {field: state.get(field) for field in STATE_FIELDS}
+    copy['groups'] = list(copy['groups'] or [])
+    return copy
@@ -0,0 +1,257 @@
+# Slixmpp: The Slick XMPP Library
+# Copyright (C) 2010  Nathanael C. Fritz
+# This file is part of Slixmpp.
+# See the file LICENSE for copying permission.
+import asyncio
+import bisect
+
+from collections import namedtuple
+
+
+#: The presence of an online resource, as kept by a PresenceIndex.
+ResourcePresence = namedtuple('ResourcePresence',
+                              ('show', 'priority', 'status', 'caps'))
+
+#: A change of a PresenceIndex: kind is 'available' or 'unavailable',
+#: and presence is the new ResourcePresence, or None.
+PresenceChange = namedtuple('PresenceChange',
+                            ('kind', 'owner', 'jid', 'resource', 'presence'))
+
+#: How available each show value is, from the most available.
+SHOW_ORDER = {'chat': 0, '': 1, 'away': 2, 'xa': 3, 'dnd': 4}
+
+
+class PresenceIndex(object):
+
+    """
+    Index of the online resources of the contacts of every roster node,
+    kept up to date by the roster items as presences are received.
+
+    Resources are identified by (owner, jid, resource) keys, where
+    owner is the bare JID of the roster node and jid the bare JID of
+    the contact.
+
+    Attributes:
+        max_changes -- The number of changes kept for each consumer
+                       of changes(); older ones are dropped.
+
+    Methods:
+        update         -- Record the presence of an online resource.
+        remove         -- Record that a resource went offline.
+        remove_contact -- Forget every resource of a contact.
+        is_online      -- Return if a contact has an online resource.
+        resources      -- Return the online resources of a contact.
+        best           -- Return the most available resource of a contact.
+        online         -- Iterate over the online contacts.
+        with_show      -- Iterate over the resources with a show value.
+        with_caps      -- Iterate over the resources with a caps node.
+        with_priority  -- Iterate over the resources by priority.
+        changes        -- Asynchronously iterate over the changes.
+    """
+
+    def __init__(self, max_changes=1000):
+        self.max_changes = max_changes
+        self._contacts = {}
+        self._by_owner = {}
+        self._by_show = {}
+        self._by_caps = {}
+        self._by_priority = {}
+        self._priorities = []
+        self._consumers = []
+        self._count = 0
+
+    def __len__(self):
+        """Return the number of online resources."""
+        return self._count
+
+    def _add(self, index, value, key):
+        keys = index.get(value)
+        if keys is None:
+            keys = index[value] = {}
+        keys[key] = None
+
+    def _discard(self, index, value, key):
+        keys = index.get(value)
+        if keys is not None:
+            keys.pop(key, None)
+            if not keys:
+                del index[value]
+                return True
+        return False
+
+    def _unindex(self, key, presence):
+        self._discard(self._by_show, presence.show, key)
+        self._discard(self._by_caps, presence.caps, key)
+        if self._discard(self._by_priority, presence.priority, key):
+            i = bisect.bisect_left(self._priorities, presence.priority)
+            del self._priorities[i]
+
+    def _index(self, key, presence):
+        self._add(self._by_show, presence.show, key)
+        self._add(self._by_caps, presence.caps, key)
+        if presence.priority not in self._by_priority:
+            bisect.insort(self._priorities, presence.priority)
+        self._add(self._by_priority, presence.priority, key)
+
+    def _publish(self, change):
+        for queue in self._consumers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(change)
+
+    def update(self, owner, jid, resource, show='', priority=0,
+               status='', caps=''):
+        """
+        Record the presence of an online resource.
+
+        Arguments:
+            owner    -- The bare JID of the roster node.
+            jid      -- The bare JID of the contact.
+            resource -- The resource of the contact.
+            show     -- The show value of the presence.
+            priority -- The priority of the presence.
+            status   -- The status message of the presence.
+            caps     -- The entity capabilities node, if any.
+        """
+        presence = ResourcePresence(show or '', priority or 0,
+                                    status or '', caps or '')
+        contact = (owner, jid)
+        resources = self._contacts.get(contact)
+        if resources is None:
+            resources = self._contacts[contact] = {}
+            self._add(self._by_owner, owner, jid)
+        key = (owner, jid, resource)
+        old = resources.get(resource)
+        if old is not None:
+            if old == presence:
+                return
+            self._unindex(key, old)
+        else:
+            self._count += 1
+        resources[resource] = presence
+        self._index(key, presence)
+        self._publish(PresenceChange('available', owner, jid,
+                                     resource, presence))
+
+    def remove(self, owner, jid, resource):
+        """
+        Record that a resource went offline.
+
+        Arguments:
+            owner    -- The bare JID of the roster node.
+            jid      -- The bare JID of the contact.
+            resource -- The resource of the contact.
+        """
+        contact = (owner, jid)
+        resources = self._contacts.get(contact)
+        if resources is None or resource not in resources:
+            return
+        self._unindex((owner, jid, resource), resources.pop(resource))
+        self._count -= 1
+        if not resources:
+            del self._contacts[contact]
+            self._discard(self._by_owner, owner, jid)
+        self._publish(PresenceChange('unavailable', owner, jid,
+                                     resource, None))
+
+    def remove_contact(self, owner, jid):
+        """
+        Forget every resource of a contact.
+
+        Arguments:
+            owner -- The bare JID of the roster node.
+            jid   -- The bare JID of the contact.
+        """
+        for resource in list(self._contacts.get((owner, jid), ())):
+            self.remove(owner, jid, resource)
+
+    def is_online(self, owner, jid):
+        """Return if a contact has an online resource."""
+        return (owner, jid) in self._contacts
+
+    def resources(self, owner, jid):
+        """
+        Return a dictionary mapping the online resources of a contact
+        to their ResourcePresence.
+        """
+        return dict(self._contacts.get((owner, jid), {}))
+
+    def best(self, owner, jid):
+        """
+        Return the (resource, ResourcePresence) of the resource of a
+        contact with the highest priority, then the most available show
+        value, or None if the contact is offline.
+        """
+        resources = self._contacts.get((owner, jid))
+        if not resources:
+            return None
+        return min(resources.items(),
+                   key=lambda item: (-item[1].priority,
+                                     SHOW_ORDER.get(item[1].show, 5)))
+
+    def online(self, owner=None):
+        """
+        Iterate over the (owner, jid) of the online contacts.
+
+        Arguments:
+            owner -- Only return the contacts of this roster node.
+        """
+        if owner is None:
+            return iter(list(self._contacts))
+        return iter([(owner, jid) for jid in self._by_owner.get(owner, ())])
+
+    def with_show(self, show):
+        """Iterate over the (owner, jid, resource) with a show value."""
+        return iter(list(self._by_show.get(show, ())))
+
+    def with_caps(self, node):
+        """
+        Iterate over the (owner, jid, resource) which advertised
+        entity capabilities (XEP-0115) with a given node.
+        """
+        return iter(list(self._by_caps.get(node, ())))
+
+    def with_priority(self, minimum=None, maximum=None):
+        """
+        Iterate over the (owner, jid, resource) with a priority in the
+        given bounds, from the highest priority.
+
+        Arguments:
+            minimum -- The lowest priority, included.
+            maximum -- The highest priority, included.
+        """
+        start = 0
+        if minimum is not None:
+            start = bisect.bisect_left(self._priorities, minimum)
+        end = len(self._priorities)
+        if maximum is not None:
+            end = bisect.bisect_right(self._priorities, maximum)
+        for priority in reversed(self._priorities[start:end]):
+            for key in list(self._by_priority.get(priority, ())):
+                yield key
+
+    async def changes(self):
+        """
+        Asynchronously iterate over the changes of the index, as
+        PresenceChange tuples, from now on.
+
+        If the consumer is too slow, only the last max_changes changes
+        are kept.
+        """
+        queue = asyncio.Queue(self.max_changes)
+        self._consumers.append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._consumers.remove(queue)
+
+    def clear(self):
+        """Forget every resource, without publishing changes."""
+        self._contacts.clear()
+        self._by_owner.clear()
+        self._by_show.clear()
+        self._by_caps.clear()
+        self._by_priority.clear()
+        del self._priorities[:]
+        self._count = 0
@@ -3,6 +3,11 @@
 # Copyright (C) 2010  Nathanael C. Fritz
 # This file is part of Slixmpp.
 # See the file LICENSE for copying permission.
+from slixmpp.xmlstream import ET, tostring
+
+
+CAPS_TAG = '{http://jabber.org/protocol/caps}c'
+
 
 class RosterItem(object):
 
@@ -101,6 +106,12 @@ class RosterItem(object):
         handle_probe        -- Handle a presence probe query.
     """
 
+    # The instance dictionary is kept for compatibility, the slots let
+    # CompactRosterItem do without it.
+    __slots__ = ('xmpp', 'jid', 'owner', 'resources', 'roster', 'db',
+                 '_db_state', '_last_status', '_status_epoch',
+                 '__dict__', '__weakref__')
+
     def __init__(self, xmpp, jid, owner=None,
                  state=None, db=None, roster=None):
         """
@@ -118,9 +129,9 @@ class RosterItem(object):
         self.xmpp = xmpp
         self.jid = jid
         self.owner = owner or self.xmpp.boundjid.bare
+        self.roster = roster
         self.last_status = None
         self.resources = {}
-        self.roster = roster
         self.db = db
         self._state = state or {
                 'from': False,
@@ -135,6 +146,36 @@ class RosterItem(object):
         self._db_state = {}
         self.load()
 
+    @property
+    def last_status(self):
+        """
+        The last presence sent to this JID, if it was sent after the
+        last presence broadcast to the whole roster.
+        """
+        if self._last_status is None:
+            return None
+        if self._status_epoch != getattr(self.roster, 'status_epoch', 0):
+            # A presence was broadcast since, forget this one.
+            self._last_status = None
+            return None
+        return self._unpack_status(self._last_status)
+
+    @last_status.setter
+    def last_status(self, presence):
+        self._status_epoch = getattr(self.roster, 'status_epoch', 0)
+        if presence is None:
+            self._last_status = None
+        else:
+            self._last_status = self._pack_status(presence)
+
+    def _pack_status(self, presence):
+        """Return the stored form of last_status."""
+        return presence
+
+    def _unpack_status(self, status):
+        """Return last_status from its stored form."""
+        return status
+
     def set_backend(self, db=None, save=True):
         """
         Set the datastore interface object for the roster item.
@@ -178,11 +219,12 @@ class RosterItem(object):
             remove -- If True, expunge the item from the datastore.
         """
         self['subscription'] = self._subscription()
+        state = self._state
         if remove:
-            self._state['removed'] = True
+            state['removed'] = True
         if self.db:
             self.db.save(self.owner, self.jid,
-                         self._state, self._db_state)
+                         state, self._db_state)
 
         # Finally, remove the in-memory copy if needed.
         if remove:
@@ -354,6 +396,12 @@ class RosterItem(object):
         old_status = self.resources[resource].get('status', '')
         old_show = self.resources[resource].get('show', None)
         self.resources[resource].update(data)
+        index = getattr(self.roster, 'index', None)
+        if index is not None:
+            caps = presence.xml.find(CAPS_TAG)
+            index.update(str(self.owner), self._bare_jid(), resource,
+                         data['show'], data['priority'], data['status'],
+                         caps.get('node', '') if caps is not None else '')
         if got_online:
             self.xmpp.event('got_online', presence)
         if old_show != presence['show'] or old_status != presence['status']:
@@ -365,6 +413,9 @@ class RosterItem(object):
             return
         if resource in self.resources:
             del self.resources[resource]
+            index = getattr(self.roster, 'index', None)
+            if index is not None:
+                index.remove(str(self.owner), self._bare_jid(), resource)
         self.xmpp.event('changed_status', presence)
         if not self.resources:
             self.xmpp.event('got_offline', presence)
@@ -489,6 +540,198 @@ class RosterItem(object):
         a roster reset request.
         """
         self.resources = {}
+        index = getattr(self.roster, 'index', None)
+        if index is not None:
+            index.remove_contact(str(self.owner), self._bare_jid())
+
+    def _bare_jid(self):
+        return getattr(self.jid, 'bare', self.jid)
 
     def __repr__(self):
         return repr(self._state)
+
+
+#: Bits of the subscription state of a CompactRosterItem.
+STATE_FLAGS = {
+    'from': 1,
+    'to': 2,
+    'pending_in': 4,
+    'pending_out': 8,
+    'whitelisted': 16,
+}
+
+class GroupTable(object):
+
+    """
+    The tuples of group names of the CompactRosterItem entries of a
+    roster, so that the items in the same groups share one tuple.
+
+    Each tuple is counted once per item using it, and forgotten when
+    the last of these items leaves it.
+
+    Methods:
+        acquire -- Return the shared tuple for a list of groups.
+        release -- Stop using a tuple returned by acquire.
+    """
+
+    def __init__(self):
+        self._tuples = {}
+
+    def __len__(self):
+        """Return the number of tuples in use."""
+        return len(self._tuples)
+
+    def acquire(self, groups):
+        """
+        Return the tuple of group names shared by every item in the
+        given groups, counting one more item using it.
+
+        Arguments:
+            groups -- An iterable of group names.
+        """
+        if not groups:
+            return ()
+        key = tuple(str(group) for group in groups)
+        entry = self._tuples.get(key)
+        if entry is None:
+            entry = self._tuples[key] = [key, 0]
+        entry[1] += 1
+        return entry[0]
+
+    def release(self, groups):
+        """
+        Count one item less using a tuple of group names, and forget
+        it once no item uses it.
+
+        Arguments:
+            groups -- A tuple returned by acquire.
+        """
+        entry = self._tuples.get(groups)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._tuples[groups]
+
+
+class CompactRosterItem(RosterItem):
+
+    """
+    A RosterItem using less memory, for rosters of many thousands of
+    items, enabled by setting Roster.compact or RosterNode.compact.
+
+    The state is kept in slots instead of a dictionary: the subscription
+    state as a bitfield (see STATE_FLAGS), and the groups as a tuple
+    shared with the other items in the same groups, through the
+    GroupTable of the roster. Reading the groups returns a new list,
+    so they must be changed by assigning them. The release_groups
+    method must be called when the item is removed from its roster.
+
+    The last presence sent to the JID is kept as its attributes, show,
+    status and priority, and serialized payloads; a new Presence stanza
+    is built when last_status is read.
+    """
+
+    __slots__ = ('_flags', '_name', '_groups', '_db')
+
+    @property
+    def _db_state(self):
+        # Only created for items which use a datastore.
+        if self._db is None:
+            self._db = {}
+        return self._db
+
+    @_db_state.setter
+    def _db_state(self, db_state):
+        self._db = db_state or None
+
+    @property
+    def _state(self):
+        state = {key: bool(self._flags & flag)
+                 for key, flag in STATE_FLAGS.items()}
+        state['subscription'] = self._subscription()
+        state['name'] = self._name
+        state['groups'] = list(self._groups)
+        return state
+
+    @_state.setter
+    def _state(self, state):
+        self._flags = 0
+        for key, flag in STATE_FLAGS.items():
+            if state.get(key):
+                self._flags |= flag
+        self['name'] = state.get('name', '')
+        self['groups'] = state.get('groups')
+
+    def __getitem__(self, key):
+        """Return a state field's value."""
+        flag = STATE_FLAGS.get(key)
+        if flag is not None:
+            return bool(self._flags & flag)
+        if key == 'subscription':
+            return self._subscription()
+        if key == 'name':
+            return self._name
+        if key == 'groups':
+            return list(self._groups)
+        raise KeyError
+
+    def __setitem__(self, key, value):
+        """
+        Set the value of a state field.
+
+        See RosterItem.__setitem__ for the accepted values.
+        """
+        flag = STATE_FLAGS.get(key)
+        if flag is not None:
+            if str(value).lower() in ('true', '1', 'on', 'yes'):
+                self._flags |= flag
+            else:
+                self._flags &= ~flag
+        elif key == 'name':
+            self._name = value
+        elif key == 'groups':
+            table = getattr(self.roster, 'group_table', None)
+            if table is None:
+                self._groups = tuple(value or ())
+            else:
+                groups = table.acquire(value)
+                self.release_groups()
+                self._groups = groups
+        elif key != 'subscription':
+            raise KeyError
+
+    def release_groups(self):
+        """Stop sharing the tuple of groups of the item."""
+        table = getattr(self.roster, 'group_table', None)
+        groups = getattr(self, '_groups', ())
+        if table is not None and groups:
+            table.release(groups)
+        self._groups = ()
+
+    def _pack_status(self, presence):
+        base = presence.xml.tag.partition('}')[0] + '}'
+        skipped = (base + 'show', base + 'status', base + 'priority')
+        payload = tuple(tostring(xml) for xml in presence.xml
+                        if xml.tag not in skipped)
+        return (
+            tuple(presence.xml.attrib.items()),
+            presence['show'],
+            presence['status'],
+            presence['priority'],
+            payload,
+        )
+
+    def _unpack_status(self, status):
+        attrib, show, status, priority, payload = status
+        pres = self.xmpp.Presence()
+        pres.xml.attrib.update(attrib)
+        if show:
+            pres['show'] = show
+        if status:
+            pres['status'] = status
+        if priority:
+            pres['priority'] = priority
+        for xml in payload:
+            pres.xml.append(ET.fromstring(xml))
+        return pres
@@ -5,7 +5,8 @@
 # See the file LICENSE for copying permission.
 from slixmpp.stanza import Presence
 from slixmpp.xmlstream import JID
-from slixmpp.roster import RosterNode
+from slixmpp.roster import RosterNode, GroupTable
+from slixmpp.roster.index import PresenceIndex
 
 
 class Roster(object):
@@ -30,25 +31,38 @@ class Roster(object):
                           Defaults to True.
         auto_subscribe -- Default auto_subscribe value for new roster nodes.
                           Defaults to True.
+        compact        -- Default compact value for new roster nodes.
+                          Defaults to False.
+        index          -- The PresenceIndex of the online resources of the
+                          contacts of every roster node.
+        group_table    -- The GroupTable sharing the groups of the
+                          compact items of every roster node.
 
     Methods:
         add           -- Create a new roster node for a JID.
         send_presence -- Shortcut for sending a presence stanza.
+        broadcast_presence -- Send a presence to the contacts of
+                              every roster node.
     """
 
-    def __init__(self, xmpp, db=None):
+    def __init__(self, xmpp, db=None, compact=False):
         """
         Create a new roster.
 
         Arguments:
-            xmpp -- The main Slixmpp instance.
-            db   -- Optional interface object to a datastore.
+            xmpp    -- The main Slixmpp instance.
+            db      -- Optional interface object to a datastore.
+            compact -- Use CompactRosterItem entries, which take
+                       less memory.
         """
         self.xmpp = xmpp
         self.db = db
         self._auto_authorize = True
         self._auto_subscribe = True
+        self._compact = compact
         self._rosters = {}
+        self.index = PresenceIndex()
+        self.group_table = GroupTable()
 
         if self.db:
             for node in self.db.entries(None, {}):
@@ -67,13 +81,10 @@ class Roster(object):
 
             if stanza['type'] in stanza.showtypes or \
                stanza['type'] in ('available', 'unavailable'):
-                if sto:
+                if not sto:
+                    self[sfrom].set_broadcast_status(stanza)
+                elif not getattr(stanza, 'roster_broadcast', False):
                     self[sfrom][sto].last_status = stanza
-                else:
-                    self[sfrom].last_status = stanza
-                    with self[sfrom]._last_status_lock:
-                        for jid in self[sfrom]:
-                            self[sfrom][jid].last_status = None
 
                 if not self.xmpp.sentpresence:
                     self.xmpp.event('sent_presence')
@@ -123,7 +134,10 @@ class Roster(object):
 
         node = node.bare
         if node not in self._rosters:
-            self._rosters[node] = RosterNode(self.xmpp, node, self.db)
+            self._rosters[node] = RosterNode(self.xmpp, node, self.db,
+                                             compact=self._compact,
+                                             index=self.index,
+                                             group_table=self.group_table)
 
     def set_backend(self, db=None, save=True):
         """
@@ -173,6 +187,21 @@ class Roster(object):
             kwargs['pfrom'] = self.jid
         self.xmpp.send_presence(**kwargs)
 
+    async def broadcast_presence(self, rate=None, chunk_size=100, **kwargs):
+        """
+        Send a presence to the subscribed contacts of every roster node,
+        one node after the other.
+
+        Return the number of sent presences.
+
+        See RosterNode.broadcast_presence for the arguments.
+        """
+        sent = 0
+        for node in list(self._rosters):
+            sent += await self._rosters[node].broadcast_presence(
+                rate=rate, chunk_size=chunk_size, **kwargs)
+        return sent
+
     @property
     def auto_authorize(self):
         """
@@ -217,5 +246,23 @@ class Roster(object):
         for node in self._rosters:
             self._rosters[node].auto_subscribe = value
 
+    @property
+    def compact(self):
+        """
+        Use CompactRosterItem entries, which take less memory, for
+        the roster items created from now on.
+        """
+        return self._compact
+
+    @compact.setter
+    def compact(self, value):
+        """
+        Use CompactRosterItem entries, which take less memory, for
+        the roster items created from now on.
+        """
+        self._compact = value
+        for node in self._rosters:
+            self._rosters[node].compact = value
+
     def __repr__(self):
         return repr(self._rosters)
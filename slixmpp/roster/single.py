@@ -3,10 +3,13 @@
 # Copyright (C) 2010  Nathanael C. Fritz
 # This file is part of Slixmpp.
 # See the file LICENSE for copying permission.
+import asyncio
 import threading
 
+from copy import copy
+
 from slixmpp.xmlstream import JID
-from slixmpp.roster import RosterItem
+from slixmpp.roster import RosterItem, CompactRosterItem, GroupTable
 
 
 class RosterNode(object):
@@ -30,6 +33,14 @@ class RosterNode(object):
                           Defaults to True
         last_status    -- The last sent presence status that was broadcast
                           to all contact JIDs.
+        status_epoch   -- Incremented on each broadcast, which invalidates
+                          the last_status of every roster item at once.
+        compact        -- Create CompactRosterItem entries instead of
+                          RosterItem entries. Defaults to False.
+        index          -- The PresenceIndex updated by the roster items,
+                          if any.
+        group_table    -- The GroupTable sharing the groups of the
+                          CompactRosterItem entries.
 
     Methods:
         add           -- Add a JID to the roster.
@@ -39,24 +50,35 @@ class RosterNode(object):
         remove        -- Remove a JID from the roster.
         presence      -- Return presence information for a JID's resources.
         send_presence -- Shortcut for sending a presence stanza.
+        broadcast_presence -- Send a presence to every subscribed contact.
     """
 
-    def __init__(self, xmpp, jid, db=None):
+    def __init__(self, xmpp, jid, db=None, compact=False, index=None,
+                 group_table=None):
         """
         Create a roster node for a JID.
 
         Arguments:
-            xmpp -- The main Slixmpp instance.
-            jid  -- The JID that owns the roster.
-            db   -- Optional interface to an external datastore.
+            xmpp    -- The main Slixmpp instance.
+            jid     -- The JID that owns the roster.
+            db      -- Optional interface to an external datastore.
+            compact -- Use CompactRosterItem entries.
+            index   -- Optional PresenceIndex to keep up to date.
+            group_table -- Optional GroupTable shared with other roster
+                           nodes.
         """
         self.xmpp = xmpp
         self.jid = jid
         self.db = db
+        self.compact = compact
+        self.index = index
+        self.group_table = group_table if group_table is not None \
+                           else GroupTable()
         self.ignore_updates = False
         self.auto_authorize = True
         self.auto_subscribe = True
         self.last_status = None
+        self.status_epoch = 0
         self._version = ''
         self._jids = {}
         self._last_status_lock = threading.Lock()
@@ -108,7 +130,14 @@ class RosterNode(object):
             key = JID(key)
         key = key.bare
         if key in self._jids:
-            del self._jids[key]
+            if self.index is not None:
+                self.index.remove_contact(self.jid, key)
+            self._release(self._jids.pop(key))
+
+    @staticmethod
+    def _release(item):
+        if isinstance(item, CompactRosterItem):
+            item.release_groups()
 
     def __len__(self):
         """Return the number of JIDs referenced by the roster."""
@@ -200,7 +229,10 @@ class RosterNode(object):
                  'pending_out': pending_out,
                  'whitelisted': whitelisted,
                  'subscription': 'none'}
-        self._jids[key] = RosterItem(self.xmpp, jid, self.jid,
+        item_class = CompactRosterItem if self.compact else RosterItem
+        if key in self._jids:
+            self._release(self._jids[key])
+        self._jids[key] = item_class(self.xmpp, jid, self.jid,
                                      state=state, db=self.db,
                                      roster=self)
         if save:
@@ -320,6 +352,70 @@ class RosterNode(object):
             kwargs['pfrom'] = self.jid
         self.xmpp.send_presence(**kwargs)
 
+    def set_broadcast_status(self, presence):
+        """
+        Record a presence sent to every contact, which replaces the
+        last presence sent to each of them.
+
+        Arguments:
+            presence -- The broadcast presence stanza.
+        """
+        self.last_status = presence
+        self.status_epoch += 1
+
+    async def broadcast_presence(self, rate=None, chunk_size=100, **kwargs):
+        """
+        Send a presence to every contact subscribed to this JID.
+
+        A client sends a single presence, which the server broadcasts.
+        A component sends a directed presence to each contact with a
+        'from' subscription, `chunk_size` presences at a time, letting
+        the event loop run between two chunks.
+
+        Return the number of sent presences.
+
+        Arguments:
+            rate       -- The maximum number of presences sent per
+                          second, to stay under the rate limits of the
+                          server. Defaults to no limit.
+            chunk_size -- The number of presences sent at once.
+                          Defaults to 100, and never more than rate.
+
+        See send_presence for the other arguments.
+        """
+        if not self.xmpp.is_component:
+            self.send_presence(**kwargs)
+            return 1
+
+        kwargs.pop('pto', None)
+        if not kwargs.get('pfrom', ''):
+            kwargs['pfrom'] = self.jid
+        template = self.xmpp.make_presence(**kwargs)
+        self.set_broadcast_status(template)
+
+        if rate:
+            # A full chunk must not go over the rate on its own.
+            chunk_size = max(min(chunk_size, int(rate)), 1)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        sent = 0
+        for jid in list(self._jids):
+            item = self._jids.get(jid)
+            if item is None or not item['from']:
+                continue
+            pres = copy(template)
+            pres['to'] = jid
+            # Already recorded as the status of the whole roster.
+            pres.roster_broadcast = True
+            pres.send()
+            sent += 1
+            if sent % chunk_size == 0:
+                delay = 0
+                if rate:
+                    delay = max(start + sent / rate - loop.time(), 0)
+                await asyncio.sleep(delay)
+        return sent
+
     def send_last_presence(self):
         if self.last_status is None:
             self.send_presence()
@@ -6,8 +6,7 @@
 import asyncio
 from slixmpp.stanza.rootstanza import RootStanza
 from slixmpp.xmlstream import StanzaBase, ET
-from slixmpp.xmlstream.handler import Callback, CoroutineCallback
-from slixmpp.xmlstream.matcher import MatchIDSender, MatcherId
+from slixmpp.xmlstream.iqtracker import allowed_senders
 from slixmpp.exceptions import IqTimeout, IqError
 
 
@@ -57,6 +56,7 @@ class Iq(RootStanza):
     interfaces = {'type', 'to', 'from', 'id', 'query'}
     types = {'get', 'result', 'set', 'error'}
     plugin_attrib = name
+    send_lane = 'iq'
 
     def __init__(self, *args, recv=False, **kwargs):
         """
@@ -64,7 +64,7 @@ class Iq(RootStanza):
 
         Overrides StanzaBase.__init__.
         """
-        StanzaBase.__init__(self, *args, **kwargs)
+        StanzaBase.__init__(self, *args, recv=recv, **kwargs)
         if not recv and self['id'] == '':
             if self.stream is not None:
                 self['id'] = self.stream.new_id()
@@ -149,7 +149,8 @@ class Iq(RootStanza):
         new_iq['type'] = 'result'
         return new_iq
 
-    def send(self, callback=None, timeout=None, timeout_callback=None):
+    def send(self, callback=None, timeout=None, timeout_callback=None,
+             lane=None):
         """Send an <iq> stanza over the XML stream.
 
         A callback handler can be provided that will be executed when the Iq
@@ -171,20 +172,18 @@ class Iq(RootStanza):
                                           timeout expires before a response has
                                           been received for the originally-sent
                                           IQ stanza.
+        :param str lane: The lane of the send queue to use, defaults
+                         to ``'iq'``.
         :rtype: asyncio.Future
         """
         if self.stream.session_bind_event.is_set():
-            matcher = MatchIDSender({
-                'id': self['id'],
-                'self': self.stream.boundjid,
-                'peer': self['to']
-            })
+            senders = allowed_senders(self.stream.boundjid, self['to'])
         else:
-            matcher = MatcherId(self['id'])
+            senders = None
 
         future = asyncio.Future()
 
-        # Prevents handlers from existing forever.
+        # Prevents requests from waiting forever.
         if timeout is None:
             timeout = 120
 
@@ -197,57 +196,38 @@ class Iq(RootStanza):
                 if not future.done():
                     future.set_exception(IqError(result))
             else:
-                # Most likely an iq addressed to ourself, rearm the callback.
-                handler = constr(handler_name,
-                                 matcher,
-                                 callback_success,
-                                 once=True)
-                self.stream.register_handler(handler)
-                return
-
-            if timeout is not None:
-                self.stream.cancel_schedule('IqTimeout_%s' % self['id'])
+                # Most likely an iq addressed to ourself, keep waiting.
+                return False
+
             if callback is not None:
-                callback(result)
+                if asyncio.iscoroutinefunction(callback):
+                    async def callback_routine():
+                        try:
+                            await callback(result)
+                        except Exception as e:
+                            result.exception(e)
+                    asyncio.ensure_future(callback_routine())
+                else:
+                    callback(result)
+            return True
 
         def callback_timeout():
             if not future.done():
                 future.set_exception(IqTimeout(self))
-            self.stream.remove_handler('IqCallback_%s' % self['id'])
             if timeout_callback is not None:
                 timeout_callback(self)
 
         if self['type'] in ('get', 'set'):
-            handler_name = 'IqCallback_%s' % self['id']
-            if asyncio.iscoroutinefunction(callback):
-                constr = CoroutineCallback
-            else:
-                constr = Callback
-            if timeout is not None:
-                self.stream.schedule('IqTimeout_%s' % self['id'],
-                                     timeout,
-                                     callback_timeout,
-                                     repeat=False)
-            handler = constr(handler_name,
-                             matcher,
-                             callback_success,
-                             once=True)
-            self.stream.register_handler(handler)
+            self.stream.iq_tracker.track(self['id'],
+                                         callback_success,
+                                         callback_timeout,
+                                         timeout=timeout,
+                                         senders=senders)
         else:
             future.set_result(None)
-        StanzaBase.send(self)
+        StanzaBase.send(self, lane=lane)
         return future
 
-    def _handle_result(self, iq):
-        # we got the IQ, so don't fire the timeout
-        self.stream.cancel_schedule('IqTimeout_%s' % self['id'])
-        self.callback(iq)
-
-    def _fire_timeout(self):
-        # don't fire the handler for the IQ, if it finally does come in
-        self.stream.remove_handler('IqCallback_%s' % self['id'])
-        self.timeout_callback(self)
-
     def _set_stanza_values(self, values):
         """
         Set multiple stanza interface values using a dictionary.
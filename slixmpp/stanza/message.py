@@ -59,7 +59,7 @@ class Message(RootStanza):
 
         Overrides StanzaBase.__init__.
         """
-        StanzaBase.__init__(self, *args, **kwargs)
+        StanzaBase.__init__(self, *args, recv=recv, **kwargs)
         if not recv and self['id'] == '':
             if self.stream:
                 use_ids = getattr(self.stream, 'use_message_ids', None)
@@ -25,6 +25,8 @@ class RootStanza(StanzaBase):
         exception -- Overrides StanzaBase.exception
     """
 
+    send_lane = 'normal'
+
     def exception(self, e):
         """
         Create and send an error reply.
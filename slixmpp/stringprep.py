@@ -7,6 +7,7 @@
 # :license: MIT, see LICENSE for more details
 import logging
 import stringprep
+from functools import lru_cache
 from slixmpp.util import stringprep_profiles
 import encodings.idna
 
@@ -20,6 +21,19 @@ ILLEGAL_CHARS = ('\x00\x01\x02\x03\x04\x05\x06\x07\x08\t\n\x0b\x0c\r'
                  ' !"#$%&\'()*+,./:;<=>?@[\\]^_`{|}~\x7f')
 
 
+#: ASCII characters prohibited by nodeprep: control characters, the
+#: ASCII space, and the characters excluded from the local part.
+_NODEPREP_ASCII_PROHIBITED = frozenset(
+    [chr(c) for c in range(0x20)] + ['\x7f'] + list(' \'"&/:<>@'))
+
+#: ASCII characters prohibited by resourceprep: control characters.
+_RESOURCEPREP_ASCII_PROHIBITED = frozenset(
+    [chr(c) for c in range(0x20)] + ['\x7f'])
+
+#: The number of prepared strings kept in cache by each profile.
+CACHE_SIZE = 4096
+
+
 # pylint: disable=c0103
 #: The nodeprep profile of stringprep used to validate the local,
 #: or username, portion of a JID.
@@ -44,7 +58,14 @@ _nodeprep = stringprep_profiles.create(
         lambda c: c in ' \'"&/:<>@'],
     unassigned=[stringprep.in_table_a1])
 
+@lru_cache(maxsize=CACHE_SIZE)
 def nodeprep(node):
+    # ASCII is never mapped except for case folding, never changed by
+    # NFKC and never contains bidi RandALCat characters.
+    if type(node) is str and node.isascii():
+        if not _NODEPREP_ASCII_PROHIBITED.isdisjoint(node):
+            raise StringprepError
+        return node.lower()
     try:
         return _nodeprep(node)
     except stringprep_profiles.StringPrepError:
@@ -70,7 +91,14 @@ _resourceprep = stringprep_profiles.create(
         stringprep.in_table_c9],
     unassigned=[stringprep.in_table_a1])
 
+@lru_cache(maxsize=CACHE_SIZE)
 def resourceprep(resource):
+    # ASCII is left unchanged by resourceprep, only control characters
+    # are prohibited.
+    if type(resource) is str and resource.isascii():
+        if not _RESOURCEPREP_ASCII_PROHIBITED.isdisjoint(resource):
+            raise StringprepError
+        return resource
     try:
         return _resourceprep(resource)
     except stringprep_profiles.StringPrepError:
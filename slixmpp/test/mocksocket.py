@@ -207,6 +207,17 @@ class TestTransport(object):
         self.socket.send(data)
         return len(data)
 
+    def writelines(self, list_of_data):
+        """
+        Send each item of a list of data, so that batched stanzas
+        can still be checked one at a time.
+
+        Arguments:
+            list_of_data -- List of string values to write.
+        """
+        for data in list_of_data:
+            self.socket.send(data)
+
     # ------------------------------------------------------------------
     # File Socket
 
@@ -63,6 +63,8 @@ class SlixTest(unittest.TestCase):
                 known_prefixes = {
                         'stream': 'http://etherx.jabber.org/streams'}
 
+                if isinstance(xml_string, bytes):
+                    xml_string = xml_string.decode('utf-8')
                 prefix = xml_string.split('<')[1].split(':')[0]
                 if prefix in known_prefixes:
                     xml_string = '<fixns xmlns:%s="%s">%s</fixns>' % (
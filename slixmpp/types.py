@@ -81,7 +81,7 @@ OptJidStr = Optional[Union[str, JID]]
 
 MAMDefault = Literal['always', 'never', 'roster']
 
-FilterString = Literal['in', 'out', 'out_sync']
+FilterString = Literal['in', 'out', 'out_sync', 'out_serialized']
 
 __all__ = [
     'Protocol', 'TypedDict', 'Literal', 'OptJid', 'JidStr', 'MAMDefault',
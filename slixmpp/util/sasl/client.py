@@ -101,6 +101,9 @@ class Mech(object):
     score = -1
     use_hashes = False
     channel_binding = False
+    #: Whether processing a challenge is CPU-bound, and should run
+    #: outside of the event loop.
+    cpu_bound = False
     required_credentials: Set[str] = set()
     optional_credentials: Set[str] = set()
     security: Set[str] = set()
@@ -7,11 +7,14 @@
 # :copryight: (c) 2004-2013 David Alan Cridland
 # :copyright: (c) 2013 Nathanael C. Fritz, Lance J.T. Stout
 # :license: MIT, see LICENSE for more details
+import hashlib
 import hmac
+import os
 import random
 
 from base64 import b64encode, b64decode
-from typing import List, Dict, Optional
+from collections import OrderedDict
+from typing import Callable, List, Dict, Optional, Tuple
 
 bytes_ = bytes
 
@@ -173,12 +176,98 @@ class CRAM(Mech):
         return username + b' ' + bytes(mac.hexdigest())
 
 
+#: Number of SCRAM keys kept by :func:`scram_keys`, so that
+#: reconnecting does not derive them again.
+SCRAM_CACHE_SIZE = 4096
+
+# The cached keys, by hash name, password digest, salt and iteration
+# count, from the least recently used.
+_scram_cache: 'OrderedDict[Tuple[str, bytes_, bytes_, int], Tuple[bytes_, bytes_, bytes_, bytes_]]' = \
+    OrderedDict()
+
+# Passwords are only kept in the cache as an HMAC under this random
+# key, so that the cache never holds them in clear.
+_scram_cache_key = os.urandom(32)
+
+
+def _password_digest(password: bytes_) -> bytes_:
+    return hmac.new(_scram_cache_key, password, hashlib.sha256).digest()
+
+
+def _hmac(hash: Callable, key: bytes_, msg: bytes_) -> bytes_:
+    return hmac.new(key, msg, hash).digest()
+
+
+def scram_keys(hash_name: str, password: bytes_, salt: bytes_,
+               iterations: int) -> Tuple[bytes_, bytes_, bytes_, bytes_]:
+    """
+    Derive the SaltedPassword, ClientKey, StoredKey and ServerKey of
+    SCRAM (RFC 5802).
+
+    The results of the last :data:`SCRAM_CACHE_SIZE` derivations are
+    cached, so the PBKDF2 derivation only runs once for a given
+    password, salt and iteration count. The cache is keyed on a keyed
+    digest of the password, not on the password itself; use
+    :func:`clear_scram_keys` to remove the keys of a password which
+    is no longer used.
+
+    :param hash_name: The name of the hash in :mod:`hashlib`.
+    """
+    key = (hash_name, _password_digest(password), salt, iterations)
+    keys = _scram_cache.get(key)
+    if keys is not None:
+        _scram_cache.move_to_end(key)
+        return keys
+    keys = _derive_scram_keys(hash_name, password, salt, iterations)
+    _scram_cache[key] = keys
+    if len(_scram_cache) > SCRAM_CACHE_SIZE:
+        _scram_cache.popitem(last=False)
+    return keys
+
+
+def clear_scram_keys(password: Optional[bytes_] = None) -> None:
+    """
+    Remove cached SCRAM keys.
+
+    :param password: The password whose keys are removed, as bytes or
+                     text, or ``None`` to remove every cached key.
+    """
+    if password is None:
+        _scram_cache.clear()
+        return
+    digest = _password_digest(bytes(password))
+    for key in [key for key in _scram_cache if key[1] == digest]:
+        del _scram_cache[key]
+
+
+def _derive_scram_keys(hash_name: str, password: bytes_, salt: bytes_,
+                       iterations: int
+                       ) -> Tuple[bytes_, bytes_, bytes_, bytes_]:
+    hash = getattr(hashlib, hash_name)
+    try:
+        salted_password = hashlib.pbkdf2_hmac(hash_name, password, salt,
+                                              iterations)
+    except ValueError:
+        # The hash is unknown to the PBKDF2 implementation.
+        ui1 = _hmac(hash, password, salt + b'\0\0\0\01')
+        ui = ui1
+        for i in range(iterations - 1):
+            ui1 = _hmac(hash, password, ui1)
+            ui = XOR(ui, ui1)
+        salted_password = ui
+    client_key = _hmac(hash, salted_password, b'Client Key')
+    stored_key = hash(client_key).digest()
+    server_key = _hmac(hash, salted_password, b'Server Key')
+    return salted_password, client_key, stored_key, server_key
+
+
 @sasl_mech(60)
 class SCRAM(Mech):
 
     name = 'SCRAM'
     use_hashes = True
     channel_binding = True
+    cpu_bound = True
     required_credentials = {'username', 'password'}
     optional_credentials = {'authzid', 'channel_binding'}
     security = {'encrypted', 'unencrypted_scram'}
@@ -194,6 +283,7 @@ class SCRAM(Mech):
 
         if self.hash is None:
             raise SASLCancelled('Unknown hash: %s' % self.hash_name)
+        self._hashlib_name = self.hash().name
         if not self.security_settings['encrypted']:
             if not self.security_settings['unencrypted_scram']:
                 raise SASLCancelled('Unencrypted SCRAM')
@@ -205,13 +295,8 @@ class SCRAM(Mech):
         return hmac.HMAC(key=key, msg=msg, digestmod=self.hash).digest()
 
     def Hi(self, text: str, salt: bytes_, iterations: int):
-        text_enc = bytes(text)
-        ui1 = self.HMAC(text_enc, salt + b'\0\0\0\01')
-        ui = ui1
-        for i in range(iterations - 1):
-            ui1 = self.HMAC(text_enc, ui1)
-            ui = XOR(ui, ui1)
-        return ui
+        return scram_keys(self._hashlib_name, bytes(text), salt,
+                          iterations)[0]
 
     def H(self, text: str) -> bytes_:
         return self.hash(text).digest()
@@ -287,17 +372,15 @@ class SCRAM(Mech):
 
         client_final_message_without_proof = channel_binding + b',r=' + nonce
 
-        salted_password = self.Hi(self.credentials['password'],
-                                       salt,
-                                       iteration_count)
-        client_key = self.HMAC(salted_password, b'Client Key')
-        stored_key = self.H(client_key)
+        salted_password, client_key, stored_key, server_key = scram_keys(
+            self._hashlib_name, bytes(self.credentials['password']),
+            salt, iteration_count,
+        )
         auth_message = self.client_first_message_bare + b',' + \
                        challenge + b',' + \
                        client_final_message_without_proof
         client_signature = self.HMAC(stored_key, auth_message)
         client_proof = XOR(client_key, client_signature)
-        server_key = self.HMAC(salted_password, b'Server Key')
 
         self.server_signature = self.HMAC(server_key, auth_message)
 
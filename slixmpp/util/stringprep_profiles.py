@@ -11,11 +11,17 @@
 from __future__ import unicode_literals
 
 import stringprep
+from functools import lru_cache
 from unicodedata import ucd_3_2_0 as unicodedata
 
 from slixmpp.util import unicode
 
 
+#: The number of characters whose mapping and prohibition are
+#: remembered by each profile.
+CHAR_CACHE_SIZE = 4096
+
+
 class StringPrepError(UnicodeError):
     pass
 
@@ -128,15 +134,33 @@ def create(nfkc=True, bidi=True, mappings=None,
     :return: Unicode string of the resulting text passing the
              profile's requirements.
     """
+    # The tables only depend on the character, so their combined
+    # result is remembered for the characters most recently seen.
+    @lru_cache(maxsize=CHAR_CACHE_SIZE)
+    def map_char(char):
+        for mapping in mappings:
+            replacement = mapping(char)
+            if replacement is not None:
+                return replacement
+        return char
+
+    @lru_cache(maxsize=CHAR_CACHE_SIZE)
+    def is_prohibited(char):
+        return any(check(char) for check in prohibited)
+
     def profile(data, query=False):
         try:
             data = unicode(data)
         except UnicodeError:
             raise StringPrepError
 
-        data = map_input(data, mappings)
+        if mappings:
+            data = ''.join([map_char(char) for char in data])
         data = normalize(data, nfkc)
-        prohibit_output(data, prohibited)
+        if prohibited:
+            for char in data:
+                if is_prohibited(char):
+                    raise StringPrepError("Prohibited code point: %s" % char)
         if bidi:
             check_bidi(data)
         if query and unassigned:
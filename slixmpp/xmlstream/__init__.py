@@ -8,7 +8,8 @@ from slixmpp.xmlstream.stanzabase import StanzaBase, ElementBase, ET
 from slixmpp.xmlstream.stanzabase import register_stanza_plugin
 from slixmpp.xmlstream.tostring import tostring, highlight
 from slixmpp.xmlstream.xmlstream import XMLStream, RESPONSE_TIMEOUT
+from slixmpp.xmlstream.executor import offload
 
 __all__ = ['JID', 'StanzaBase', 'ElementBase',
            'ET', 'StateMachine', 'tostring', 'highlight', 'XMLStream',
-           'RESPONSE_TIMEOUT']
+           'RESPONSE_TIMEOUT', 'offload']
@@ -0,0 +1,130 @@
+# slixmpp.xmlstream.connector
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# This module provides a "happy eyeballs" connector (RFC 8305), which
+# tries the addresses of a server concurrently with staggered starts.
+# Part of Slixmpp: The Slick XMPP Library
+# :copyright: (c) 2011 Nathanael C. Fritz
+# :license: MIT, see LICENSE for more details
+from __future__ import annotations
+
+import asyncio
+import logging
+import socket
+
+from asyncio import AbstractEventLoop
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+log = logging.getLogger(__name__)
+
+#: A DNS answer, as returned by :func:`~.resolver.resolve`: the name of
+#: the target, its address, and the port.
+Record = Tuple[str, str, int]
+
+
+def _family(address: str) -> socket.AddressFamily:
+    return socket.AF_INET6 if ':' in address else socket.AF_INET
+
+
+def interleave(records: Iterable[Record]) -> List[Record]:
+    """Order DNS answers so that IPv6 and IPv4 addresses alternate,
+    starting with the family of the first answer, and keeping the
+    order of each family (which is the order of the SRV targets).
+    """
+    records = list(records)
+    if not records:
+        return records
+    first = _family(records[0][1])
+    preferred = [record for record in records if _family(record[1]) == first]
+    others = [record for record in records if _family(record[1]) != first]
+    result = []
+    for i in range(max(len(preferred), len(others))):
+        if i < len(preferred):
+            result.append(preferred[i])
+        if i < len(others):
+            result.append(others[i])
+    return result
+
+
+async def open_socket(address: str, port: int, *,
+                      loop: AbstractEventLoop) -> socket.socket:
+    """Open a TCP connection to an IP address, returning its socket."""
+    sock = socket.socket(_family(address), socket.SOCK_STREAM)
+    try:
+        sock.setblocking(False)
+        await loop.sock_connect(sock, (address, port))
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+async def race(records: Iterable[Record], *, loop: AbstractEventLoop,
+               delay: float = 0.25) -> Tuple[Record, socket.socket]:
+    """Connect to the first reachable of the given DNS answers.
+
+    The answers are tried in the order of :func:`interleave`. A new
+    attempt starts each time the previous one fails, or after
+    ``delay`` seconds if it still runs, so that an unreachable address
+    family or server does not delay the connection much. The first
+    successful attempt wins, and the others are cancelled.
+
+    :param records: The DNS answers, as returned by
+                    :func:`~.resolver.resolve`.
+    :param delay: The time, in seconds, to wait for an attempt before
+                  starting the next one.
+    :returns: The answer which won, and the socket connected to it.
+    :raises OSError: If no connection could be made.
+    """
+    candidates = iter(interleave(records))
+    attempts: Dict[asyncio.Future, Record] = {}
+    errors: List[OSError] = []
+    winner: Optional[Tuple[Record, socket.socket]] = None
+    try:
+        while winner is None:
+            record = next(candidates, None)
+            if record is not None:
+                log.debug('Connecting to %s (%s) on port %s', *record)
+                task = asyncio.ensure_future(
+                    open_socket(record[1], record[2], loop=loop),
+                    loop=loop,
+                )
+                attempts[task] = record
+            elif not attempts:
+                break
+            done, _ = await asyncio.wait(
+                attempts,
+                timeout=delay if record is not None else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for task in done:
+                record = attempts.pop(task)
+                error = task.exception()
+                if error is not None:
+                    log.debug('Connection to %s (%s) on port %s failed: %s',
+                              *record, error)
+                    errors.append(error)
+                elif winner is None:
+                    winner = (record, task.result())
+                else:
+                    task.result().close()
+    finally:
+        for task in attempts:
+            if task.done() and not task.cancelled() \
+                    and task.exception() is None:
+                task.result().close()
+            else:
+                task.cancel()
+    if winner is None:
+        if not errors:
+            raise OSError('No address to connect to')
+        if len(errors) == 1:
+            raise errors[0]
+        raise OSError('Multiple exceptions: %s' %
+                      ', '.join(str(error) for error in errors))
+    return winner
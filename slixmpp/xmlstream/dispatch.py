@@ -0,0 +1,198 @@
+# slixmpp.xmlstream.dispatch
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~
+# This module provides the index used by the XML stream to find
+# the stream handlers that may match an incoming stanza without
+# testing every registered matcher.
+# Part of Slixmpp: The Slick XMPP Library
+# :copyright: (c) 2011 Nathanael C. Fritz
+# :license: MIT, see LICENSE for more details
+from __future__ import annotations
+
+import itertools
+
+from typing import (
+    Any,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TYPE_CHECKING,
+)
+
+from slixmpp.xmlstream.matcher.id import MatcherId
+from slixmpp.xmlstream.matcher.idsender import MatchIDSender
+from slixmpp.xmlstream.matcher.stanzapath import StanzaPath
+from slixmpp.xmlstream.matcher.xmlmask import MatchXMLMask
+
+if TYPE_CHECKING:
+    from slixmpp.xmlstream.handler.base import BaseHandler
+    from slixmpp.xmlstream.stanzabase import StanzaBase
+
+
+def _tag_namespace(tag: str) -> str:
+    """Return the namespace part of a ``{namespace}name`` tag."""
+    if tag[:1] == '{':
+        return tag[1:].split('}', 1)[0]
+    return ''
+
+
+class HandlerIndex:
+
+    """
+    An ordered collection of stream handlers, indexed by what their
+    matchers can possibly accept.
+
+    Handlers using a plain :class:`~.MatcherId` or
+    :class:`~.MatchIDSender` are keyed by the expected stanza id,
+    :class:`~.StanzaPath` handlers by the first element of their path,
+    and namespaced :class:`~.MatchXMLMask` handlers by the mask root tag
+    and the namespace of its first child. Every other handler is kept in
+    a residual list which is always scanned.
+
+    :meth:`candidates` never returns fewer handlers than the ones which
+    would match the stanza, and always returns them in registration
+    order; the caller is still responsible for calling
+    :meth:`~.BaseHandler.match` on each of them.
+    """
+
+    #: Registration order of every handler, also used as the
+    #: canonical ordered list of handlers.
+    _order: Dict[BaseHandler, int]
+    #: Where each handler has been indexed: (bucket dict, key)
+    _location: Dict[BaseHandler, Tuple[Optional[Dict[Any, List[BaseHandler]]], Hashable]]
+    _by_name: Dict[str, List[BaseHandler]]
+    _by_id: Dict[str, List[BaseHandler]]
+    _by_path: Dict[str, List[BaseHandler]]
+    _by_mask: Dict[Tuple[str, Optional[str]], List[BaseHandler]]
+    _generic: List[BaseHandler]
+
+    def __init__(self) -> None:
+        self._counter = itertools.count()
+        self._order = {}
+        self._location = {}
+        self._by_name = {}
+        self._by_id = {}
+        self._by_path = {}
+        self._by_mask = {}
+        self._generic = []
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __iter__(self) -> Iterator[BaseHandler]:
+        return iter(list(self._order))
+
+    def __contains__(self, handler: object) -> bool:
+        return handler in self._order
+
+    def _bucket_for(self, handler: BaseHandler) -> Tuple[Optional[Dict[Any, List[BaseHandler]]], Hashable]:
+        """Find the index bucket in which a handler must be stored."""
+        matcher = getattr(handler, '_matcher', None)
+        matcher_type = type(matcher)
+        if matcher_type is MatcherId:
+            return self._by_id, matcher._criteria
+        if matcher_type is MatchIDSender:
+            return self._by_id, matcher._criteria['id']
+        if matcher_type is StanzaPath and matcher._criteria:
+            return self._by_path, matcher._criteria[0].split('@')[0]
+        if matcher_type is MatchXMLMask:
+            mask = matcher._criteria
+            # Masks without a namespace are compared against the matcher
+            # default namespace, which may change after registration.
+            if mask.tag[:1] == '{':
+                first_child = next(iter(mask), None)
+                child_ns = None
+                if first_child is not None:
+                    child_ns = _tag_namespace(first_child.tag)
+                return self._by_mask, (mask.tag, child_ns)
+        return None, None
+
+    def add(self, handler: BaseHandler) -> None:
+        """Add a handler after all the already registered ones."""
+        if handler in self._order:
+            return
+        self._order[handler] = next(self._counter)
+        self._by_name.setdefault(handler.name, []).append(handler)
+        bucket, key = self._bucket_for(handler)
+        self._location[handler] = (bucket, key)
+        if bucket is None:
+            self._generic.append(handler)
+        else:
+            bucket.setdefault(key, []).append(handler)
+
+    def remove(self, handler: BaseHandler) -> bool:
+        """Remove a handler from the index.
+
+        :returns: ``True`` if the handler was registered.
+        """
+        if self._order.pop(handler, None) is None:
+            return False
+        named = self._by_name[handler.name]
+        named.remove(handler)
+        if not named:
+            del self._by_name[handler.name]
+        bucket, key = self._location.pop(handler)
+        if bucket is None:
+            self._generic.remove(handler)
+        else:
+            handlers = bucket[key]
+            handlers.remove(handler)
+            if not handlers:
+                del bucket[key]
+        return True
+
+    def remove_name(self, name: str) -> bool:
+        """Remove the oldest handler registered with the given name.
+
+        :returns: ``True`` if a handler was removed.
+        """
+        named = self._by_name.get(name)
+        if not named:
+            return False
+        return self.remove(named[0])
+
+    def candidates(self, stanza: StanzaBase) -> List[BaseHandler]:
+        """Return the handlers which may match a stanza, in registration
+        order.
+
+        :param stanza: The incoming stanza.
+        """
+        groups: List[List[BaseHandler]] = []
+        if self._by_id:
+            by_id = self._by_id.get(stanza['id'])
+            if by_id:
+                groups.append(by_id)
+        if self._by_path:
+            # Mirror the first step of ElementBase.match()
+            name = stanza.name
+            qualified = '{%s}%s' % (stanza.namespace, name)
+            loaded = stanza.loaded_plugins
+            plugin_attrib = stanza.plugin_attrib
+            for tag, by_path in self._by_path.items():
+                if tag == name or tag == qualified or tag in loaded \
+                   or tag in plugin_attrib:
+                    groups.append(by_path)
+        if self._by_mask:
+            xml = stanza.xml
+            root = xml.tag
+            keys: List[Tuple[str, Optional[str]]] = [(root, None)]
+            for child in xml:
+                if isinstance(child.tag, str):
+                    key = (root, _tag_namespace(child.tag))
+                    if key not in keys:
+                        keys.append(key)
+            for key in keys:
+                by_mask = self._by_mask.get(key)
+                if by_mask:
+                    groups.append(by_mask)
+        if self._generic:
+            groups.append(self._generic)
+
+        if not groups:
+            return []
+        if len(groups) == 1:
+            return list(groups[0])
+        return sorted(itertools.chain.from_iterable(groups),
+                      key=self._order.__getitem__)
@@ -0,0 +1,77 @@
+# slixmpp.xmlstream.executor
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~
+# This module provides helpers to run CPU-bound code outside of the
+# event loop.
+# Part of Slixmpp: The Slick XMPP Library
+# :copyright: (c) 2011 Nathanael C. Fritz
+# :license: MIT, see LICENSE for more details
+from __future__ import annotations
+
+import asyncio
+import functools
+
+from concurrent.futures import Executor
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Optional,
+    TypeVar,
+    overload,
+)
+
+T = TypeVar('T')
+
+
+def run_in_executor(executor: Optional[Executor], func: Callable[..., T],
+                    *args: Any, **kwargs: Any) -> asyncio.Future[T]:
+    """Run a function in an executor, from the running event loop.
+
+    :param executor: The executor, or ``None`` for the default one of
+                     the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    if kwargs:
+        func = functools.partial(func, **kwargs)
+    return loop.run_in_executor(executor, func, *args)
+
+
+@overload
+def offload(func: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+    ...
+
+
+@overload
+def offload(*, executor: Optional[Executor] = None
+            ) -> Callable[[Callable[..., T]], Callable[..., Awaitable[T]]]:
+    ...
+
+
+def offload(func: Optional[Callable[..., T]] = None, *,
+            executor: Optional[Executor] = None) -> Any:
+    """Turn a blocking function into a coroutine function which runs it
+    in an executor, so that it can be used as an event handler without
+    blocking the event loop::
+
+        @offload
+        def on_message(msg):
+            ...
+
+        xmpp.add_event_handler('message', on_message)
+
+    With a :class:`~concurrent.futures.ProcessPoolExecutor`, the
+    function and its arguments must be picklable, which stanzas are
+    not.
+
+    :param executor: The executor, or ``None`` for the default one of
+                     the event loop.
+    """
+    def decorator(func: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            return await run_in_executor(executor, func, *args, **kwargs)
+        return wrapper
+
+    if func is None:
+        return decorator
+    return decorator(func)
@@ -5,7 +5,9 @@
 # :license: MIT, see LICENSE for more details
 from __future__ import annotations
 
+from asyncio import Future
 from typing import Optional, Callable, Any, TYPE_CHECKING
+from slixmpp.xmlstream.executor import run_in_executor
 from slixmpp.xmlstream.handler.base import BaseHandler
 from slixmpp.xmlstream.matcher.base import MatcherBase
 
@@ -42,19 +44,33 @@ class Callback(BaseHandler):
                           main event loop.
     :param stream: The :class:`~slixmpp.xmlstream.xmlstream.XMLStream`
                    instance this handler should monitor.
+    :param bool offload: Indicates if the callback should be executed
+                         in the :attr:`~.XMLStream.executor` of the
+                         stream, for CPU-bound work. The callback must
+                         then be thread-safe, and should schedule any
+                         further work, like sending a reply, with
+                         :meth:`~asyncio.AbstractEventLoop.call_soon_threadsafe`.
+                         It cannot work with a
+                         :class:`~concurrent.futures.ProcessPoolExecutor`,
+                         as the callback, often a bound method, and the
+                         stanza cannot be pickled.
+                         Defaults to False.
     """
     _once: bool
     _instream: bool
+    _offload: bool
 
     def __init__(self, name: str, matcher: MatcherBase,
                  pointer: Callable[[StanzaBase], Any],
                  once: bool = False, instream: bool = False,
-                 stream: Optional[XMLStream] = None):
+                 stream: Optional[XMLStream] = None,
+                 offload: bool = False):
         BaseHandler.__init__(self, name, matcher, stream)
         self._pointer: Callable[[StanzaBase], Any] = pointer
         self._pointer = pointer
         self._once = once
         self._instream = instream
+        self._offload = offload
 
     def prerun(self, payload: StanzaBase) -> None:
         """Execute the callback during stream processing, if
@@ -78,7 +94,22 @@ class Callback(BaseHandler):
                               :meth:`prerun()`. Defaults to ``False``.
         """
         if not self._instream or instream:
-            self._pointer(payload)
+            if self._offload:
+                self._run_offloaded(payload)
+            else:
+                self._pointer(payload)
             if self._once:
                 self._destroy = True
                 del self._pointer
+
+    def _run_offloaded(self, payload: StanzaBase) -> None:
+        stream = self.stream() if self.stream is not None else None
+        if stream is None:
+            future = run_in_executor(None, self._pointer, payload)
+        else:
+            future = stream.run_in_executor(self._pointer, payload)
+
+        def report(future: Future) -> None:
+            if not future.cancelled() and future.exception() is not None:
+                payload.exception(future.exception())
+        future.add_done_callback(report)
@@ -0,0 +1,288 @@
+# slixmpp.xmlstream.iqtracker
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# This module keeps track of the <iq/> requests waiting for
+# a response, and expires them when their timeout is reached.
+# Part of Slixmpp: The Slick XMPP Library
+# :copyright: (c) 2011 Nathanael C. Fritz
+# :license: MIT, see LICENSE for more details
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import math
+import weakref
+
+from asyncio import TimerHandle
+from typing import (
+    Callable,
+    Dict,
+    FrozenSet,
+    List,
+    Optional,
+    Tuple,
+    TYPE_CHECKING,
+)
+
+from slixmpp.jid import JID
+
+if TYPE_CHECKING:
+    from slixmpp.xmlstream.stanzabase import StanzaBase
+    from slixmpp.xmlstream.xmlstream import XMLStream
+
+
+log = logging.getLogger(__name__)
+
+
+#: Called with the response stanza, returns ``False`` if the request
+#: must keep waiting for another response.
+ResponseCallback = Callable[['StanzaBase'], bool]
+TimeoutCallback = Callable[[], None]
+
+
+def allowed_senders(selfjid: JID, peerjid: JID) -> FrozenSet[str]:
+    """Return the addresses from which a response to a request sent
+    by ``selfjid`` to ``peerjid`` is accepted.
+
+    This is the same set of addresses as the one used by
+    :class:`~slixmpp.xmlstream.matcher.idsender.MatchIDSender`.
+    """
+    return frozenset((
+        '',
+        selfjid.bare,
+        selfjid.domain,
+        peerjid.full,
+        peerjid.bare,
+        peerjid.domain,
+    ))
+
+
+class PendingIq:
+
+    """
+    A request waiting for its response.
+
+    :param iq_id: The id of the request.
+    :param on_response: Function called with the response.
+    :param on_timeout: Function called if no response has been
+                       received before ``deadline``.
+    :param deadline: Loop time at which the request expires.
+    :param senders: The accepted senders of the response, or ``None``
+                    to accept any.
+    """
+    __slots__ = ('id', 'on_response', 'on_timeout', 'deadline', 'senders',
+                 'done')
+
+    def __init__(self, iq_id: str, on_response: ResponseCallback,
+                 on_timeout: Optional[TimeoutCallback], deadline: float,
+                 senders: Optional[FrozenSet[str]] = None):
+        self.id = iq_id
+        self.on_response = on_response
+        self.on_timeout = on_timeout
+        self.deadline = deadline
+        self.senders = senders
+        self.done = False
+
+
+class IqTracker:
+
+    """
+    Table of the <iq/> requests waiting for a response.
+
+    Pending requests are stored by id, and each response is checked
+    against the accepted senders of the requests using that id. This
+    is done by the stream before running the generic stream handlers,
+    so tracking a request costs neither a stream handler nor a
+    scheduled event.
+
+    Timeouts are kept in a single heap, and a single timer is armed for
+    the earliest one. Deadlines are rounded up to :attr:`granularity`
+    so that requests sent close together share the same timer, and a
+    request never expires before its timeout.
+
+    :param stream: The :class:`~slixmpp.xmlstream.xmlstream.XMLStream`
+                   receiving the responses.
+    """
+
+    #: Resolution of the timeouts, in seconds.
+    granularity: float = 0.25
+
+    _pending: Dict[str, List[PendingIq]]
+    _heap: List[Tuple[float, int, PendingIq]]
+    _timer: Optional[TimerHandle]
+    _timer_deadline: float
+
+    def __init__(self, stream: XMLStream):
+        self.stream = weakref.ref(stream)
+        self._pending = {}
+        self._heap = []
+        self._counter = itertools.count()
+        self._dead = 0
+        self._timer = None
+        self._timer_deadline = math.inf
+
+    def __len__(self) -> int:
+        return len(self._heap) - self._dead
+
+    def __contains__(self, iq_id: object) -> bool:
+        return iq_id in self._pending
+
+    def track(self, iq_id: str, on_response: ResponseCallback,
+              on_timeout: Optional[TimeoutCallback] = None,
+              timeout: float = 120,
+              senders: Optional[FrozenSet[str]] = None) -> PendingIq:
+        """Wait for the response to a request.
+
+        :param iq_id: The id of the request.
+        :param on_response: Function called with the response stanza.
+                            If it returns ``False``, the request keeps
+                            waiting for another response.
+        :param on_timeout: Function called if no response has been
+                           received after ``timeout`` seconds.
+        :param timeout: The time to wait for a response, in seconds.
+        :param senders: The accepted senders of the response, see
+                        :func:`allowed_senders`. Defaults to ``None``,
+                        which accepts any sender.
+        """
+        stream = self._get_stream()
+        deadline = stream.loop.time() + timeout
+        entry = PendingIq(iq_id, on_response, on_timeout, deadline, senders)
+        self._pending.setdefault(iq_id, []).append(entry)
+        heapq.heappush(self._heap, (deadline, next(self._counter), entry))
+        self._arm()
+        return entry
+
+    def cancel(self, iq_id: str) -> bool:
+        """Stop waiting for the response to a request, without
+        calling any callback.
+
+        :param iq_id: The id of the request.
+        :returns: ``True`` if a request was pending with that id.
+        """
+        entries = self._pending.pop(iq_id, None)
+        if not entries:
+            return False
+        for entry in entries:
+            self._finish(entry)
+        self._compact()
+        return True
+
+    def clear(self) -> None:
+        """Forget every pending request, without calling any callback."""
+        for entries in self._pending.values():
+            for entry in entries:
+                entry.done = True
+        self._pending.clear()
+        self._heap.clear()
+        self._dead = 0
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+            self._timer_deadline = math.inf
+
+    def resolve(self, stanza: StanzaBase) -> bool:
+        """Give an incoming stanza to the requests it answers.
+
+        :param stanza: The incoming stanza.
+        :returns: ``True`` if the stanza was accepted by a request.
+        """
+        if not self._pending or stanza.name != 'iq':
+            return False
+        entries = self._pending.get(stanza['id'])
+        if not entries:
+            return False
+        sender = str(stanza['from'])
+        handled = False
+        for entry in list(entries):
+            if entry.senders is not None and sender not in entry.senders:
+                continue
+            handled = True
+            try:
+                keep = entry.on_response(stanza) is False
+            except Exception as e:
+                keep = False
+                stanza.exception(e)
+            if not keep:
+                self._discard(entry)
+        return handled
+
+    def _get_stream(self) -> XMLStream:
+        stream = self.stream()
+        if stream is None:
+            raise ValueError('IqTracker used without a stream')
+        return stream
+
+    def _finish(self, entry: PendingIq) -> None:
+        if not entry.done:
+            entry.done = True
+            self._dead += 1
+
+    def _discard(self, entry: PendingIq) -> None:
+        """Remove a request from the pending table."""
+        entries = self._pending.get(entry.id)
+        if entries is not None:
+            try:
+                entries.remove(entry)
+            except ValueError:
+                pass
+            if not entries:
+                del self._pending[entry.id]
+        self._finish(entry)
+        self._compact()
+
+    def _compact(self) -> None:
+        """Drop the finished requests from the heap once they make
+        up most of it."""
+        if self._dead > 1024 and self._dead * 2 > len(self._heap):
+            self._heap = [item for item in self._heap if not item[2].done]
+            heapq.heapify(self._heap)
+            self._dead = 0
+
+    def _arm(self) -> None:
+        """Make sure the timer fires in time for the earliest deadline."""
+        heap = self._heap
+        while heap and heap[0][2].done:
+            heapq.heappop(heap)
+            self._dead -= 1
+        if not heap:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+                self._timer_deadline = math.inf
+            return
+        granularity = self.granularity
+        deadline = math.ceil(heap[0][0] / granularity) * granularity
+        if self._timer is not None:
+            if self._timer_deadline <= deadline:
+                return
+            self._timer.cancel()
+        self._timer_deadline = deadline
+        self._timer = self._get_stream().loop.call_at(deadline, self._expire)
+
+    def _expire(self) -> None:
+        """Time out every request whose deadline has been reached."""
+        self._timer = None
+        self._timer_deadline = math.inf
+        stream = self.stream()
+        if stream is None:
+            return
+        now = stream.loop.time()
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            entry = heapq.heappop(heap)[2]
+            if entry.done:
+                self._dead -= 1
+                continue
+            entry.done = True
+            entries = self._pending.get(entry.id)
+            if entries is not None:
+                entries.remove(entry)
+                if not entries:
+                    del self._pending[entry.id]
+            log.debug('Request timed out: %s', entry.id)
+            if entry.on_timeout is not None:
+                try:
+                    entry.on_timeout()
+                except Exception as e:
+                    stream.exception(e)
+        self._arm()
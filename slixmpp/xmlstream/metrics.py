@@ -0,0 +1,323 @@
+# slixmpp.xmlstream.metrics
+# ~~~~~~~~~~~~~~~~~~~~~~~~~
+# This module provides the latency statistics gathered by the
+# XML stream, and the optional instrumentation built on them.
+# Part of Slixmpp: The Slick XMPP Library
+# :copyright: (c) 2011 Nathanael C. Fritz
+# :license: MIT, see LICENSE for more details
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import time
+
+from bisect import bisect_left
+from collections import deque
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+from xml.etree import ElementTree as ET
+
+log = logging.getLogger(__name__)
+
+#: Upper bounds, in seconds, of the buckets of the latency histograms.
+#: The last bucket holds every longer duration.
+BUCKETS: Tuple[float, ...] = (
+    0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0,
+)
+
+#: Categories of the durations recorded by :class:`StreamMetrics`.
+FILTER_IN = 'filter_in'
+FILTER_OUT = 'filter_out'
+HANDLER = 'handler'
+EVENT = 'event'
+EVENT_HANDLER = 'event_handler'
+#: Stream-level operations: ``parse``, ``dispatch`` and ``serialize``.
+STREAM = 'stream'
+
+CATEGORIES = (FILTER_IN, FILTER_OUT, HANDLER, EVENT, EVENT_HANDLER, STREAM)
+
+#: Called with a snapshot of the metrics of a stream.
+Exporter = Callable[[Dict[str, Any]], None]
+
+
+def callable_name(func: Callable[..., Any]) -> str:
+    """Return a readable name for a filter or a handler."""
+    name = getattr(func, '__qualname__', None) or \
+        getattr(func, '__name__', None)
+    if name is None:
+        return repr(func)
+    module = getattr(func, '__module__', None)
+    if module:
+        return '%s.%s' % (module, name)
+    return name
+
+
+class LatencyStats:
+
+    """
+    Running statistics of the durations of an operation, with a
+    histogram over :data:`BUCKETS`.
+    """
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    #: Number of recorded durations.
+    count: int
+    #: Sum of the recorded durations, in seconds.
+    total: float
+    #: Longest recorded duration, in seconds.
+    max: float
+    #: Number of recorded durations in each bucket.
+    buckets: List[int]
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def record(self, duration: float) -> None:
+        """Add a duration, in seconds."""
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+        self.buckets[bisect_left(BUCKETS, duration)] += 1
+
+    @property
+    def mean(self) -> float:
+        """Mean recorded duration, in seconds."""
+        return self.total / self.count if self.count else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.mean,
+            'max': self.max,
+            'histogram': list(self.buckets),
+        }
+
+
+class LatencyRecorder:
+
+    """
+    Latency statistics of named operations, like the filters of a
+    stream.
+    """
+
+    _stats: Dict[str, LatencyStats]
+
+    def __init__(self) -> None:
+        self._stats = {}
+
+    def __len__(self) -> int:
+        return len(self._stats)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._stats))
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._stats
+
+    def __getitem__(self, name: str) -> LatencyStats:
+        return self._stats[name]
+
+    def record(self, name: str, duration: float) -> None:
+        """Add a duration, in seconds, to the statistics of an
+        operation."""
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = LatencyStats()
+        stats.record(duration)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return a copy of the current statistics, by operation name."""
+        return {name: stats.as_dict() for name, stats in self._stats.items()}
+
+    def reset(self) -> None:
+        """Forget every recorded duration."""
+        self._stats.clear()
+
+
+class StreamMetrics:
+
+    """
+    Instrumentation of an :class:`~.XMLStream`, enabled with
+    :meth:`~.XMLStream.enable_metrics`.
+
+    Durations are recorded by category (see :data:`CATEGORIES`), then
+    by filter, handler or event name. The durations of coroutines
+    include the time they spend waiting.
+
+    :param gauges: Functions returning the current value of a gauge,
+                   like the size of a queue, by gauge name.
+    """
+
+    #: The latency statistics, by category.
+    recorders: Dict[str, LatencyRecorder]
+    #: Functions returning the current value of a gauge, by gauge name.
+    gauges: Dict[str, Callable[[], int]]
+    #: Functions called by :meth:`export`.
+    exporters: List[Exporter]
+
+    def __init__(self, gauges: Dict[str, Callable[[], int]] = {}):
+        self.recorders = {category: LatencyRecorder()
+                          for category in CATEGORIES}
+        self.gauges = dict(gauges)
+        self.exporters = []
+
+    def record(self, category: str, name: str, duration: float) -> None:
+        """Add a duration, in seconds, to the statistics of an
+        operation."""
+        self.recorders[category].record(name, duration)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a copy of the current statistics, as a dict with a
+        ``latency`` key (category, then name, then the fields of
+        :meth:`LatencyStats.as_dict`) and a ``gauges`` key."""
+        return {
+            'latency': {category: recorder.snapshot()
+                        for category, recorder in self.recorders.items()},
+            'gauges': {name: gauge() for name, gauge in self.gauges.items()},
+        }
+
+    def reset(self) -> None:
+        """Forget every recorded duration."""
+        for recorder in self.recorders.values():
+            recorder.reset()
+
+    def add_exporter(self, exporter: Exporter) -> None:
+        """Add a function to call with a snapshot on :meth:`export`."""
+        self.exporters.append(exporter)
+
+    def del_exporter(self, exporter: Exporter) -> None:
+        """Remove an exporter added with :meth:`add_exporter`."""
+        self.exporters.remove(exporter)
+
+    def export(self) -> None:
+        """Give a snapshot of the metrics to each exporter."""
+        if not self.exporters:
+            return
+        snapshot = self.snapshot()
+        for exporter in self.exporters:
+            try:
+                exporter(snapshot)
+            except Exception:
+                log.error('Exception raised in metrics exporter:',
+                          exc_info=True)
+
+
+def stanza_summary(xml: ET.Element) -> str:
+    """Return a short description of a stanza, without its payload."""
+    tag = xml.tag.rpartition('}')[2]
+    attrs = ' '.join('%s="%s"' % (name, xml.attrib[name])
+                     for name in ('type', 'from', 'to', 'id')
+                     if name in xml.attrib)
+    children = ''.join('<%s/>' % child.tag.rpartition('}')[2]
+                       for child in xml)
+    if attrs:
+        return '<%s %s>%s' % (tag, attrs, children)
+    return '<%s>%s' % (tag, children)
+
+
+class SlowCall:
+
+    """
+    A callback which blocked the event loop for longer than the
+    threshold of a :class:`StallDetector`.
+    """
+    __slots__ = ('kind', 'name', 'duration', 'summary', 'time')
+
+    #: ``filter``, ``handler``, ``event`` or ``scheduled``.
+    kind: str
+    #: The name of the filter, handler or scheduled event.
+    name: str
+    #: The time spent in the callback, in seconds.
+    duration: float
+    #: A summary of the stanza given to the callback, if any.
+    summary: Optional[str]
+    #: When the callback returned, as given by :func:`time.time`.
+    time: float
+
+    def __init__(self, kind: str, name: str, duration: float,
+                 summary: Optional[str] = None):
+        self.kind = kind
+        self.name = name
+        self.duration = duration
+        self.summary = summary
+        self.time = time.time()
+
+    def __repr__(self) -> str:
+        return '<SlowCall %s %r: %.3fs %s>' % (
+            self.kind, self.name, self.duration, self.summary or '',
+        )
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'kind': self.kind,
+            'name': self.name,
+            'duration': self.duration,
+            'summary': self.summary,
+            'time': self.time,
+        }
+
+
+class StallDetector:
+
+    """
+    Watchdog of the synchronous callbacks of an :class:`~.XMLStream`,
+    enabled with :meth:`~.XMLStream.enable_stall_detector`.
+
+    :param threshold: The time, in seconds, above which a callback is
+                      reported.
+    :param size: The number of reported callbacks to keep, both among
+                 the last ones and among the slowest ones.
+    """
+
+    #: The time, in seconds, above which a callback is reported.
+    threshold: float
+    #: The last reported callbacks, oldest first.
+    recent: Deque[SlowCall]
+    #: The size of :attr:`recent` and of the slowest reported callbacks.
+    size: int
+
+    def __init__(self, threshold: float = 0.1, size: int = 50):
+        self.threshold = threshold
+        self.size = size
+        self.recent = deque(maxlen=size)
+        # A min-heap of the slowest calls, so that the fastest of them
+        # is replaced first. The counter breaks ties between durations.
+        self._worst: List[Tuple[float, int, SlowCall]] = []
+        self._counter = itertools.count()
+
+    def record(self, call: SlowCall) -> None:
+        self.recent.append(call)
+        if self.size <= 0:
+            return
+        entry = (call.duration, next(self._counter), call)
+        if len(self._worst) < self.size:
+            heapq.heappush(self._worst, entry)
+        elif entry[0] > self._worst[0][0]:
+            heapq.heapreplace(self._worst, entry)
+
+    def worst(self, count: Optional[int] = None) -> List[SlowCall]:
+        """Return the slowest reported callbacks since the detector
+        was enabled or cleared, slowest first."""
+        entries = sorted(self._worst, reverse=True)
+        if count is not None:
+            del entries[count:]
+        return [entry[2] for entry in entries]
+
+    def clear(self) -> None:
+        """Forget the reported callbacks."""
+        self.recent.clear()
+        del self._worst[:]
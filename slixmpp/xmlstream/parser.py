@@ -0,0 +1,121 @@
+# slixmpp.xmlstream.parser
+# ~~~~~~~~~~~~~~~~~~~~~~~~
+# This module provides the incremental parser of the incoming
+# XML stream, which enforces limits on the received stanzas.
+# Part of Slixmpp: The Slick XMPP Library
+# :copyright: (c) 2011 Nathanael C. Fritz
+# :license: MIT, see LICENSE for more details
+from __future__ import annotations
+
+from typing import (
+    Callable,
+    Iterable,
+    Iterator,
+    Tuple,
+)
+from xml.etree import ElementTree as ET
+
+from slixmpp.types import Protocol
+
+
+class PullParser(Protocol):
+    """The interface of :class:`xml.etree.ElementTree.XMLPullParser`
+    used by :class:`StanzaParser`."""
+
+    def feed(self, data: bytes) -> None:
+        ...
+
+    def read_events(self) -> Iterable[Tuple[str, ET.Element]]:
+        ...
+
+
+#: Create the underlying parser of a stream, which must report
+#: ``start`` and ``end`` events with ElementTree elements.
+ParserFactory = Callable[[], PullParser]
+
+
+def etree_parser() -> PullParser:
+    """The default parser factory, using the expat-based
+    :class:`xml.etree.ElementTree.XMLPullParser`."""
+    return ET.XMLPullParser(('start', 'end'))
+
+
+class StanzaLimitError(Exception):
+    """
+    Raised when a received stanza exceeds the limits of the parser.
+    """
+
+
+class StanzaParser:
+
+    """
+    Incremental parser of an XML stream.
+
+    Elements are reported as ``(event, element)`` tuples, like
+    :meth:`xml.etree.ElementTree.XMLPullParser.read_events`, with the
+    stream root element at depth 1 and the stanzas at depth 2.
+
+    The received data is parsed by slices of at most
+    ``max_stanza_size`` bytes, and the size of the current stanza is
+    checked after each slice, so a stanza exceeding the limit is
+    rejected before the rest of it has been parsed. As the size is
+    counted in whole slices, the data received right before a stanza
+    starts may count towards its size.
+
+    :param max_stanza_size: The maximum size of a stanza, in bytes, or
+                            ``0`` for no limit.
+    :param max_depth: The maximum nesting of elements inside a stanza,
+                      the stanza itself included, or ``0`` for no limit.
+    :param factory: Create the underlying parser, defaults to
+                    :func:`etree_parser`.
+    """
+
+    #: Current depth of the parser in the stream.
+    depth: int
+    #: Number of bytes fed to the parser.
+    bytes_parsed: int
+    #: Number of complete stanzas parsed.
+    stanzas_parsed: int
+
+    def __init__(self, max_stanza_size: int = 0, max_depth: int = 0,
+                 factory: ParserFactory = etree_parser):
+        self.max_stanza_size = max_stanza_size
+        self.max_depth = max_depth
+        self._parser = factory()
+        self._stanza_size = 0
+        self.depth = 0
+        self.bytes_parsed = 0
+        self.stanzas_parsed = 0
+
+    def feed(self, data: bytes) -> Iterator[Tuple[str, ET.Element]]:
+        """Parse received data and iterate over the resulting events.
+
+        :raises xml.etree.ElementTree.ParseError: If the data is not
+            well-formed.
+        :raises StanzaLimitError: If a stanza exceeds the limits.
+        """
+        self.bytes_parsed += len(data)
+        step = self.max_stanza_size or len(data)
+        for start in range(0, len(data), step or 1):
+            chunk = data[start:start + step] if step < len(data) else data
+            self._parser.feed(chunk)
+            for event, xml in self._parser.read_events():
+                if event == 'start':
+                    self.depth += 1
+                    if self.max_depth and self.depth - 1 > self.max_depth:
+                        raise StanzaLimitError(
+                            'Stanza deeper than %d elements' % self.max_depth
+                        )
+                elif event == 'end':
+                    self.depth -= 1
+                    if self.depth == 1:
+                        self.stanzas_parsed += 1
+                        self._stanza_size = 0
+                yield event, xml
+            if self.depth > 1:
+                self._stanza_size += len(chunk)
+                if self.max_stanza_size and \
+                        self._stanza_size > self.max_stanza_size:
+                    raise StanzaLimitError(
+                        'Stanza larger than %d bytes' % self.max_stanza_size
+                    )
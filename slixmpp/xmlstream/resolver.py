@@ -3,12 +3,15 @@
 # :copyright: (c) 2012 Nathanael C. Fritz
 # :license: MIT, see LICENSE for more details
 
+import asyncio
 import socket
 import sys
 import logging
 import random
 from asyncio import Future, AbstractEventLoop
-from typing import Optional, Tuple, Dict, List, Iterable, cast
+from typing import (
+    Any, Awaitable, Callable, Optional, Tuple, Dict, List, Iterable, cast,
+)
 from slixmpp.types import Protocol
 
 
@@ -26,6 +29,7 @@ class QueryAnswerProtocol(Protocol):
     priority: int
     weight: int
     port: int
+    ttl: int
 
 
 class ResolverProtocol(Protocol):
@@ -64,6 +68,186 @@ def default_resolver(loop: AbstractEventLoop) -> Optional[ResolverProtocol]:
     return None
 
 
+class DNSCache:
+
+    """
+    Cache of the results of :func:`resolve`, which can be shared by
+    many streams connecting to the same servers.
+
+    The SRV, A and AAAA lookups are cached separately. SRV records are
+    kept for their own TTL, within ``min_ttl`` and ``ttl``, and are
+    sorted again on each lookup so that their weights still spread
+    the streams over the targets. The addresses are kept for ``ttl``,
+    as neither :meth:`~asyncio.AbstractEventLoop.getaddrinfo` nor
+    :meth:`aiodns.DNSResolver.gethostbyname` give their TTL. Lookups
+    which found nothing are kept for ``negative_ttl``.
+
+    Concurrent lookups of the same name share a single query.
+
+    :param ttl: The longest time results are kept, in seconds.
+    :param negative_ttl: How long empty results are kept, in seconds.
+    :param min_ttl: The shortest time results are kept, in seconds.
+    """
+
+    #: The longest time results are kept, in seconds.
+    ttl: float
+    #: How long empty results are kept, in seconds.
+    negative_ttl: float
+    #: The shortest time results are kept, in seconds.
+    min_ttl: float
+
+    def __init__(self, ttl: float = 300, negative_ttl: float = 30,
+                 min_ttl: float = 5):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.min_ttl = min_ttl
+        self._entries: Dict[Tuple[Any, ...], Tuple[float, List[Any]]] = {}
+        # The running query of each key, and its number of waiters.
+        self._pending: Dict[Tuple[Any, ...], List[Any]] = {}
+        #: Number of queries answered from the cache.
+        self.hits = 0
+        #: Number of queries which went to the network.
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        """Forget every cached result."""
+        self._entries.clear()
+
+    def _expiry(self, results: List[Any], ttl: Optional[float]) -> float:
+        if not results:
+            return self.negative_ttl
+        if ttl is None:
+            return self.ttl
+        return min(max(ttl, self.min_ttl), self.ttl)
+
+    async def _query(self, key: Tuple[Any, ...], loop: AbstractEventLoop,
+                     query: Callable[[], Awaitable[Tuple[List[Any],
+                                                         Optional[float]]]]
+                     ) -> List[Any]:
+        results, ttl = await query()
+        self._entries[key] = (loop.time() + self._expiry(results, ttl),
+                              results)
+        return results
+
+    def _query_done(self, key: Tuple[Any, ...], task: Future) -> None:
+        pending = self._pending.get(key)
+        if pending is not None and pending[0] is task:
+            del self._pending[key]
+        if not task.cancelled():
+            # Do not warn about an exception nobody waited for.
+            task.exception()
+
+    async def _lookup(self, key: Tuple[Any, ...], loop: AbstractEventLoop,
+                      query: Callable[[], Awaitable[Tuple[List[Any],
+                                                          Optional[float]]]]
+                      ) -> List[Any]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > loop.time():
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+        pending = self._pending.get(key)
+        if pending is None:
+            self.misses += 1
+            # The query runs in its own task, so that a cancelled waiter
+            # does not cancel it for the others.
+            task = asyncio.ensure_future(self._query(key, loop, query),
+                                         loop=loop)
+            pending = self._pending[key] = [task, 0]
+            task.add_done_callback(lambda task: self._query_done(key, task))
+        else:
+            self.hits += 1
+        task = pending[0]
+        pending[1] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            pending[1] -= 1
+            if not pending[1] and not task.done():
+                # Nobody waits for the query anymore.
+                task.cancel()
+                if self._pending.get(key) is pending:
+                    del self._pending[key]
+
+    async def resolve(self, host: str, port: int, *,
+                      loop: AbstractEventLoop,
+                      service: Optional[str] = None, proto: str = 'tcp',
+                      resolver: Optional[ResolverProtocol] = None,
+                      use_ipv6: bool = True,
+                      use_aiodns: bool = True) -> List[Tuple[str, str, int]]:
+        """Same as :func:`resolve`, using the cached results when
+        available."""
+        if resolver is None and use_aiodns:
+            resolver = default_resolver(loop=loop)
+        host = host.strip('[]')
+        if _is_literal(host, use_ipv6):
+            return [(host, host, port)]
+
+        aiodns = resolver is not None and use_aiodns
+        hosts = [(host, port)]
+        if service and not aiodns:
+            hosts = await get_SRV(host, port, service, proto,
+                                  resolver=resolver, use_aiodns=use_aiodns)
+        elif service:
+            records = await self._lookup(
+                ('SRV', host, service, proto), loop,
+                lambda: _query_SRV(host, service, proto, resolver),
+            )
+            hosts = _sort_SRV(records) or hosts
+
+        async def untimed(lookup: Awaitable[List[str]]
+                          ) -> Tuple[List[str], None]:
+            return await lookup, None
+
+        lookups = []
+        for target, _ in hosts:
+            if use_ipv6:
+                lookups.append(self._lookup(
+                    ('AAAA', target, aiodns), loop,
+                    lambda target=target: untimed(get_AAAA(
+                        target, resolver=resolver, use_aiodns=use_aiodns,
+                        loop=loop,
+                    )),
+                ))
+            lookups.append(self._lookup(
+                ('A', target, aiodns), loop,
+                lambda target=target: untimed(get_A(
+                    target, resolver=resolver, use_aiodns=use_aiodns,
+                    loop=loop,
+                )),
+            ))
+        addresses = iter(await asyncio.gather(*lookups))
+
+        results = []
+        for target, target_port in hosts:
+            if use_ipv6:
+                for address in next(addresses):
+                    results.append((target, address, target_port))
+            for address in next(addresses):
+                results.append((target, address, target_port))
+        return results
+
+
+def _is_literal(host: str, use_ipv6: bool) -> bool:
+    """Return whether a host is an IP literal, which needs no lookup."""
+    try:
+        socket.inet_aton(host)
+        return True
+    except socket.error:
+        pass
+    if use_ipv6 and hasattr(socket, 'inet_pton'):
+        try:
+            socket.inet_pton(socket.AF_INET6, host)
+            return True
+        except (socket.error, ValueError):
+            pass
+    return False
+
+
 async def resolve(host: str, port: int, *, loop: AbstractEventLoop,
                   service: Optional[str] = None, proto: str = 'tcp',
                   resolver: Optional[ResolverProtocol] = None,
@@ -125,22 +309,9 @@ async def resolve(host: str, port: int, *, loop: AbstractEventLoop,
     # otherwise, things break.
     host = host.strip('[]')
 
-    try:
-        # If `host` is an IPv4 literal, we can return it immediately.
-        socket.inet_aton(host)
+    # If `host` is an IP literal, we can return it immediately.
+    if _is_literal(host, use_ipv6):
         return [(host, host, port)]
-    except socket.error:
-        pass
-
-    if use_ipv6:
-        try:
-            # Likewise, If `host` is an IPv6 literal, we can return
-            # it immediately.
-            if hasattr(socket, 'inet_pton'):
-                socket.inet_pton(socket.AF_INET6, host)
-                return [(host, host, port)]
-        except (socket.error, ValueError):
-            pass
 
     # If no service was provided, then we can just do A/AAAA lookups on the
     # provided host. Otherwise we need to get an ordered list of hosts to
@@ -295,15 +466,29 @@ async def get_SRV(host: str, port: int, service: str,
         log.warning("DNS: aiodns not found. Can not use SRV lookup.")
         return [(host, port)]
 
+    recs, _ = await _query_SRV(host, service, proto, resolver)
+    return _sort_SRV(recs)
+
+
+async def _query_SRV(host: str, service: str, proto: str,
+                     resolver: ResolverProtocol
+                     ) -> Tuple[List[QueryAnswerProtocol], Optional[int]]:
+    """Query the SRV records of a host, returning them with the
+    smallest of their TTLs, if known."""
     log.debug("DNS: Querying SRV records for %s" % host)
     try:
         future = resolver.query('_%s._%s.%s' % (service, proto, host),
                                 'SRV')
-        recs = cast(Iterable[QueryAnswerProtocol], await future)
+        recs = list(cast(Iterable[QueryAnswerProtocol], await future))
     except Exception as e:
         log.debug('DNS: Exception while querying for %s SRV records: %s', host, e)
-        return []
+        return [], None
+    ttls = [rec.ttl for rec in recs if getattr(rec, 'ttl', None) is not None]
+    return recs, min(ttls, default=None)
+
 
+def _sort_SRV(recs: Iterable[QueryAnswerProtocol]) -> List[Tuple[str, int]]:
+    """Order SRV records by priority, then randomly by weight."""
     answers: Dict[int, List[QueryAnswerProtocol]] = {}
     for rec in recs:
         if rec.priority not in answers:
@@ -0,0 +1,130 @@
+# slixmpp.xmlstream.sendqueue
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# This module provides the outbound queue of the XML stream, which
+# lets urgent traffic go ahead of bulk transfers.
+# Part of Slixmpp: The Slick XMPP Library
+# :copyright: (c) 2011 Nathanael C. Fritz
+# :license: MIT, see LICENSE for more details
+from __future__ import annotations
+
+import asyncio
+
+from collections import deque
+from typing import (
+    Any,
+    Deque,
+    Dict,
+    Iterator,
+    Tuple,
+)
+
+
+#: Stream-level elements, like stream management or features
+#: negotiation. Always sent first.
+CONTROL = 'control'
+#: <iq/> stanzas, including keepalive pings and replies.
+IQ = 'iq'
+#: Other stanzas.
+NORMAL = 'normal'
+#: Large transfers, like in-band bytestreams.
+BULK = 'bulk'
+
+#: Every lane, in order of precedence.
+LANES = (CONTROL, IQ, NORMAL, BULK)
+
+#: The default share of the sending capacity of the weighted lanes.
+DEFAULT_WEIGHTS = {IQ: 4, NORMAL: 2, BULK: 1}
+
+
+class _Lanes:
+
+    """
+    Storage of :class:`SendQueue`, used in place of the deque of
+    :class:`asyncio.Queue`.
+
+    Each item is a tuple whose last element is the name of its lane.
+    The control lane is always drained first, then the other lanes
+    are drained by smooth weighted round-robin: when several of them
+    hold items, each gets a share of the items taken proportional to
+    its weight, and no lane is ever starved.
+    """
+
+    def __init__(self, weights: Dict[str, int]):
+        self.weights = weights
+        self.lanes: Dict[str, Deque[Tuple[Any, ...]]] = {
+            lane: deque() for lane in LANES
+        }
+        self._current = {lane: 0 for lane in LANES if lane != CONTROL}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[Tuple[Any, ...]]:
+        for lane in LANES:
+            yield from self.lanes[lane]
+
+    def append(self, item: Tuple[Any, ...]) -> None:
+        self.lanes[item[-1]].append(item)
+        self._size += 1
+
+    def popleft(self) -> Tuple[Any, ...]:
+        if self._size == 0:
+            raise IndexError('pop from an empty send queue')
+        self._size -= 1
+        control = self.lanes[CONTROL]
+        if control:
+            return control.popleft()
+        lanes = self.lanes
+        current = self._current
+        total = 0
+        selected = None
+        for lane in current:
+            if lanes[lane]:
+                weight = max(self.weights.get(lane, 1), 1)
+                total += weight
+                current[lane] += weight
+                if selected is None or current[lane] > current[selected]:
+                    selected = lane
+        assert selected is not None
+        current[selected] -= total
+        item = lanes[selected].popleft()
+        if not lanes[selected]:
+            # An idle lane must not accumulate credit.
+            current[selected] = 0
+        return item
+
+
+class SendQueue(asyncio.Queue):
+
+    """
+    The outbound queue of an :class:`~.XMLStream`, with one lane per
+    kind of traffic.
+
+    It behaves like an :class:`asyncio.Queue` of tuples whose last
+    element is one of :data:`LANES`. Items of the same lane are taken
+    in order; see :class:`_Lanes` for the order across lanes.
+
+    :param weights: The relative share of the sending capacity of the
+                    ``iq``, ``normal`` and ``bulk`` lanes, defaults to
+                    :data:`DEFAULT_WEIGHTS`.
+    """
+
+    _queue: _Lanes
+
+    def __init__(self, weights: Dict[str, int] = DEFAULT_WEIGHTS):
+        self._weights = dict(weights)
+        super().__init__()
+
+    def _init(self, maxsize: int) -> None:
+        self._queue = _Lanes(self._weights)
+
+    @property
+    def weights(self) -> Dict[str, int]:
+        """The relative share of each weighted lane, which may be
+        modified at any time."""
+        return self._weights
+
+    def lane_size(self, lane: str) -> int:
+        """Return the number of items waiting in a lane."""
+        return len(self._queue.lanes[lane])
@@ -10,6 +10,7 @@ from __future__ import annotations
 import copy
 import logging
 import weakref
+from types import FunctionType
 from typing import (
     cast,
     Any,
@@ -83,6 +84,16 @@ def register_stanza_plugin(stanza: Type[ElementBase], plugin: Type[ElementBase],
     """
     tag = "{%s}%s" % (plugin.namespace, plugin.name)
 
+    # Plugins register their stanzas for every client, skip the work
+    # when nothing would change.
+    if stanza.__dict__.get('plugin_tag_map', {}).get(tag) is plugin and \
+            stanza.plugin_attrib_map.get(plugin.plugin_attrib) is plugin and \
+            (not iterable or plugin in stanza.plugin_iterables) and \
+            (not overrides or all(
+                stanza.plugin_overrides.get(interface) == plugin.plugin_attrib
+                for interface in plugin.overrides)):
+        return
+
     # Prevent weird memory reference gotchas by ensuring
     # that the parent stanza class has its own set of
     # plugin info maps and is not using the mappings from
@@ -105,6 +116,8 @@ def register_stanza_plugin(stanza: Type[ElementBase], plugin: Type[ElementBase],
         for interface in plugin.overrides:
             stanza.plugin_overrides[interface] = plugin.plugin_attrib
 
+    stanza.reset_accessors()
+
 
 def multifactory(stanza: Type[ElementBase], plugin_attrib: str) -> Type[ElementBase]:
     """
@@ -225,7 +238,107 @@ def fix_ns(xpath: str, split: bool = False, propagate_ns: bool = True,
     return '/'.join(fixed)
 
 
-class ElementBase(object):
+#: Kinds of stanza interfaces, as resolved by :class:`_Accessor`.
+_SUBSTANZAS = 0
+_INTERFACE = 1
+_PLUGIN = 2
+_UNKNOWN = 3
+
+#: Default storage of interfaces without custom access methods.
+_ATTRIBUTE = 0
+_SUB_TEXT = 1
+_SUB_BOOL = 2
+
+
+def _method_caller(name: str) -> Callable[..., Any]:
+    """Return a function calling the ``name`` method of a stanza."""
+    def call(stanza: ElementBase, *args: Any, **kwargs: Any) -> Any:
+        return getattr(stanza, name)(*args, **kwargs)
+    return call
+
+
+class _Accessor:
+
+    """
+    How an interface name is accessed on a given stanza class.
+
+    The lookups done on each ``stanza['name']`` access only depend on
+    the class, so they are done once and kept in the class accessor
+    table, see :meth:`ElementBase.reset_accessors`.
+    """
+    __slots__ = ('kind', 'lang', 'storage', 'getter', 'setter', 'deleter',
+                 'get_name', 'set_name', 'del_name', 'get_override',
+                 'set_override', 'del_override')
+
+    def __init__(self, cls: Type[ElementBase], attrib: str):
+        self.lang = attrib in cls.lang_interfaces
+        if attrib in cls.sub_interfaces:
+            self.storage = _SUB_TEXT
+        elif attrib in cls.bool_interfaces:
+            self.storage = _SUB_BOOL
+        else:
+            self.storage = _ATTRIBUTE
+
+        if attrib == 'substanzas':
+            self.kind = _SUBSTANZAS
+        elif attrib in cls.interfaces or attrib == 'lang':
+            self.kind = _INTERFACE
+        elif attrib in cls.plugin_attrib_map:
+            self.kind = _PLUGIN
+        else:
+            self.kind = _UNKNOWN
+
+        lower = attrib.lower()
+        self.get_name = 'get_%s' % lower
+        self.set_name = 'set_%s' % lower
+        self.del_name = 'del_%s' % lower
+        overrides = cls.plugin_overrides
+        self.get_override = overrides.get(self.get_name)
+        self.set_override = overrides.get(self.set_name)
+        self.del_override = overrides.get(self.del_name)
+        self.getter = self._resolve(cls, self.get_name)
+        self.setter = self._resolve(cls, self.set_name)
+        self.deleter = self._resolve(cls, self.del_name)
+
+    @staticmethod
+    def _resolve(cls: Type[ElementBase], name: str) -> Optional[Callable[..., Any]]:
+        method = getattr(cls, name, None)
+        if method is None:
+            return None
+        if isinstance(method, FunctionType):
+            return method
+        return _method_caller(name)
+
+
+#: Class attributes which change how the interfaces are accessed.
+_ACCESSOR_ATTRIBUTES = frozenset({
+    'interfaces', 'sub_interfaces', 'bool_interfaces', 'lang_interfaces',
+    'plugin_attrib_map', 'plugin_overrides',
+})
+
+
+class _ElementMeta(type):
+
+    """
+    Metaclass of :class:`ElementBase`, which forgets the resolved
+    accessors of a class and its subclasses when one of its access
+    methods or interface sets is assigned or deleted.
+    """
+
+    def __setattr__(cls, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if name[:4] in ('get_', 'set_', 'del_') or \
+                name in _ACCESSOR_ATTRIBUTES:
+            cast(Type[ElementBase], cls).reset_accessors()
+
+    def __delattr__(cls, name: str) -> None:
+        super().__delattr__(name)
+        if name[:4] in ('get_', 'set_', 'del_') or \
+                name in _ACCESSOR_ATTRIBUTES:
+            cast(Type[ElementBase], cls).reset_accessors()
+
+
+class ElementBase(metaclass=_ElementMeta):
 
     """
     The core of Slixmpp's stanza XML manipulation and handling is provided
@@ -409,7 +522,18 @@ class ElementBase(object):
     #: The default XML namespace: ``http://www.w3.org/XML/1998/namespace``.
     xml_ns: ClassVar[str] = XML_NS
 
-    plugins: Dict[Tuple[str, Optional[str]], ElementBase]
+    #: The resolved accessors of the interfaces of the class, only
+    #: valid for the class which defines it.
+    _accessor_table: ClassVar[Dict[str, _Accessor]]
+
+    _plugins: Dict[Tuple[str, Optional[str]], ElementBase]
+    #: Plugin elements found in the XML but not initialized yet, mapped
+    #: by their :attr:`plugin_attrib` value.
+    _lazy_plugins: Optional[Dict[str, ET.Element]] = None
+    #: If ``True``, plugins found in the XML are only initialized when
+    #: first accessed. Set for incoming stanzas, and inherited by their
+    #: substanzas.
+    _lazy: bool = False
     #: The underlying XML object for the stanza. It is a standard
     #: :class:`xml.etree.ElementTree` object.
     xml: ET.Element
@@ -427,7 +551,7 @@ class ElementBase(object):
 
         #: An ordered dictionary of plugin stanzas, mapped by their
         #: :attr:`plugin_attrib` value.
-        self.plugins = {}
+        self._plugins = {}
         self.loaded_plugins = set()
 
         #: A list of child stanzas whose class is included in
@@ -447,19 +571,55 @@ class ElementBase(object):
                 self.parent = weakref.ref(parent)
             else:
                 self.parent = parent
+            parent_stanza = self.parent()
+            if parent_stanza is not None and parent_stanza._lazy:
+                self._lazy = True
 
         if self.setup(xml):
             # If we generated our own XML, then everything is ready.
             return
 
         # Initialize values using provided XML
+        plugin_tag_map = self.plugin_tag_map
         for child in self.xml:
-            if child.tag in self.plugin_tag_map:
-                plugin_class = self.plugin_tag_map[child.tag]
+            plugin_class = plugin_tag_map.get(child.tag)
+            if plugin_class is None:
+                continue
+            if self._lazy and plugin_class not in self.plugin_iterables:
+                # Substanzas must stay in order, but other plugins
+                # are only built when accessed.
+                if self._lazy_plugins is None:
+                    self._lazy_plugins = {}
+                self._lazy_plugins[plugin_class.plugin_attrib] = child
+                self.loaded_plugins.add(plugin_class.plugin_attrib)
+            else:
                 self.init_plugin(plugin_class.plugin_attrib,
                                  existing_xml=child,
                                  reuse=False)
 
+    @property
+    def plugins(self) -> Dict[Tuple[str, Optional[str]], ElementBase]:
+        """An ordered dictionary of plugin stanzas, mapped by their
+        (:attr:`plugin_attrib`, lang) value.
+
+        Accessing it initializes any plugin not loaded yet.
+        """
+        if self._lazy_plugins:
+            for attrib in list(self._lazy_plugins):
+                self._load_lazy_plugin(attrib)
+        return self._plugins
+
+    @plugins.setter
+    def plugins(self, value: Dict[Tuple[str, Optional[str]], ElementBase]) -> None:
+        self._lazy_plugins = None
+        self._plugins = value
+
+    def _load_lazy_plugin(self, attrib: str) -> None:
+        """Initialize a plugin found in the XML but not accessed yet."""
+        lazy_plugins = cast(Dict[str, ET.Element], self._lazy_plugins)
+        xml = lazy_plugins.pop(attrib)
+        self.init_plugin(attrib, existing_xml=xml, reuse=False)
+
     def setup(self, xml: Optional[ET.Element] = None) -> bool:
         """Initialize the stanza's XML contents.
 
@@ -519,14 +679,17 @@ class ElementBase(object):
 
         plugin_class = self.plugin_attrib_map[name]
 
+        if self._lazy_plugins and name in self._lazy_plugins:
+            self._load_lazy_plugin(name)
+
         if plugin_class.is_extension:
-            if (name, None) in self.plugins:
-                return self.plugins[(name, None)]
+            if (name, None) in self._plugins:
+                return self._plugins[(name, None)]
             else:
                 return None if check else self.init_plugin(name, lang)
         else:
-            if (name, lang) in self.plugins:
-                return self.plugins[(name, lang)]
+            if (name, lang) in self._plugins:
+                return self._plugins[(name, lang)]
             else:
                 return None if check else self.init_plugin(name, lang)
 
@@ -545,10 +708,13 @@ class ElementBase(object):
 
         plugin_class = self.plugin_attrib_map[attrib]
 
-        if plugin_class.is_extension and (attrib, None) in self.plugins:
-            return self.plugins[(attrib, None)]
-        if reuse and (attrib, lang) in self.plugins:
-            return self.plugins[(attrib, lang)]
+        if self._lazy_plugins and attrib in self._lazy_plugins:
+            self._load_lazy_plugin(attrib)
+
+        if plugin_class.is_extension and (attrib, None) in self._plugins:
+            return self._plugins[(attrib, None)]
+        if reuse and (attrib, lang) in self._plugins:
+            return self._plugins[(attrib, lang)]
 
         if element is not None:
             plugin = element
@@ -556,11 +722,11 @@ class ElementBase(object):
             plugin = plugin_class(parent=self, xml=existing_xml)
 
         if plugin.is_extension:
-            self.plugins[(attrib, None)] = plugin
+            self._plugins[(attrib, None)] = plugin
         else:
             if lang != default_lang:
                 plugin['lang'] = lang
-            self.plugins[(attrib, lang)] = plugin
+            self._plugins[(attrib, lang)] = plugin
 
         if plugin_class in self.plugin_iterables:
             self.iterables.append(plugin)
@@ -669,6 +835,37 @@ class ElementBase(object):
                         plugin.values = value
         return self
 
+    @classmethod
+    def _get_accessor(cls, attrib: str) -> _Accessor:
+        """Resolve how an interface is accessed, and keep the result in
+        the accessor table of the class."""
+        table = cls.__dict__.get('_accessor_table')
+        if table is None:
+            table = {}
+            cls._accessor_table = table
+        accessor = _Accessor(cls, attrib)
+        table[attrib] = accessor
+        return accessor
+
+    @classmethod
+    def reset_accessors(cls) -> None:
+        """Forget how the interfaces of this class and its subclasses
+        are accessed.
+
+        This is done when an access method (``get_*``, ``set_*`` or
+        ``del_*``) or an interface set (:attr:`interfaces`,
+        :attr:`sub_interfaces`, …) is assigned to or deleted from the
+        class. It must still be done after modifying an interface set
+        in place, like ``Message.sub_interfaces.add('spoiler')``, once
+        the class has been used.
+        """
+        pending = [cls]
+        while pending:
+            klass = pending.pop()
+            if '_accessor_table' in klass.__dict__:
+                delattr(klass, '_accessor_table')
+            pending.extend(klass.__subclasses__())
+
     def __getitem__(self, full_attrib: str) -> Any:
         """Return the value of a stanza interface using dict-like syntax.
 
@@ -698,39 +895,46 @@ class ElementBase(object):
 
         :param string full_attrib: The name of the requested stanza interface.
         """
-        attrib, lang, *_ = ('%s|' % full_attrib).split('|')
-
-        kwargs = {'lang': lang} if lang and attrib in self.lang_interfaces else {}
-
-        if attrib == 'substanzas':
-            return self.iterables
-        elif attrib in self.interfaces or attrib == 'lang':
-            get_method = "get_%s" % attrib.lower()
-
-            if self.plugin_overrides:
-                name = self.plugin_overrides.get(get_method, None)
-                if name:
-                    plugin = self.get_plugin(name, lang)
-                    if plugin:
-                        handler = getattr(plugin, get_method, None)
-                        if handler:
-                            return handler(**kwargs)
-
-            if hasattr(self, get_method):
-                return getattr(self, get_method)(**kwargs)
+        if '|' in full_attrib:
+            attrib, lang = full_attrib.split('|')[:2]
+        else:
+            attrib = full_attrib
+            lang = ''
+
+        try:
+            accessor = type(self).__dict__['_accessor_table'][attrib]
+        except KeyError:
+            accessor = self._get_accessor(attrib)
+        kind = accessor.kind
+
+        if kind == _INTERFACE:
+            kwargs = {'lang': lang} if lang and accessor.lang else {}
+
+            if accessor.get_override:
+                plugin = self.get_plugin(accessor.get_override, lang)
+                if plugin:
+                    handler = getattr(plugin, accessor.get_name, None)
+                    if handler:
+                        return handler(**kwargs)
+
+            if accessor.getter is not None:
+                return accessor.getter(self, **kwargs)
             else:
-                if attrib in self.sub_interfaces:
+                storage = accessor.storage
+                if storage == _SUB_TEXT:
                     return self._get_sub_text(attrib, lang=lang)
-                elif attrib in self.bool_interfaces:
+                elif storage == _SUB_BOOL:
                     elem = self.xml.find('{%s}%s' % (self.namespace, attrib))
                     return elem is not None
                 else:
                     return self._get_attr(attrib)
-        elif attrib in self.plugin_attrib_map:
+        elif kind == _PLUGIN:
             plugin = self.get_plugin(attrib, lang)
             if plugin and plugin.is_extension:
                 return plugin[full_attrib]
             return plugin
+        elif kind == _SUBSTANZAS:
+            return self.iterables
         else:
             return ''
 
@@ -767,31 +971,34 @@ class ElementBase(object):
         :param value: The new value of the stanza interface.
         """
         full_attrib = attrib
-        attrib_lang = ('%s|' % attrib).split('|')
-        attrib = attrib_lang[0]
-        lang = attrib_lang[1] or None
+        if '|' in attrib:
+            attrib, lang_str = attrib.split('|')[:2]
+            lang = lang_str or None
+        else:
+            lang = None
 
-        kwargs = {}
-        if lang and attrib in self.lang_interfaces:
-            kwargs['lang'] = lang
+        try:
+            accessor = type(self).__dict__['_accessor_table'][attrib]
+        except KeyError:
+            accessor = self._get_accessor(attrib)
+        kind = accessor.kind
 
-        if attrib in self.interfaces or attrib == 'lang':
+        if kind == _INTERFACE:
             if value is not None:
-                set_method = "set_%s" % attrib.lower()
-
-                if self.plugin_overrides:
-                    name = self.plugin_overrides.get(set_method, None)
-                    if name:
-                        plugin = self.get_plugin(name, lang)
-                        if plugin:
-                            handler = getattr(plugin, set_method, None)
-                            if handler:
-                                return handler(value, **kwargs)
-
-                if hasattr(self, set_method):
-                    getattr(self, set_method)(value, **kwargs)
+                kwargs = {'lang': lang} if lang and accessor.lang else {}
+
+                if accessor.set_override:
+                    plugin = self.get_plugin(accessor.set_override, lang)
+                    if plugin:
+                        handler = getattr(plugin, accessor.set_name, None)
+                        if handler:
+                            return handler(value, **kwargs)
+
+                if accessor.setter is not None:
+                    accessor.setter(self, value, **kwargs)
                 else:
-                    if attrib in self.sub_interfaces:
+                    storage = accessor.storage
+                    if storage == _SUB_TEXT:
                         if isinstance(value, JID):
                             value = str(value)
                         if lang == '*':
@@ -800,7 +1007,7 @@ class ElementBase(object):
                                                           lang='*')
                         return self._set_sub_text(attrib, text=value,
                                                           lang=lang)
-                    elif attrib in self.bool_interfaces:
+                    elif storage == _SUB_BOOL:
                         if value:
                             return self._set_sub_text(attrib, '',
                                     keep=True,
@@ -813,7 +1020,7 @@ class ElementBase(object):
                         self._set_attr(attrib, value)
             else:
                 self.__delitem__(attrib)
-        elif attrib in self.plugin_attrib_map:
+        elif kind == _PLUGIN:
             plugin = self.get_plugin(attrib, lang)
             if plugin:
                 plugin[full_attrib] = value
@@ -852,44 +1059,44 @@ class ElementBase(object):
         :param attrib: The name of the affected stanza interface.
         """
         full_attrib = attrib
-        attrib_lang = ('%s|' % attrib).split('|')
-        attrib = attrib_lang[0]
-        lang = attrib_lang[1] or None
-
-        kwargs = {}
-        if lang and attrib in self.lang_interfaces:
-            kwargs['lang'] = lang
-
-        if attrib in self.interfaces or attrib == 'lang':
-            del_method = "del_%s" % attrib.lower()
-
-            if self.plugin_overrides:
-                name = self.plugin_overrides.get(del_method, None)
-                if name:
-                    plugin = self.get_plugin(attrib, lang)
-                    if plugin:
-                        handler = getattr(plugin, del_method, None)
-                        if handler:
-                            return handler(**kwargs)
-
-            if hasattr(self, del_method):
-                getattr(self, del_method)(**kwargs)
+        if '|' in attrib:
+            attrib, lang_str = attrib.split('|')[:2]
+            lang = lang_str or None
+        else:
+            lang = None
+
+        try:
+            accessor = type(self).__dict__['_accessor_table'][attrib]
+        except KeyError:
+            accessor = self._get_accessor(attrib)
+        kind = accessor.kind
+
+        if kind == _INTERFACE:
+            kwargs = {'lang': lang} if lang and accessor.lang else {}
+
+            if accessor.del_override:
+                plugin = self.get_plugin(attrib, lang)
+                if plugin:
+                    handler = getattr(plugin, accessor.del_name, None)
+                    if handler:
+                        return handler(**kwargs)
+
+            if accessor.deleter is not None:
+                accessor.deleter(self, **kwargs)
             else:
-                if attrib in self.sub_interfaces:
-                    return self._del_sub(attrib, lang=lang)
-                elif attrib in self.bool_interfaces:
-                    return self._del_sub(attrib, lang=lang)
-                else:
+                if accessor.storage == _ATTRIBUTE:
                     self._del_attr(attrib)
-        elif attrib in self.plugin_attrib_map:
+                else:
+                    return self._del_sub(attrib, lang=lang)
+        elif kind == _PLUGIN:
             plugin = self.get_plugin(attrib, lang, check=True)
             if not plugin:
                 return self
             if plugin.is_extension:
                 del plugin[full_attrib]
-                del self.plugins[(attrib, None)]
+                del self._plugins[(attrib, None)]
             else:
-                del self.plugins[(attrib, plugin['lang'])]
+                del self._plugins[(attrib, plugin['lang'])]
             self.loaded_plugins.remove(attrib)
             try:
                 self.xml.remove(plugin.xml)
@@ -1174,7 +1381,9 @@ class ElementBase(object):
         if not matched_substanzas and len(xpath) > 1:
             # Convert {namespace}tag@attribs to just tag
             next_tag = xpath[1].split('@')[0].split('}')[-1]
-            langs = [name[1] for name in self.plugins if name[0] == next_tag]
+            if self._lazy_plugins and next_tag in self._lazy_plugins:
+                self._load_lazy_plugin(next_tag)
+            langs = [name[1] for name in self._plugins if name[0] == next_tag]
             for lang in langs:
                 plugin = self.get_plugin(next_tag, lang)
                 if plugin and plugin.match(xpath[1:]):
@@ -1281,8 +1490,9 @@ class ElementBase(object):
         for child in list(self.xml):
             self.xml.remove(child)
 
-        for plugin in list(self.plugins.keys()):
-            del self.plugins[plugin]
+        self._lazy_plugins = None
+        for plugin in list(self._plugins.keys()):
+            del self._plugins[plugin]
         return self
 
     @classmethod
@@ -1471,6 +1681,10 @@ class StanzaBase(ElementBase):
     #: The default XMPP client namespace
     namespace = 'jabber:client'
     types: ClassVar[Set[str]] = set()
+    #: The lane of the send queue used by default for this kind of
+    #: stanza, see :mod:`slixmpp.xmlstream.sendqueue`. Elements which
+    #: are not stanzas, like stream management ones, go first.
+    send_lane: ClassVar[str] = 'control'
 
     def __init__(self, stream: Optional[XMLStream] = None,
                  xml: Optional[ET.Element] = None,
@@ -1481,6 +1695,8 @@ class StanzaBase(ElementBase):
         self.stream = stream
         if stream is not None:
             self.namespace = stream.default_ns
+            if recv and getattr(stream, 'lazy_plugins', False):
+                self._lazy = True
         ElementBase.__init__(self, xml, parent)
         if stype is not None:
             self['type'] = stype
@@ -1561,7 +1777,14 @@ class StanzaBase(ElementBase):
         :param bool clear: Indicates if the stanza's contents should be
                            removed. Defaults to ``True``.
         """
-        new_stanza = copy.copy(self)
+        if clear:
+            # The reply only keeps the attributes of the stanza, so
+            # there is no need to copy its payload.
+            xml = self.xml.makeelement(self.xml.tag, self.xml.attrib)
+            xml.text = self.xml.text
+            new_stanza = self.__class__(xml=xml, stream=self.stream)
+        else:
+            new_stanza = copy.copy(self)
         # if it's a component, use from
         if self.stream and hasattr(self.stream, "is_component") and \
                 getattr(self.stream, 'is_component'):
@@ -1569,8 +1792,6 @@ class StanzaBase(ElementBase):
         else:
             new_stanza['to'] = self['from']
             del new_stanza['from']
-        if clear:
-            new_stanza.clear()
         return new_stanza
 
     def error(self) -> StanzaBase:
@@ -1593,19 +1814,31 @@ class StanzaBase(ElementBase):
         log.exception('Error handling {%s}%s stanza', self.namespace,
                                                       self.name)
 
-    def send(self) -> None:
-        """Queue the stanza to be sent on the XML stream."""
+    def send(self, lane: Optional[str] = None) -> None:
+        """Queue the stanza to be sent on the XML stream.
+
+        :param lane: The lane of the send queue to use, one of
+                     :data:`~slixmpp.xmlstream.sendqueue.LANES`.
+                     Defaults to :attr:`send_lane`.
+        """
         if self.stream is not None:
-            self.stream.send(self)
+            self.stream.send(self, lane=lane)
         else:
             log.error("Tried to send stanza without a stream: %s", self)
 
     def __copy__(self) -> StanzaBase:
         """Return a copy of the stanza object that does not share the
         same underlying XML object, but does share the same XML stream.
+
+        The plugins of the copy of an incoming stanza are only
+        initialized when accessed, like the ones of the original.
         """
-        return self.__class__(xml=copy.deepcopy(self.xml),
-                              stream=self.stream)
+        cls = self.__class__
+        new_stanza = cls.__new__(cls)
+        new_stanza._lazy = self._lazy
+        new_stanza.__init__(xml=copy.deepcopy(self.xml),  # type: ignore[misc]
+                            stream=self.stream)
+        return new_stanza
 
     def __str__(self, top_level_ns: bool = False) -> str:
         """Serialize the stanza's XML to a string.
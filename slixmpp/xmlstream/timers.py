@@ -0,0 +1,132 @@
+# slixmpp.xmlstream.timers
+# ~~~~~~~~~~~~~~~~~~~~~~~~
+# This module provides a coarse timer shared by many streams, so that
+# their periodic tasks do not each keep a timer of the event loop.
+# Part of Slixmpp: The Slick XMPP Library
+# :copyright: (c) 2011 Nathanael C. Fritz
+# :license: MIT, see LICENSE for more details
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+)
+
+log = logging.getLogger(__name__)
+
+
+class WheelHandle:
+
+    """
+    A callback scheduled on a :class:`TimerWheel`, which can be
+    cancelled like an :class:`asyncio.TimerHandle`.
+    """
+    __slots__ = ('_wheel', '_callback', '_args', '_cancelled')
+
+    def __init__(self, wheel: TimerWheel, callback: Callable[..., Any],
+                 args: tuple):
+        self._wheel = wheel
+        self._callback = callback
+        self._args = args
+        self._cancelled = False
+
+    def cancel(self) -> None:
+        if not self._cancelled:
+            self._cancelled = True
+            self._wheel._pending -= 1
+
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+
+class TimerWheel:
+
+    """
+    Timer of a resolution of ``resolution`` seconds, for callbacks
+    which do not need to run at a precise time, like keepalives.
+
+    Callbacks are grouped by tick, and a single timer of the event
+    loop runs the callbacks of each tick, instead of one timer per
+    callback. Callbacks run at most ``resolution`` seconds late.
+
+    :param resolution: The duration of a tick, in seconds.
+    """
+
+    #: The duration of a tick, in seconds.
+    resolution: float
+    _slots: Dict[int, List[WheelHandle]]
+    _handle: Optional[asyncio.TimerHandle]
+    _next: Optional[int]
+
+    def __init__(self, resolution: float = 1.0,
+                 loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.resolution = resolution
+        self._loop = loop
+        self._slots = {}
+        self._handle = None
+        self._next = None
+        self._running = False
+        self._pending = 0
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            self._loop = asyncio.get_event_loop()
+        return self._loop
+
+    def __len__(self) -> int:
+        """The number of pending callbacks."""
+        return self._pending
+
+    def call_later(self, delay: float, callback: Callable[..., Any],
+                   *args: Any) -> WheelHandle:
+        """Schedule a callback, like
+        :meth:`asyncio.AbstractEventLoop.call_later`."""
+        tick = math.ceil((self.loop.time() + delay) / self.resolution)
+        handle = WheelHandle(self, callback, args)
+        slot = self._slots.get(tick)
+        if slot is None:
+            slot = self._slots[tick] = []
+        slot.append(handle)
+        self._pending += 1
+        if not self._running and (self._next is None or tick < self._next):
+            self._arm(tick)
+        return handle
+
+    def _arm(self, tick: int) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+        self._next = tick
+        self._handle = self.loop.call_at(tick * self.resolution,
+                                         self._run, tick)
+
+    def _run(self, tick: int) -> None:
+        self._handle = None
+        self._next = None
+        self._running = True
+        try:
+            now = max(tick, math.floor(self.loop.time() / self.resolution))
+            for due in sorted(t for t in self._slots if t <= now):
+                for handle in self._slots.pop(due):
+                    if handle._cancelled:
+                        continue
+                    handle._cancelled = True
+                    self._pending -= 1
+                    try:
+                        handle._callback(*handle._args)
+                    except Exception:
+                        log.error('Exception raised in timer callback:',
+                                  exc_info=True)
+        finally:
+            self._running = False
+        if self._pending == 0:
+            self._slots.clear()
+        elif self._slots:
+            self._arm(min(self._slots))
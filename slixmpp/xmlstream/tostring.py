@@ -8,13 +8,36 @@
 # :license: MIT, see LICENSE for more details
 from __future__ import annotations
 
-from typing import Optional, Set, TYPE_CHECKING
+from functools import lru_cache
+import re
+
+from typing import Any, Callable, List, Optional, Set, Tuple, TYPE_CHECKING
 from xml.etree.ElementTree import Element
 if TYPE_CHECKING:
     from slixmpp.xmlstream import XMLStream
 
 XML_NS = 'http://www.w3.org/XML/1998/namespace'
 
+_ESCAPE_CHARS = {
+    '&': '&amp;',
+    '<': '&lt;',
+    '>': '&gt;',
+    "'": '&apos;',
+    '"': '&quot;',
+}
+_ESCAPES = str.maketrans(_ESCAPE_CHARS)
+_NEEDS_ESCAPE = re.compile('[&<>\'"]').search
+
+
+@lru_cache(maxsize=4096)
+def _split_tag(tag: str) -> Tuple[str, str]:
+    """Split a ``{namespace}name`` tag or attribute name into its
+    name and namespace."""
+    if '}' in tag:
+        namespace, name = tag.split('}', 1)
+        return name, namespace[1:]
+    return tag, ''
+
 
 def tostring(xml: Optional[Element] = None, xmlns: str = '',
              stream: Optional[XMLStream] = None, outbuffer: str = '',
@@ -31,8 +54,8 @@ def tostring(xml: Optional[Element] = None, xmlns: str = '',
     :param string xmlns: Optional namespace of an element wrapping the XML
                          object.
     :param stream: The XML stream that generated the XML object.
-    :param string outbuffer: Optional buffer for storing serializations
-                             during recursive calls.
+    :param string outbuffer: Optional buffer to prepend to the
+                             serialization.
     :param bool top_level: Indicates that the element is the outermost
                            element.
     :param set namespaces: Track which namespaces are in active use so
@@ -45,97 +68,119 @@ def tostring(xml: Optional[Element] = None, xmlns: str = '',
     """
     if xml is None:
         return ''
-    # Add previous results to the start of the output.
     output = [outbuffer]
+    serialize(output.append, xml, xmlns, stream, top_level, open_only,
+              namespaces)
+    return ''.join(output)
+
 
-    # Extract the element's tag name.
-    tag_split = xml.tag.split('}', 1)
-    tag_name = tag_split[-1]
+def serialize(write: Callable[[str], Any], xml: Element, xmlns: str = '',
+              stream: Optional[XMLStream] = None, top_level: bool = False,
+              open_only: bool = False,
+              namespaces: Optional[Set[str]] = None) -> None:
+    """Serialize an XML object, passing each chunk of text to ``write``.
 
-    # Extract the element's namespace if it is defined.
-    if '}' in xml.tag:
-        tag_xmlns = tag_split[0][1:]
-    else:
-        tag_xmlns = ''
+    The tree is walked without recursion, and the output is the same
+    as the one of :func:`tostring`, which takes the same parameters.
 
+    :param write: Function called with each serialized chunk, such as
+                  the ``append`` method of a list.
+    """
     default_ns = ''
     stream_ns = ''
     use_cdata = False
+    namespace_map = None
 
     if stream:
         default_ns = stream.default_ns
         stream_ns = stream.stream_ns
         use_cdata = stream.use_cdata
-
-    # Output the tag name and derived namespace of the element.
-    namespace = ''
-    if tag_xmlns:
-        if top_level and tag_xmlns not in [default_ns, xmlns, stream_ns] \
-          or not top_level and tag_xmlns != xmlns:
-            namespace = ' xmlns="%s"' % tag_xmlns
-    if stream and tag_xmlns in stream.namespace_map:
-        mapped_namespace = stream.namespace_map[tag_xmlns]
-        if mapped_namespace:
-            tag_name = "%s:%s" % (mapped_namespace, tag_name)
-    output.append("<%s" % tag_name)
-    output.append(namespace)
-
-    # Output escaped attribute values.
-    new_namespaces = set()
-    for attrib, value in xml.attrib.items():
-        value = escape(value, use_cdata)
-        if '}' not in attrib:
-            output.append(' %s="%s"' % (attrib, value))
-        else:
-            attrib_split = attrib.split('}')
-            attrib_ns = attrib_split[0][1:]
-            attrib = attrib_split[1]
+        namespace_map = stream.namespace_map
+
+    if namespaces is None:
+        namespaces = set()
+
+    # The stack holds either (element, parent namespace) pairs to open,
+    # strings to output once all the children are done, or sets of
+    # namespaces going out of scope.
+    stack: List[Any] = [(xml, xmlns)]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        item = pop()
+        if item.__class__ is str:
+            write(item)
+            continue
+        if item.__class__ is not tuple:
+            # Remove namespaces introduced in a now closed context.
+            namespaces.difference_update(item)
+            continue
+
+        xml, xmlns = item
+        tag_name, tag_xmlns = _split_tag(xml.tag)
+
+        # Output the tag name and derived namespace of the element.
+        namespace = ''
+        if tag_xmlns:
+            if top_level and tag_xmlns not in (default_ns, xmlns, stream_ns) \
+              or not top_level and tag_xmlns != xmlns:
+                namespace = ' xmlns="%s"' % tag_xmlns
+        top_level = False
+        if namespace_map is not None and tag_xmlns in namespace_map:
+            mapped_namespace = namespace_map[tag_xmlns]
+            if mapped_namespace:
+                tag_name = "%s:%s" % (mapped_namespace, tag_name)
+        write("<%s%s" % (tag_name, namespace))
+
+        # Output escaped attribute values.
+        new_namespaces = None
+        for attrib, value in xml.attrib.items():
+            value = escape(value, use_cdata)
+            if '}' not in attrib:
+                write(' %s="%s"' % (attrib, value))
+                continue
+            attrib, attrib_ns = _split_tag(attrib)
             if attrib_ns == XML_NS:
-                output.append(' xml:%s="%s"' % (attrib, value))
-            elif stream and attrib_ns in stream.namespace_map:
-                mapped_ns = stream.namespace_map[attrib_ns]
+                write(' xml:%s="%s"' % (attrib, value))
+            elif namespace_map is not None and attrib_ns in namespace_map:
+                mapped_ns = namespace_map[attrib_ns]
                 if mapped_ns:
-                    if namespaces is None:
-                        namespaces = set()
                     if attrib_ns not in namespaces:
                         namespaces.add(attrib_ns)
+                        if new_namespaces is None:
+                            new_namespaces = set()
                         new_namespaces.add(attrib_ns)
-                        output.append(' xmlns:%s="%s"' % (
-                            mapped_ns, attrib_ns))
-                    output.append(' %s:%s="%s"' % (
-                        mapped_ns, attrib, value))
-
-    if open_only:
-        # Only output the opening tag, regardless of content.
-        output.append(">")
-        return ''.join(output)
-
-    if len(xml) or xml.text:
-        # If there are additional child elements to serialize.
-        output.append(">")
-        if xml.text:
-            output.append(escape(xml.text, use_cdata))
-        if len(xml):
-            for child in xml:
-                output.append(tostring(child, tag_xmlns, stream,
-                    namespaces=namespaces))
-        output.append("</%s>" % tag_name)
-    elif xml.text:
-        # If we only have text content.
-        output.append(">%s</%s>" % (escape(xml.text, use_cdata), tag_name))
-    else:
-        # Empty element.
-        output.append(" />")
-    if xml.tail:
-        # If there is additional text after the element.
-        output.append(escape(xml.tail, use_cdata))
-    for ns in new_namespaces:
-        # Remove namespaces introduced in this context. This is necessary
-        # because the namespaces object continues to be shared with other
-        # contexts.
-        if namespaces is not None:
-            namespaces.remove(ns)
-    return ''.join(output)
+                        write(' xmlns:%s="%s"' % (mapped_ns, attrib_ns))
+                    write(' %s:%s="%s"' % (mapped_ns, attrib, value))
+
+        if open_only:
+            # Only output the opening tag, regardless of content.
+            write(">")
+            return
+
+        if new_namespaces is not None:
+            push(new_namespaces)
+        text = xml.text
+        tail = xml.tail
+        if len(xml) or text:
+            # If there are additional child elements to serialize.
+            if text:
+                write(">%s" % escape(text, use_cdata))
+            else:
+                write(">")
+            if tail:
+                push("</%s>%s" % (tag_name, escape(tail, use_cdata)))
+            else:
+                push("</%s>" % tag_name)
+            for child in reversed(xml):
+                push((child, tag_xmlns))
+        else:
+            # Empty element.
+            if tail:
+                # If there is additional text after the element.
+                write(" />%s" % escape(tail, use_cdata))
+            else:
+                write(" />")
 
 
 def escape(text: str, use_cdata: bool = False) -> str:
@@ -144,24 +189,15 @@ def escape(text: str, use_cdata: bool = False) -> str:
     :param string text: The XML text to convert.
     :rtype: Unicode string
     """
-    escapes = {'&': '&amp;',
-               '<': '&lt;',
-               '>': '&gt;',
-               "'": '&apos;',
-               '"': '&quot;'}
-
-    if not use_cdata:
-        return ''.join(escapes.get(c, c) for c in text)
-    else:
-        escape_needed = False
-        for c in text:
-            if c in escapes:
-                escape_needed = True
-                break
-        if escape_needed:
-            escaped = map(lambda x : "<![CDATA[%s]]>" % x, text.split("]]>"))
-            return "<![CDATA[]]]><![CDATA[]>]]>".join(escaped)
+    if not isinstance(text, str):
+        # Some plugins store sequences of strings as element text.
+        return ''.join(_ESCAPE_CHARS.get(c, c) for c in text)
+    if _NEEDS_ESCAPE(text) is None:
         return text
+    if not use_cdata:
+        return text.translate(_ESCAPES)
+    escaped = map(lambda x : "<![CDATA[%s]]>" % x, text.split("]]>"))
+    return "<![CDATA[]]]><![CDATA[]>]]>".join(escaped)
 
 
 def _get_highlight():
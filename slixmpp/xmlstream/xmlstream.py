@@ -30,14 +30,16 @@ from typing import (
 import asyncio
 import functools
 import logging
+import random
 import socket as Socket
 import ssl
 import uuid
 import warnings
 import weakref
-import collections
 
+from concurrent.futures import Executor
 from contextlib import contextmanager
+from time import perf_counter
 import xml.etree.ElementTree as ET
 from asyncio import (
     AbstractEventLoop,
@@ -52,13 +54,43 @@ from asyncio import (
 from pathlib import Path
 
 from slixmpp.types import FilterString
-from slixmpp.xmlstream.tostring import tostring
+from slixmpp.xmlstream.tostring import tostring, serialize
 from slixmpp.xmlstream.stanzabase import StanzaBase, ElementBase
-from slixmpp.xmlstream.resolver import resolve, default_resolver
+from slixmpp.xmlstream.resolver import resolve, default_resolver, DNSCache
+from slixmpp.xmlstream.connector import race
+from slixmpp.xmlstream.timers import TimerWheel, WheelHandle
 from slixmpp.xmlstream.handler.base import BaseHandler
+from slixmpp.xmlstream.dispatch import HandlerIndex
+from slixmpp.xmlstream.iqtracker import IqTracker
+from slixmpp.xmlstream.sendqueue import SendQueue, LANES, NORMAL
+from slixmpp.xmlstream.metrics import (
+    callable_name,
+    LatencyRecorder,
+    SlowCall,
+    StallDetector,
+    StreamMetrics,
+    stanza_summary,
+    EVENT,
+    EVENT_HANDLER,
+    FILTER_IN,
+    FILTER_OUT,
+    HANDLER,
+    STREAM,
+)
+from slixmpp.xmlstream.parser import (
+    etree_parser,
+    ParserFactory,
+    StanzaLimitError,
+    StanzaParser,
+)
 
 T = TypeVar('T')
 
+#: The settings each SSL context was last configured with by
+#: :meth:`XMLStream.get_ssl_context`.
+_configured_ssl_contexts: 'weakref.WeakKeyDictionary[ssl.SSLContext, Tuple[Any, ...]]' = \
+    weakref.WeakKeyDictionary()
+
 #: The time in seconds to wait before timing out waiting for response stanzas.
 RESPONSE_TIMEOUT = 30
 
@@ -92,11 +124,13 @@ _T = TypeVar('_T', str, ElementBase, StanzaBase)
 
 SyncFilter = Callable[[StanzaBase], Optional[StanzaBase]]
 AsyncFilter = Callable[[StanzaBase], Awaitable[Optional[StanzaBase]]]
+SerializedFilter = Callable[[StanzaBase, bytes], Optional[bytes]]
 
 
 Filter = Union[
     SyncFilter,
     AsyncFilter,
+    SerializedFilter,
 ]
 
 _FiltersDict = Dict[str, List[Filter]]
@@ -107,6 +141,51 @@ Handler = Callable[[Any], Union[
 ]]
 
 
+class _DeferFilters(ContinueQueue):
+    """
+    Raised in the send queue when an async filter does not complete
+    right away, to finish filtering the stanza in the background.
+    """
+
+    def __init__(self, task: Task, already_run_filters: Set[Filter]):
+        super().__init__('Slow coroutine, filtering in the background')
+        self.task = task
+        self.already_run_filters = already_run_filters
+
+
+class _Resumed:
+    """
+    Awaitable finishing a coroutine which already ran up to its first
+    suspension, so that it can be wrapped in a task.
+
+    :param coro: The coroutine.
+    :param pending: What the coroutine yielded when it was suspended.
+    """
+
+    __slots__ = ('coro', 'pending')
+
+    def __init__(self, coro: Coroutine[Any, Any, Any], pending: Any):
+        self.coro = coro
+        self.pending = pending
+
+    def __await__(self) -> Generator[Any, Any, Any]:
+        coro = self.coro
+        pending = self.pending
+        while True:
+            try:
+                try:
+                    value = yield pending
+                except GeneratorExit:
+                    coro.close()
+                    raise
+                except BaseException as exc:
+                    pending = coro.throw(exc)
+                else:
+                    pending = coro.send(value)
+            except StopIteration as exc:
+                return exc.value
+
+
 class XMLStream(asyncio.BaseProtocol):
     """
     An XML stream connection manager and event dispatcher.
@@ -143,19 +222,65 @@ class XMLStream(asyncio.BaseProtocol):
     # after each failure)
     _connect_loop_wait: float
 
-    parser: Optional[ET.XMLPullParser]
+    #: The parser of the incoming stream, created for each connection.
+    #: Its ``bytes_parsed`` and ``stanzas_parsed`` attributes count the
+    #: data received on the current connection.
+    parser: Optional[StanzaParser]
     xml_depth: int
     xml_root: Optional[ET.Element]
 
     force_starttls: Optional[bool]
     disable_starttls: Optional[bool]
 
-    waiting_queue: asyncio.Queue
+    #: The outbound queue, with one lane per kind of traffic. The
+    #: share of each lane can be changed through its ``weights``.
+    waiting_queue: SendQueue
+
+    #: When the send queue holds this many items, the
+    #: ``send_queue_high`` event is triggered and :meth:`send_async`
+    #: waits before queuing more. ``0`` disables the limit.
+    send_queue_high: int
+
+    #: Once the send queue has reached :attr:`send_queue_high`, the
+    #: number of items it must drop to before the ``send_queue_low``
+    #: event is triggered and :meth:`send_async` callers resume.
+    send_queue_low: int
+
+    #: Set unless the send queue is above its high watermark.
+    _send_queue_ready: asyncio.Event
+
+    #: Set unless the transport asked to pause writing.
+    _writing_resumed: asyncio.Event
 
     # A dict of {name: handle}
-    scheduled_events: Dict[str, TimerHandle]
+    scheduled_events: Dict[str, Union[TimerHandle, WheelHandle]]
+
+    #: If set, the timer running the callbacks given to
+    #: :meth:`schedule`, which may be shared by many streams.
+    timers: Optional[TimerWheel]
+
+    #: The cache of DNS results, which may be shared by many streams,
+    #: or ``None`` to resolve the server on each connection attempt.
+    dns_cache: Optional[DNSCache]
 
-    ssl_context: ssl.SSLContext
+    #: The time, in seconds, given to a connection attempt before the
+    #: next address of the server is tried concurrently. ``None`` tries
+    #: the addresses one after the other, once per connection attempt.
+    happy_eyeballs_delay: Optional[float]
+
+    #: The maximum random delay added to each reconnection delay, as a
+    #: fraction of it, so that many streams disconnected at the same
+    #: time do not all reconnect at once.
+    reconnect_jitter: float
+
+    _ssl_context: Optional[ssl.SSLContext]
+    _ssl_context_assigned: bool
+
+    #: SSL contexts shared with other streams, by the settings they are
+    #: configured with (see :meth:`get_ssl_context`), or ``None`` to
+    #: configure :attr:`ssl_context` instead. They are not used once
+    #: :attr:`ssl_context` has been assigned.
+    ssl_contexts: Optional[Dict[Tuple[Any, ...], ssl.SSLContext]]
 
     # The event to trigger when the create_connection() succeeds. It can
     # be "connected" or "tls_success" depending on the step we are at.
@@ -250,9 +375,72 @@ class XMLStream(asyncio.BaseProtocol):
     #: A mapping of XML namespaces to well-known prefixes.
     namespace_map: dict
 
+    #: The maximum number of bytes of queued stanzas written to the
+    #: transport in a single call. Set it to ``0`` to write each
+    #: stanza separately.
+    max_send_batch: int
+
+    # The batch being prepared by the send queue, to which
+    # send_raw() appends, so that raw data stays in order with it.
+    _send_batch: Optional[List[bytes]]
+
+    #: If ``True``, the plugins of incoming stanzas are only
+    #: initialized when they are accessed by a handler, which saves
+    #: building the plugins no handler reads. Defaults to ``False``.
+    lazy_plugins: bool
+
+    #: The maximum size of an incoming stanza, in bytes. A peer sending
+    #: a larger stanza gets a ``policy-violation`` stream error. ``0``
+    #: means no limit.
+    max_stanza_size: int
+
+    #: The maximum nesting of elements in an incoming stanza, handled
+    #: like :attr:`max_stanza_size`. ``0`` means no limit.
+    max_stanza_depth: int
+
+    #: Create the underlying XML parser of each new connection, see
+    #: :mod:`slixmpp.xmlstream.parser`.
+    parser_factory: ParserFactory
+
+    #: If ``True``, the coroutine handlers of an event are run one
+    #: after the other in a single task, instead of a task each.
+    batch_event_coroutines: bool
+
+    #: The maximum number of outgoing stanzas going through slow async
+    #: filters at the same time. Stanzas to the same recipient always
+    #: keep their order. ``0`` processes one stanza at a time, and
+    #: sends stanzas whose filters take more than a second out of
+    #: order.
+    out_filter_concurrency: int
+
+    #: Statistics of the time spent in the async outgoing filters, by
+    #: filter name.
+    filter_latency: LatencyRecorder
+
+    #: The instrumentation of the stream, if enabled with
+    #: :meth:`enable_metrics`.
+    metrics: Optional[StreamMetrics]
+
+    #: The watchdog of the synchronous callbacks, if enabled with
+    #: :meth:`enable_stall_detector`.
+    stall_detector: Optional[StallDetector]
+
+    #: The executor running the CPU-bound work of handlers and
+    #: plugins, see :meth:`run_in_executor`. ``None`` uses the default
+    #: executor of the event loop, a thread pool. Handlers created with
+    #: ``offload=True`` need a thread pool, as stanzas cannot be
+    #: pickled to be sent to a process pool.
+    executor: Optional[Executor]
+
+    #: The <iq/> requests waiting for a response.
+    iq_tracker: IqTracker
+
     __root_stanza: List[Type[StanzaBase]]
-    __handlers: List[BaseHandler]
-    __event_handlers: Dict[str, List[Tuple[Handler, bool]]]
+    __handlers: HandlerIndex
+    #: The handlers of each event, as (handler, disposable, coroutine)
+    #: tuples. The tuples of handlers are replaced, never modified, so
+    #: an event can go through them without copying.
+    __event_handlers: Dict[str, Tuple[Tuple[Handler, bool, bool], ...]]
     __filters: _FiltersDict
 
     # Current connection attempt (Future)
@@ -279,7 +467,11 @@ class XMLStream(asyncio.BaseProtocol):
 
     _run_out_filters: Optional[Future]
     __slow_tasks: List[Task]
-    __queued_stanzas: List[Tuple[Union[StanzaBase, str], bool]]
+    #: The last stanza filtered in the background, by recipient.
+    __filtering: Dict[str, Task]
+    __filtering_count: int
+    __filtering_slot: asyncio.Event
+    __queued_stanzas: List[Tuple[Union[StanzaBase, str], bool, str]]
 
     def __init__(self, host: str = '', port: int = 0):
         self.transport = None
@@ -293,14 +485,26 @@ class XMLStream(asyncio.BaseProtocol):
         self.force_starttls = None
         self.disable_starttls = None
 
-        self.waiting_queue = asyncio.Queue()
+        self.waiting_queue = SendQueue()
+        self.send_queue_high = 0
+        self.send_queue_low = 0
+        self._send_queue_ready = asyncio.Event()
+        self._send_queue_ready.set()
+        self._writing_resumed = asyncio.Event()
+        self._writing_resumed.set()
 
         # A dict of {name: handle}
         self.scheduled_events = {}
 
-        self.ssl_context = ssl.create_default_context()
-        self.ssl_context.check_hostname = False
-        self.ssl_context.verify_mode = ssl.CERT_NONE
+        self.timers = None
+        self.dns_cache = DNSCache()
+        self.happy_eyeballs_delay = 0.25
+        self.reconnect_jitter = 0.0
+
+        # Created on first use, as it is costly and may be shared.
+        self._ssl_context = None
+        self._ssl_context_assigned = False
+        self.ssl_contexts = None
 
         self.event_when_connected = "connected"
 
@@ -308,6 +512,8 @@ class XMLStream(asyncio.BaseProtocol):
 
         self.ca_certs = None
 
+        self.certfile = None
+
         self.keyfile = None
 
         self._loop = None
@@ -340,12 +546,25 @@ class XMLStream(asyncio.BaseProtocol):
 
         self.end_session_on_disconnect = True
         self.namespace_map = {StanzaBase.xml_ns: 'xml'}
+        self.max_send_batch = 65536
+        self._send_batch = None
+        self.lazy_plugins = False
+        self.max_stanza_size = 0
+        self.max_stanza_depth = 0
+        self.parser_factory = etree_parser
+        self.batch_event_coroutines = False
+        self.out_filter_concurrency = 16
+        self.filter_latency = LatencyRecorder()
+        self.metrics = None
+        self.stall_detector = None
+        self.executor = None
 
         self.__root_stanza = []
-        self.__handlers = []
+        self.__handlers = HandlerIndex()
+        self.iq_tracker = IqTracker(self)
         self.__event_handlers = {}
         self.__filters = {
-            'in': [], 'out': [], 'out_sync': []
+            'in': [], 'out': [], 'out_sync': [], 'out_serialized': []
         }
 
         self._current_connection_attempt = None
@@ -366,6 +585,10 @@ class XMLStream(asyncio.BaseProtocol):
 
         self._run_out_filters = None
         self.__slow_tasks = []
+        self.__filtering = {}
+        self.__filtering_count = 0
+        self.__filtering_slot = asyncio.Event()
+        self.__filtering_slot.set()
         self.__queued_stanzas = []
 
     @property
@@ -378,6 +601,26 @@ class XMLStream(asyncio.BaseProtocol):
     def loop(self, value: AbstractEventLoop) -> None:
         self._loop = value
 
+    @property
+    def ssl_context(self) -> ssl.SSLContext:
+        """The SSL context of the stream, which may be shared by many
+        streams."""
+        if self._ssl_context is None:
+            self._ssl_context = self._new_ssl_context()
+        return self._ssl_context
+
+    @staticmethod
+    def _new_ssl_context() -> ssl.SSLContext:
+        ssl_context = ssl.create_default_context()
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+        return ssl_context
+
+    @ssl_context.setter
+    def ssl_context(self, value: ssl.SSLContext) -> None:
+        self._ssl_context = value
+        self._ssl_context_assigned = True
+
     def new_id(self) -> str:
         """Generate and return a new stream ID in hexadecimal form.
 
@@ -461,8 +704,15 @@ class XMLStream(asyncio.BaseProtocol):
         self.event_when_connected = "connected"
 
         if self._connect_loop_wait > 0:
-            self.event('reconnect_delay', self._connect_loop_wait)
-            await asyncio.sleep(self._connect_loop_wait)
+            delay = self._connect_loop_wait
+            if self.reconnect_jitter:
+                delay += random.uniform(0, delay * self.reconnect_jitter)
+            self.event('reconnect_delay', delay)
+            await asyncio.sleep(delay)
+
+        if self.happy_eyeballs_delay is not None:
+            await self._race_connection(self.happy_eyeballs_delay)
+            return
 
         record = await self._pick_dns_answer(self.default_domain)
         if record is not None:
@@ -499,6 +749,54 @@ class XMLStream(asyncio.BaseProtocol):
             self.event("connection_failed", e)
             self.reschedule_connection_attempt()
 
+    async def _race_connection(self, delay: float) -> None:
+        """Connect to the first reachable address of the server, trying
+        them concurrently with staggered starts."""
+        records = await self.get_dns_records(self.default_domain,
+                                             self.address[1])
+
+        ssl_context: Optional[ssl.SSLContext]
+        if self.use_ssl:
+            ssl_context = self.get_ssl_context()
+        else:
+            ssl_context = None
+        server_hostname = self.default_domain if self.use_ssl else None
+
+        if self._current_connection_attempt is None:
+            return
+        try:
+            if not records:
+                # No DNS records, try (host, port) as a last resort.
+                await self.loop.create_connection(lambda: self,
+                                                  self.address[0],
+                                                  self.address[1],
+                                                  ssl=ssl_context,
+                                                  server_hostname=server_hostname)
+            else:
+                record, sock = await race(records, loop=self.loop,
+                                          delay=delay)
+                host, address, port = record
+                self.address = (address, port)
+                self._service_name = host
+                self.event('connection_target', record)
+                try:
+                    await self.loop.create_connection(lambda: self,
+                                                      sock=sock,
+                                                      ssl=ssl_context,
+                                                      server_hostname=server_hostname)
+                except BaseException:
+                    sock.close()
+                    raise
+            self._connect_loop_wait = 0
+        except Socket.gaierror as e:
+            self.event('connection_failed',
+                       'No DNS record available for %s' % self.default_domain)
+            self.reschedule_connection_attempt()
+        except OSError as e:
+            log.debug('Connection failed: %s', e)
+            self.event("connection_failed", e)
+            self.reschedule_connection_attempt()
+
     def process(self, *, forever: bool = True, timeout: Optional[int] = None) -> None:
         """Process all the available XMPP events (receiving or sending data on the
         socket(s), calling various registered callbacks, calling expired
@@ -533,7 +831,11 @@ class XMLStream(asyncio.BaseProtocol):
         """
         self.xml_depth = 0
         self.xml_root = None
-        self.parser = ET.XMLPullParser(("start", "end"))
+        self.parser = StanzaParser(
+            max_stanza_size=self.max_stanza_size,
+            max_depth=self.max_stanza_depth,
+            factory=self.parser_factory,
+        )
 
     def connection_made(self, transport: BaseTransport) -> None:
         """Called when the TCP connection has been established with the server
@@ -562,9 +864,12 @@ class XMLStream(asyncio.BaseProtocol):
             log.warning('Received data before the connection is established: %r',
                         data)
             return
-        self.parser.feed(data)
+        metrics = self.metrics
+        if metrics is not None:
+            start = perf_counter()
+            dispatch = 0.0
         try:
-            for event, xml in self.parser.read_events():
+            for event, xml in self.parser.feed(data):
                 if event == 'start':
                     if self.xml_depth == 0:
                         # We have received the start of the root element.
@@ -588,7 +893,14 @@ class XMLStream(asyncio.BaseProtocol):
                     elif self.xml_depth == 1:
                         # A stanza is an XML element that is a direct child of
                         # the root element, hence the check of depth == 1
-                        self._spawn_event(xml)
+                        if metrics is None:
+                            self._spawn_event(xml)
+                        else:
+                            spawned = perf_counter()
+                            self._spawn_event(xml)
+                            spawned = perf_counter() - spawned
+                            dispatch += spawned
+                            metrics.record(STREAM, 'dispatch', spawned)
                         if self.xml_root is not None:
                             # Keep the root element empty of children to
                             # save on memory use.
@@ -604,6 +916,19 @@ class XMLStream(asyncio.BaseProtocol):
             error['text'] = 'Server sent: %r' % data
             self.send(error)
             self.disconnect()
+        except StanzaLimitError as exc:
+            log.error('Stanza rejected: %s', exc)
+
+            from slixmpp.stanza.stream_error import StreamError
+            error = StreamError()
+            error['condition'] = 'policy-violation'
+            error['text'] = str(exc)
+            self.send(error)
+            self.disconnect()
+        finally:
+            if metrics is not None:
+                metrics.record(STREAM, 'parse',
+                               perf_counter() - start - dispatch)
 
     def is_connecting(self) -> bool:
         return self._current_connection_attempt is not None
@@ -626,6 +951,7 @@ class XMLStream(asyncio.BaseProtocol):
         self.parser = None
         self.transport = None
         self.socket = None
+        self._writing_resumed.set()
         # Fire the events after cleanup
         if self.end_session_on_disconnect:
             self._reset_sendq()
@@ -633,6 +959,21 @@ class XMLStream(asyncio.BaseProtocol):
         self._set_disconnected_future()
         self.event("disconnected", self.disconnect_reason or exception)
 
+    def pause_writing(self) -> None:
+        """Called by the transport when its write buffer is full.
+
+        The send queue stops being written to the transport until
+        :meth:`resume_writing` is called, so that it fills up instead
+        and :meth:`send_async` callers wait.
+        """
+        log.debug('Transport buffer full, pausing the send queue')
+        self._writing_resumed.clear()
+
+    def resume_writing(self) -> None:
+        """Called by the transport when its write buffer has drained."""
+        log.debug('Transport buffer drained, resuming the send queue')
+        self._writing_resumed.set()
+
     def reschedule_connection_attempt(self) -> None:
         """
         Increase the exponential back-off and initate another background
@@ -779,40 +1120,67 @@ class XMLStream(asyncio.BaseProtocol):
     def get_ssl_context(self) -> ssl.SSLContext:
         """
         Get SSL context.
+
+        The context is only configured once for given settings. If
+        :attr:`ssl_contexts` is set, the context for the settings of
+        this stream is taken from it, or created and added to it, so
+        that streams with different settings never change the context
+        of the others. An :attr:`ssl_context` assigned to this stream
+        is always used instead, and configured in place, so that its
+        other settings, like the verification mode or ALPN protocols,
+        are kept.
         """
+        ca_certs = self.ca_certs
+        if ca_certs is not None and not isinstance(ca_certs, (str, Path)):
+            ca_certs = tuple(ca_certs)
+        settings = (self.ciphers, self.keyfile, self.certfile, ca_certs)
+        if self.ssl_contexts is not None and not self._ssl_context_assigned:
+            ssl_context = self.ssl_contexts.get(settings)
+            if ssl_context is None:
+                ssl_context = self._new_ssl_context()
+                self._configure_ssl_context(ssl_context, ca_certs)
+                self.ssl_contexts[settings] = ssl_context
+            self._ssl_context = ssl_context
+            return ssl_context
+        ssl_context = self.ssl_context
+        if _configured_ssl_contexts.get(ssl_context) != settings:
+            self._configure_ssl_context(ssl_context, ca_certs)
+            _configured_ssl_contexts[ssl_context] = settings
+        return ssl_context
+
+    def _configure_ssl_context(
+            self, ssl_context: ssl.SSLContext,
+            ca_certs: Optional[Union[str, Path, Tuple[Path, ...]]]) -> None:
         if self.ciphers is not None:
-            self.ssl_context.set_ciphers(self.ciphers)
+            ssl_context.set_ciphers(self.ciphers)
         if self.keyfile and self.certfile:
             try:
-                self.ssl_context.load_cert_chain(self.certfile, self.keyfile)
+                ssl_context.load_cert_chain(self.certfile, self.keyfile)
             except (ssl.SSLError, OSError):
                 log.debug('Error loading the cert chain:', exc_info=True)
             else:
                 log.debug('Loaded cert file %s and key file %s',
                           self.certfile, self.keyfile)
-        if self.ca_certs is not None:
+        if ca_certs is not None:
             ca_cert: Optional[Path] = None
             # XXX: Compat before d733c54518.
-            if isinstance(self.ca_certs, str):
-                self.ca_certs = Path(self.ca_certs)
-            if isinstance(self.ca_certs, Path):
-                if self.ca_certs.is_file():
-                    ca_cert = self.ca_certs
+            if isinstance(ca_certs, str):
+                ca_certs = Path(ca_certs)
+            if isinstance(ca_certs, Path):
+                if ca_certs.is_file():
+                    ca_cert = ca_certs
             else:
-                for bundle in self.ca_certs:
+                for bundle in ca_certs:
                     if bundle.is_file():
                         ca_cert = bundle
                         break
-            if ca_cert is None and \
-               isinstance(self.ca_certs, (Path, collections.abc.Iterable)):
-                raise InvalidCABundle(self.ca_certs)
+            if ca_cert is None:
+                raise InvalidCABundle(ca_certs)
 
-            self.ssl_context.verify_mode = ssl.CERT_REQUIRED
-            self.ssl_context.load_verify_locations(cafile=ca_cert)
+            ssl_context.verify_mode = ssl.CERT_REQUIRED
+            ssl_context.load_verify_locations(cafile=ca_cert)
         else:
-            self.ssl_context.set_default_verify_paths()
-
-        return self.ssl_context
+            ssl_context.set_default_verify_paths()
 
     async def start_tls(self) -> bool:
         """Perform handshakes for TLS.
@@ -916,7 +1284,85 @@ class XMLStream(asyncio.BaseProtocol):
         """
         self.__root_stanza.remove(stanza_class)
 
-    def add_filter(self, mode: FilterString, handler: Callable[[StanzaBase], Optional[StanzaBase]], order: Optional[int] = None) -> None:
+    def run_in_executor(self, func: Callable[..., T], *args: Any,
+                        **kwargs: Any) -> Future:
+        """Run a blocking function in :attr:`executor`, and return a
+        future of its result.
+
+        Used by :class:`~.Callback` handlers created with
+        ``offload=True``, and by plugins for CPU-bound work on large
+        inputs, like hashing or encrypting files.
+        """
+        if kwargs:
+            func = functools.partial(func, **kwargs)
+        return self.loop.run_in_executor(self.executor, func, *args)
+
+    def enable_metrics(self, export_interval: float = 0) -> StreamMetrics:
+        """Start recording the time spent in each filter, handler and
+        event handler, in parsing, dispatching and serializing stanzas,
+        along with the size of the queues of the stream.
+
+        :param export_interval: If set, give a snapshot of the metrics
+                                to their exporters every
+                                ``export_interval`` seconds.
+        :returns: The :class:`~.StreamMetrics` of the stream.
+        """
+        if self.metrics is None:
+            queue = self.waiting_queue
+            gauges = {
+                'send_queue': queue.qsize,
+                'queued_stanzas': lambda: len(self.__queued_stanzas),
+                'filtering': lambda: self.__filtering_count,
+                'pending_iqs': lambda: len(self.iq_tracker),
+            }
+            for lane in LANES:
+                gauges['send_queue_' + lane] = functools.partial(
+                    queue.lane_size, lane)
+            self.metrics = StreamMetrics(gauges)
+        self.cancel_schedule('Export metrics')
+        if export_interval:
+            self.schedule('Export metrics', export_interval,
+                          self.metrics.export, repeat=True)
+        return self.metrics
+
+    def disable_metrics(self) -> None:
+        """Stop recording metrics, and forget the recorded ones."""
+        self.cancel_schedule('Export metrics')
+        self.metrics = None
+
+    def enable_stall_detector(self, threshold: float = 0.1,
+                              size: int = 50) -> StallDetector:
+        """Report the synchronous filters, handlers, event handlers and
+        scheduled callbacks which block the event loop for too long, as
+        well as the dispatch of each incoming stanza as a whole.
+
+        Each of them fires a ``slow_handler`` event with a
+        :class:`~.SlowCall`, and is kept by the detector.
+
+        :param threshold: The time, in seconds, above which a callback
+                          is reported.
+        :param size: The number of reported callbacks to keep.
+        :returns: The :class:`~.StallDetector` of the stream.
+        """
+        self.stall_detector = StallDetector(threshold, size)
+        return self.stall_detector
+
+    def disable_stall_detector(self) -> None:
+        """Stop reporting slow callbacks."""
+        self.stall_detector = None
+
+    def _report_stall(self, stalls: StallDetector, kind: str, name: str,
+                      duration: float, data: Any = None) -> None:
+        summary = None
+        if isinstance(data, ElementBase):
+            summary = stanza_summary(data.xml)
+        call = SlowCall(kind, name, duration, summary)
+        log.warning('Slow %s %r blocked the event loop for %.3fs: %s',
+                    kind, name, duration, summary or '')
+        stalls.record(call)
+        self.event('slow_handler', call)
+
+    def add_filter(self, mode: FilterString, handler: Filter, order: Optional[int] = None) -> None:
         """Add a filter for incoming or outgoing stanzas.
 
         These filters are applied before incoming stanzas are
@@ -928,7 +1374,12 @@ class XMLStream(asyncio.BaseProtocol):
         ``None``, then the stanza will be dropped from being
         processed for events or from being sent.
 
-        :param mode: One of ``'in'`` or ``'out'``.
+        The ``'out_serialized'`` filters are instead given the stanza
+        and the bytes it was serialized to, after the ``'out_sync'``
+        filters, and return the bytes to write, or ``None``.
+
+        :param mode: One of ``'in'``, ``'out'``, ``'out_sync'`` or
+                     ``'out_serialized'``.
         :param handler: The filter function.
         :param int order: The position to insert the filter in
                           the list of active filters.
@@ -938,7 +1389,7 @@ class XMLStream(asyncio.BaseProtocol):
         else:
             self.__filters[mode].append(handler)
 
-    def del_filter(self, mode: str, handler: Callable[[StanzaBase], Optional[StanzaBase]]) -> None:
+    def del_filter(self, mode: str, handler: Filter) -> None:
         """Remove an incoming or outgoing filter."""
         self.__filters[mode].remove(handler)
 
@@ -951,7 +1402,7 @@ class XMLStream(asyncio.BaseProtocol):
                 derived object to execute.
         """
         if handler.stream is None:
-            self.__handlers.append(handler)
+            self.__handlers.add(handler)
             handler.stream = weakref.ref(self)
 
     def remove_handler(self, name: str) -> bool:
@@ -959,13 +1410,7 @@ class XMLStream(asyncio.BaseProtocol):
 
         :param name: The name of the handler.
         """
-        idx = 0
-        for handler in self.__handlers:
-            if handler.name == name:
-                self.__handlers.pop(idx)
-                return True
-            idx += 1
-        return False
+        return self.__handlers.remove_name(name)
 
     async def get_dns_records(self, domain: str, port: Optional[int] = None) -> List[Tuple[str, str, int]]:
         """Get the DNS records for a domain.
@@ -979,7 +1424,8 @@ class XMLStream(asyncio.BaseProtocol):
         resolver = default_resolver(loop=self.loop)
         self.configure_dns(resolver, domain=domain, port=port)
 
-        result = await resolve(domain, port,
+        lookup = resolve if self.dns_cache is None else self.dns_cache.resolve
+        result = await lookup(domain, port,
                                     service=self.dns_service,
                                     resolver=resolver,
                                     use_ipv6=self.use_ipv6,
@@ -1015,9 +1461,9 @@ class XMLStream(asyncio.BaseProtocol):
         :param disposable: If set to ``True``, the handler will be
                            discarded after one use. Defaults to ``False``.
         """
-        if not name in self.__event_handlers:
-            self.__event_handlers[name] = []
-        self.__event_handlers[name].append((pointer, disposable))
+        handlers = self.__event_handlers.get(name, ())
+        entry = (pointer, disposable, iscoroutinefunction(pointer))
+        self.__event_handlers[name] = handlers + (entry,)
 
     def del_event_handler(self, name: str, pointer: Callable[..., Any]) -> None:
         """Remove a function as a handler for an event.
@@ -1030,19 +1476,26 @@ class XMLStream(asyncio.BaseProtocol):
 
         # Need to keep handlers that do not use
         # the given function pointer
-        def filter_pointers(handler: Tuple[Callable[..., Any], bool]) -> bool:
-            return handler[0] != pointer
+        self.__event_handlers[name] = tuple(
+            handler for handler in self.__event_handlers[name]
+            if handler[0] != pointer
+        )
 
-        self.__event_handlers[name] = list(filter(
-            filter_pointers,
-            self.__event_handlers[name]))
+    def _discard_event_handler(self, name: str,
+                               handler: Tuple[Handler, bool, bool]) -> None:
+        """Remove a disposable handler after its first use."""
+        handlers = self.__event_handlers.get(name)
+        if handlers and handler in handlers:
+            self.__event_handlers[name] = tuple(
+                other for other in handlers if other is not handler
+            )
 
     def event_handled(self, name: str) -> int:
         """Returns the number of registered handlers for an event.
 
         :param name: The name of the event to check.
         """
-        return len(self.__event_handlers.get(name, []))
+        return len(self.__event_handlers.get(name, ()))
 
     async def event_async(self, name: str, data: Any = {}) -> None:
         """Manually trigger a custom event, but await coroutines immediately.
@@ -1056,20 +1509,17 @@ class XMLStream(asyncio.BaseProtocol):
                      Defaults to an empty dictionary, but is usually
                      a stanza object.
         """
-        handlers = self.__event_handlers.get(name, [])[:]
+        handlers = self.__event_handlers.get(name, ())
         for handler in handlers:
-            handler_callback, disposable = handler
+            handler_callback, disposable, is_coroutine = handler
             if disposable:
                 # If the handler is disposable, we will go ahead and
                 # remove it now instead of waiting for it to be
                 # processed in the queue.
-                try:
-                    self.__event_handlers[name].remove(handler)
-                except ValueError:
-                    pass
+                self._discard_event_handler(name, handler)
             # If the callback is a coroutine, schedule it instead of
             # running it directly
-            if iscoroutinefunction(handler_callback):
+            if is_coroutine:
                 try:
                     await handler_callback(data)
                 except Exception as exc:
@@ -1092,42 +1542,80 @@ class XMLStream(asyncio.BaseProtocol):
         """
         log.debug("Event triggered: %s", name)
 
-        handlers = self.__event_handlers.get(name, [])[:]
+        handlers = self.__event_handlers.get(name)
+        if not handlers:
+            return
+        metrics = self.metrics
+        if metrics is not None:
+            start = perf_counter()
+        # Do not watch the handlers of our own reports.
+        stalls = self.stall_detector if name != 'slow_handler' else None
+        old_exception = getattr(data, 'exception', None)
+        on_exception = old_exception or self.exception
+        batch: Optional[List[Handler]] = None
         for handler in handlers:
-            handler_callback, disposable = handler
-            old_exception = getattr(data, 'exception', None)
+            handler_callback, disposable, is_coroutine = handler
 
             # If the callback is a coroutine, schedule it instead of
             # running it directly
-            if iscoroutinefunction(handler_callback):
-                async def handler_callback_routine(cb: Callable[[ElementBase], Any]) -> None:
-                    try:
-                        await cb(data)
-                    except Exception as e:
-                        if old_exception:
-                            old_exception(e)
-                        else:
-                            self.exception(e)
-                asyncio.ensure_future(
-                    handler_callback_routine(handler_callback),
-                    loop=self.loop,
-                )
+            if is_coroutine:
+                if self.batch_event_coroutines:
+                    if batch is None:
+                        batch = []
+                    batch.append(handler_callback)
+                else:
+                    asyncio.ensure_future(
+                        self._run_event_coroutines(
+                            (handler_callback,), data, on_exception),
+                        loop=self.loop,
+                    )
+            elif metrics is not None or stalls is not None:
+                called = perf_counter()
+                try:
+                    handler_callback(data)
+                except Exception as e:
+                    on_exception(e)
+                called = perf_counter() - called
+                if metrics is not None:
+                    metrics.record(EVENT_HANDLER,
+                                   callable_name(handler_callback), called)
+                if stalls is not None and called > stalls.threshold:
+                    self._report_stall(stalls, 'event',
+                                       callable_name(handler_callback),
+                                       called, data)
             else:
                 try:
                     handler_callback(data)
                 except Exception as e:
-                    if old_exception:
-                        old_exception(e)
-                    else:
-                        self.exception(e)
+                    on_exception(e)
             if disposable:
                 # If the handler is disposable, we will go ahead and
                 # remove it now instead of waiting for it to be
                 # processed in the queue.
-                try:
-                    self.__event_handlers[name].remove(handler)
-                except ValueError:
-                    pass
+                self._discard_event_handler(name, handler)
+        if batch:
+            asyncio.ensure_future(
+                self._run_event_coroutines(batch, data, on_exception),
+                loop=self.loop,
+            )
+        if metrics is not None:
+            metrics.record(EVENT, name, perf_counter() - start)
+
+    async def _run_event_coroutines(self, callbacks: Iterable[Handler],
+                                    data: Any,
+                                    on_exception: Callable[[Exception], Any]) -> None:
+        """Run the coroutine handlers of an event, one after the other."""
+        for callback in callbacks:
+            metrics = self.metrics
+            if metrics is not None:
+                start = perf_counter()
+            try:
+                await callback(data)  # type: ignore[misc]
+            except Exception as e:
+                on_exception(e)
+            if metrics is not None:
+                metrics.record(EVENT_HANDLER, callable_name(callback),
+                               perf_counter() - start)
 
     def schedule(self, name: str, seconds: int, callback: Callable[..., None],
             args: Tuple[Any, ...] = tuple(),
@@ -1149,12 +1637,15 @@ class XMLStream(asyncio.BaseProtocol):
         if seconds is None:
             seconds = RESPONSE_TIMEOUT
         cb = functools.partial(callback, *args, **kwargs)
+        call_later = self.loop.call_later if self.timers is None \
+            else self.timers.call_later
+        handle: Union[TimerHandle, WheelHandle]
         if repeat:
-            handle = self.loop.call_later(seconds, self._execute_and_reschedule,
-                                          name, cb, seconds)
+            handle = call_later(seconds, self._execute_and_reschedule,
+                                name, cb, seconds)
         else:
-            handle = self.loop.call_later(seconds, self._execute_and_unschedule,
-                                          name, cb)
+            handle = call_later(seconds, self._execute_and_unschedule,
+                                name, cb)
         # Save that handle, so we can just cancel this scheduled event by
         # canceling scheduled_events[name]
         self.scheduled_events[name] = handle
@@ -1168,18 +1659,27 @@ class XMLStream(asyncio.BaseProtocol):
 
     def _safe_cb_run(self, name: str, cb: Callable[[], None]) -> None:
         log.debug('Scheduled event: %s', name)
+        stalls = self.stall_detector
+        if stalls is not None:
+            start = perf_counter()
         try:
             cb()
         except Exception as e:
             self.exception(e)
+        if stalls is not None:
+            duration = perf_counter() - start
+            if duration > stalls.threshold:
+                self._report_stall(stalls, 'scheduled', name, duration)
 
     def _execute_and_reschedule(self, name: str, cb: Callable[[], None], seconds: int) -> None:
         """Simple method that calls the given callback, and then schedule itself to
         be called after the given number of seconds.
         """
         self._safe_cb_run(name, cb)
-        handle = self.loop.call_later(seconds, self._execute_and_reschedule,
-                                      name, cb, seconds)
+        call_later = self.loop.call_later if self.timers is None \
+            else self.timers.call_later
+        handle = call_later(seconds, self._execute_and_reschedule,
+                            name, cb, seconds)
         self.scheduled_events[name] = handle
 
     def _execute_and_unschedule(self, name: str, cb: Callable[[], None]) -> None:
@@ -1212,6 +1712,7 @@ class XMLStream(asyncio.BaseProtocol):
         while not self.waiting_queue.empty():
             discarded = self.waiting_queue.get_nowait()
             log.debug('Discarded stanza: %s', discarded)
+        self._check_send_queue_low()
 
     async def _continue_slow_send(
             self,
@@ -1241,81 +1742,366 @@ class XMLStream(asyncio.BaseProtocol):
                 return
 
         if isinstance(data, StanzaBase):
-            for filter in self.__filters['out_sync']:
-                filter = cast(SyncFilter, filter)
-                data = filter(data)
-                if data is None:
-                    return
-            str_data = tostring(data.xml, xmlns=self.default_ns,
-                                stream=self, top_level=True)
-            self.send_raw(str_data)
+            chunk = self._serialize(data, True)
+            if chunk:
+                self.send_raw(chunk)
         else:
             self.send_raw(data)
 
     async def run_filters(self) -> None:
         """
         Background loop that processes stanzas to send.
+
+        Every item already waiting in the queue is processed before
+        writing, and the result is given to the transport in a single
+        call, up to :attr:`max_send_batch` bytes.
         """
+        queue = self.waiting_queue
+        item: Optional[Tuple[Union[StanzaBase, str], bool, str]]
         while True:
-            data: Optional[Union[StanzaBase, str]]
-            (data, use_filters) = await self.waiting_queue.get()
+            if not self._writing_resumed.is_set():
+                await self._writing_resumed.wait()
+            item = await queue.get()
+            batch: List[bytes] = []
+            batch_size = 0
+            processed = 0
+
+            def flush() -> None:
+                if batch:
+                    self._write_batch(batch)
+                    batch.clear()
+
+            self._send_batch = batch
             try:
-                if isinstance(data, StanzaBase):
-                    if use_filters:
-                        already_run_filters = set()
-                        for filter in self.__filters['out']:
-                            already_run_filters.add(filter)
-                            if iscoroutinefunction(filter):
-                                filter = cast(AsyncFilter, filter)
-                                task = asyncio.create_task(filter(data))  # type:ignore
-                                completed, pending = await wait(
-                                    {task},
-                                    timeout=1,
-                                )
-                                if pending:
-                                    self.__slow_tasks.append(task)
-                                    asyncio.ensure_future(
-                                        self._continue_slow_send(
-                                            task,
-                                            already_run_filters
-                                        ),
-                                        loop=self.loop,
-                                    )
-                                    raise ContinueQueue(
-                                        "Slow coroutine, rescheduling filters"
-                                    )
-                                data = task.result()
-                            elif isinstance(data, StanzaBase):
-                                filter = cast(SyncFilter, filter)
-                                data = filter(data)
-                            if data is None:
-                                raise ContinueQueue('Empty stanza')
-
-                if isinstance(data, StanzaBase):
-                    if use_filters:
-                        for filter in self.__filters['out_sync']:
-                            filter = cast(SyncFilter, filter)
-                            data = filter(data)
-                            if data is None:
-                                raise ContinueQueue('Empty stanza')
-                    if isinstance(data, StanzaBase):
-                        str_data = tostring(data.xml, xmlns=self.default_ns,
-                                            stream=self, top_level=True)
+                while item is not None:
+                    data, use_filters, _ = item
+                    item = None
+                    key = self._ordering_key(data)
+                    if key in self.__filtering:
+                        # Stay behind the stanzas to the same recipient
+                        # which are still being filtered.
+                        flush()
+                        await self._filter_in_background(data, use_filters,
+                                                         key)
+                        data = None
+                    else:
+                        processed += 1
+                    try:
+                        if data is None:
+                            chunk = None
+                        else:
+                            chunk = await self._prepare_send(data,
+                                                             use_filters,
+                                                             flush)
+                    except _DeferFilters as exc:
+                        processed -= 1
+                        await self._filter_in_background(
+                            data, use_filters, key, exc.task,
+                            exc.already_run_filters,
+                        )
+                    except ContinueQueue as exc:
+                        log.debug('Stanza in send queue not sent: %s', exc)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception:
+                        log.error('Exception raised in send queue:',
+                                  exc_info=True)
                     else:
-                        str_data = data
-                    self.send_raw(str_data)
-                elif isinstance(data, (str, bytes)):
-                    self.send_raw(data)
-            except ContinueQueue as exc:
-                log.debug('Stanza in send queue not sent: %s', exc)
+                        if chunk:
+                            batch.append(chunk)
+                            batch_size += len(chunk)
+                    if batch_size < self.max_send_batch and not queue.empty():
+                        item = queue.get_nowait()
             except asyncio.CancelledError:
                 log.debug('Send coroutine received cancel(), stopping')
+                self._send_batch = None
+                if batch and self.transport:
+                    self._write_batch(batch)
                 return
+            self._send_batch = None
+            try:
+                self._write_batch(batch)
             except Exception:
                 log.error('Exception raised in send queue:', exc_info=True)
-            self.waiting_queue.task_done()
+            for _ in range(processed):
+                queue.task_done()
+            self._check_send_queue_low()
+
+    def _check_send_queue_low(self) -> None:
+        """Release the :meth:`send_async` callers once the send queue
+        has drained to its low watermark."""
+        if not self._send_queue_ready.is_set() and \
+                self.waiting_queue.qsize() <= self.send_queue_low:
+            self._send_queue_ready.set()
+            self.event('send_queue_low')
+
+    async def _prepare_send(self, data: Union[StanzaBase, str, bytes],
+                            use_filters: bool,
+                            flush: Optional[Callable[[], None]] = None,
+                            background: bool = False,
+                            task: Optional[Task] = None,
+                            already_run_filters: Optional[Set[Filter]] = None,
+                            ) -> Optional[bytes]:
+        """
+        Run the outgoing filters on an item of the send queue, and
+        serialize it.
+
+        :param flush: Called to write what is already serialized when
+                      a coroutine filter does not complete right away.
+        :param background: If ``True``, wait for the async filters as
+                           long as needed.
+        :param task: An async filter already running on the item.
+        :param already_run_filters: The filters already applied to the
+                                    item.
+        :raises ContinueQueue: if the item must not be sent now.
+        """
+        metrics = self.metrics
+        if isinstance(data, StanzaBase):
+            if use_filters:
+                if already_run_filters is None:
+                    already_run_filters = set()
+                if task is not None:
+                    data = await task
+                    if data is None:
+                        raise ContinueQueue('Empty stanza')
+                for filter in self.__filters['out']:
+                    if filter in already_run_filters:
+                        continue
+                    already_run_filters.add(filter)
+                    if iscoroutinefunction(filter):
+                        filter = cast(AsyncFilter, filter)
+                        coro = self._timed_filter(filter, data)
+                        # Run the filter right away, and only give it
+                        # its own task if it has to wait for something.
+                        try:
+                            suspended = coro.send(None)
+                        except StopIteration as exc:
+                            data = exc.value
+                            if data is None:
+                                raise ContinueQueue('Empty stanza')
+                            continue
+                        task = asyncio.ensure_future(
+                            _Resumed(coro, suspended),
+                            loop=self.loop,
+                        )
+                        if background:
+                            data = await task
+                            if data is None:
+                                raise ContinueQueue('Empty stanza')
+                            continue
+                        if flush is not None:
+                            flush()
+                            if self.out_filter_concurrency > 0:
+                                raise _DeferFilters(task,
+                                                    already_run_filters)
+                        completed, pending = await wait(
+                            {task},
+                            timeout=1,
+                        )
+                        if pending:
+                            self.__slow_tasks.append(task)
+                            asyncio.ensure_future(
+                                self._continue_slow_send(
+                                    task,
+                                    already_run_filters
+                                ),
+                                loop=self.loop,
+                            )
+                            raise ContinueQueue(
+                                "Slow coroutine, rescheduling filters"
+                            )
+                        data = task.result()
+                    elif isinstance(data, StanzaBase):
+                        filter = cast(SyncFilter, filter)
+                        if metrics is None:
+                            data = filter(data)
+                        else:
+                            data = self._timed_sync_filter(metrics, filter,
+                                                           data)
+                    if data is None:
+                        raise ContinueQueue('Empty stanza')
+
+        if isinstance(data, StanzaBase):
+            chunk = self._serialize(data, use_filters)
+            if chunk is None:
+                raise ContinueQueue('Empty stanza')
+            return chunk
+        if isinstance(data, str):
+            return data.encode('utf-8')
+        if isinstance(data, bytes):
+            return data
+        return None
+
+    def _serialize(self, stanza: StanzaBase,
+                   use_filters: bool) -> Optional[bytes]:
+        """Run the ``out_sync`` filters on a stanza, serialize it, and
+        run the ``out_serialized`` filters on the result.
 
-    def send(self, data: Union[StanzaBase, str], use_filters: bool = True) -> None:
+        Raw data sent by those filters, like the ack requests of stream
+        management, is written right after the stanza.
+
+        :returns: The bytes to write, or ``None`` if there are none.
+        """
+        metrics = self.metrics
+        raw: List[bytes] = []
+        outer = self._send_batch
+        self._send_batch = raw
+        data: Union[StanzaBase, str, bytes, None] = stanza
+        try:
+            if use_filters:
+                for filter in self.__filters['out_sync']:
+                    filter = cast(SyncFilter, filter)
+                    if metrics is None:
+                        data = filter(data)
+                    else:
+                        data = self._timed_sync_filter(metrics, filter, data)
+                    if data is None:
+                        break
+            if isinstance(data, StanzaBase):
+                stanza = data
+                if metrics is not None:
+                    start = perf_counter()
+                # Encoding the joined text once is faster than encoding
+                # each chunk into a byte buffer.
+                chunks: List[str] = []
+                serialize(chunks.append, stanza.xml, xmlns=self.default_ns,
+                          stream=self, top_level=True)
+                data = ''.join(chunks).encode('utf-8')
+                if metrics is not None:
+                    metrics.record(STREAM, 'serialize',
+                                   perf_counter() - start)
+                if use_filters:
+                    for serialized_filter in self.__filters['out_serialized']:
+                        serialized_filter = cast(SerializedFilter,
+                                                 serialized_filter)
+                        data = serialized_filter(stanza, data)
+                        if data is None:
+                            break
+        finally:
+            self._send_batch = outer
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if not isinstance(data, bytes):
+            data = None
+        if raw:
+            return b''.join([data or b''] + raw)
+        return data
+
+    async def _timed_filter(self, filter: AsyncFilter,
+                            data: StanzaBase) -> Optional[StanzaBase]:
+        """Run an async outgoing filter and record its duration."""
+        start = self.loop.time()
+        try:
+            return await filter(data)  # type: ignore[misc]
+        finally:
+            duration = self.loop.time() - start
+            name = callable_name(filter)
+            self.filter_latency.record(name, duration)
+            if self.metrics is not None:
+                self.metrics.record(FILTER_OUT, name, duration)
+
+    @staticmethod
+    def _timed_sync_filter(metrics: StreamMetrics, filter: SyncFilter,
+                           data: StanzaBase) -> Optional[StanzaBase]:
+        """Run a sync outgoing filter and record its duration."""
+        start = perf_counter()
+        try:
+            return filter(data)
+        finally:
+            metrics.record(FILTER_OUT, callable_name(filter),
+                           perf_counter() - start)
+
+    @staticmethod
+    def _ordering_key(data: Union[StanzaBase, str]) -> str:
+        """The key of the items of the send queue which must keep their
+        relative order: the bare JID of their recipient, so that the
+        stanzas to all the resources of a contact stay in order."""
+        if isinstance(data, StanzaBase):
+            return data.xml.get('to', '').partition('/')[0]
+        return ''
+
+    async def _filter_in_background(self, data: Union[StanzaBase, str],
+                                    use_filters: bool, key: str,
+                                    task: Optional[Task] = None,
+                                    already_run_filters: Optional[Set[Filter]] = None,
+                                    ) -> None:
+        """Finish filtering and sending an item of the send queue
+        without blocking the queue, after the previous items to the
+        same recipient.
+
+        Waits while :attr:`out_filter_concurrency` items are already
+        being filtered.
+        """
+        while self.__filtering_count >= max(self.out_filter_concurrency, 1):
+            self.__filtering_slot.clear()
+            await self.__filtering_slot.wait()
+        self.__filtering_count += 1
+        previous = self.__filtering.get(key)
+        job = asyncio.ensure_future(
+            self._run_background_filters(data, use_filters, previous, task,
+                                         already_run_filters),
+            loop=self.loop,
+        )
+        self.__filtering[key] = job
+        self.__slow_tasks.append(job)
+        job.add_done_callback(
+            functools.partial(self._background_filters_done, key)
+        )
+
+    async def _run_background_filters(self, data: Union[StanzaBase, str],
+                                      use_filters: bool,
+                                      previous: Optional[Task],
+                                      task: Optional[Task],
+                                      already_run_filters: Optional[Set[Filter]],
+                                      ) -> None:
+        try:
+            if previous is not None and not previous.done():
+                await wait({previous})
+            chunk = await self._prepare_send(
+                data, use_filters, background=True, task=task,
+                already_run_filters=already_run_filters,
+            )
+            if chunk:
+                # The send queue may hold stanzas it serialized before
+                # this one, write it after them.
+                self.send_raw(chunk)
+        except ContinueQueue as exc:
+            log.debug('Stanza in send queue not sent: %s', exc)
+        except asyncio.CancelledError:
+            if task is not None:
+                task.cancel()
+            raise
+        except Exception:
+            log.error('Exception raised in send queue:', exc_info=True)
+
+    def _background_filters_done(self, key: str, job: Task) -> None:
+        # Also called when the job is cancelled before it started.
+        self.__filtering_count -= 1
+        self.__filtering_slot.set()
+        if self.__filtering.get(key) is job:
+            del self.__filtering[key]
+        try:
+            self.__slow_tasks.remove(job)
+        except ValueError:
+            pass
+        self.waiting_queue.task_done()
+
+    def _write_batch(self, batch: List[bytes]) -> None:
+        """Write serialized items to the transport in a single call."""
+        if not batch:
+            return
+        if not self.transport:
+            raise NotConnectedError()
+        if log.isEnabledFor(logging.DEBUG):
+            for chunk in batch:
+                log.debug("SEND: %s", chunk.decode('utf-8', 'replace'))
+        if len(batch) == 1:
+            self.transport.write(batch[0])
+        else:
+            self.transport.writelines(batch)
+
+    def send(self, data: Union[StanzaBase, str], use_filters: bool = True,
+             lane: Optional[str] = None) -> None:
         """A wrapper for :meth:`send_raw()` for sending stanza objects.
 
         :param data: The :class:`~slixmpp.xmlstream.stanzabase.StanzaBase`
@@ -1324,7 +2110,16 @@ class XMLStream(asyncio.BaseProtocol):
                                  applied to the given stanza data. Disabling
                                  filters is useful when resending stanzas.
                                  Defaults to ``True``.
+        :param lane: The lane of the send queue to use, one of
+                     :data:`~slixmpp.xmlstream.sendqueue.LANES`. Defaults
+                     to the ``send_lane`` of the stanza, or ``'normal'``
+                     for strings.
+        :raises ValueError: if the lane is unknown.
         """
+        if lane is None:
+            lane = getattr(data, 'send_lane', NORMAL)
+        if lane not in LANES:
+            raise ValueError('Unknown send queue lane: %r' % (lane,))
         # When not connected, allow features/starttls/etc to go through
         # but not stanzas or arbitrary payloads.
         if not self._always_send_everything and not self._session_started:
@@ -1342,10 +2137,34 @@ class XMLStream(asyncio.BaseProtocol):
                 passthrough = True
 
             if isinstance(data, (RootStanza, str)) and not passthrough:
-                self.__queued_stanzas.append((data, use_filters))
+                self.__queued_stanzas.append((data, use_filters, lane))
                 log.debug('NOT SENT: %s %s', type(data), data)
                 return
-        self.waiting_queue.put_nowait((data, use_filters))
+        self.waiting_queue.put_nowait((data, use_filters, lane))
+        if self.send_queue_high and self._send_queue_ready.is_set() and \
+                self.waiting_queue.qsize() >= self.send_queue_high:
+            self._send_queue_ready.clear()
+            self.event('send_queue_high')
+
+    async def send_async(self, data: Union[StanzaBase, str],
+                         use_filters: bool = True,
+                         lane: Optional[str] = None) -> None:
+        """Queue data to send like :meth:`send`, but first wait for
+        the send queue to drain if it has reached
+        :attr:`send_queue_high` items.
+
+        Producers sending large amounts of stanzas should use this
+        method, so that they are slowed down to the pace of the
+        connection instead of filling the memory.
+
+        :param data: The stanza to send.
+        :param bool use_filters: Indicates if outgoing filters should be
+                                 applied to the given stanza data.
+        :param lane: The lane of the send queue to use, see :meth:`send`.
+        """
+        while not self._send_queue_ready.is_set():
+            await self._send_queue_ready.wait()
+        self.send(data, use_filters, lane)
 
     def send_xml(self, data: ET.Element) -> None:
         """Send an XML object on the stream
@@ -1360,12 +2179,15 @@ class XMLStream(asyncio.BaseProtocol):
 
         :param string data: Any bytes or utf-8 string value.
         """
-        log.debug("SEND: %s", data)
         if not self.transport:
             raise NotConnectedError()
         if isinstance(data, str):
             data = data.encode('utf-8')
-        self.transport.write(data)
+        if self._send_batch is not None:
+            # Stay behind the stanzas the send queue is about to write.
+            self._send_batch.append(data)
+        else:
+            self._write_batch([data])
 
     def _build_stanza(self, xml: ET.Element,
                       default_ns: Optional[str] = None) -> StanzaBase:
@@ -1402,32 +2224,81 @@ class XMLStream(asyncio.BaseProtocol):
         :param xml: The :class:`~slixmpp.xmlstream.stanzabase.ElementBase`
                     stanza to analyze.
         """
+        stalls = self.stall_detector
+        if stalls is None:
+            self._dispatch_stanza(xml)
+            return
+        # The whole dispatch is timed too, as many handlers which are
+        # each fast enough can still block the loop for too long.
+        start = perf_counter()
+        stanza = self._dispatch_stanza(xml)
+        duration = perf_counter() - start
+        if duration > stalls.threshold:
+            name = stanza.name if stanza is not None else xml.tag
+            self._report_stall(stalls, 'stanza', name, duration,
+                               stanza)
+
+    def _dispatch_stanza(self, xml: ET.Element) -> Optional[StanzaBase]:
+        """Run the incoming filters and the handlers of a stanza.
+
+        :returns: The stanza, or ``None`` if a filter dropped it.
+        """
         # Apply any preprocessing filters.
         xml = self.incoming_filter(xml)
 
         # Convert the raw XML object into a stanza object. If no registered
         # stanza type applies, a generic StanzaBase stanza will be used.
         stanza: Optional[StanzaBase] = self._build_stanza(xml)
+        metrics = self.metrics
+        stalls = self.stall_detector
+        timed = metrics is not None or stalls is not None
         for filter in self.__filters['in']:
             if stanza is not None:
                 filter = cast(SyncFilter, filter)
+                if not timed:
+                    stanza = filter(stanza)
+                    continue
+                start = perf_counter()
+                received = stanza
                 stanza = filter(stanza)
+                duration = perf_counter() - start
+                if metrics is not None:
+                    metrics.record(FILTER_IN, callable_name(filter),
+                                   duration)
+                if stalls is not None and duration > stalls.threshold:
+                    self._report_stall(stalls, 'filter',
+                                       callable_name(filter), duration,
+                                       received)
         if stanza is None:
-            return
+            return None
 
         log.debug("RECV: %s", stanza)
 
+        # Responses to our own requests are given to the pending
+        # request before any handler.
+        handled = self.iq_tracker.resolve(stanza)
+
         # Match the stanza against registered handlers. Handlers marked
         # to run "in stream" will be executed immediately; the rest will
         # be queued.
-        handled = False
-        matched_handlers = [h for h in self.__handlers if h.match(stanza)]
+        matched_handlers = [
+            h for h in self.__handlers.candidates(stanza) if h.match(stanza)
+        ]
         for handler in matched_handlers:
             handler.prerun(stanza)
+            if timed:
+                start = perf_counter()
             try:
                 handler.run(stanza)
             except Exception as e:
                 stanza.exception(e)
+            if timed:
+                duration = perf_counter() - start
+                if metrics is not None:
+                    metrics.record(HANDLER, handler.name, duration)
+                if stalls is not None and duration > stalls.threshold:
+                    self._report_stall(stalls, 'handler', handler.name,
+                                       duration, stanza)
             if handler.check_delete():
                 self.__handlers.remove(handler)
             handled = True
@@ -1436,6 +2307,7 @@ class XMLStream(asyncio.BaseProtocol):
         # handler will be executed immediately for this case.
         if not handled:
             stanza.unhandled()
+        return stanza
 
     def exception(self, exception: Exception) -> None:
         """Process an unknown exception.
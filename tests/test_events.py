@@ -1,6 +1,9 @@
 import time
 import unittest
 from slixmpp.test import SlixTest
+from slixmpp.xmlstream.handler import Callback
+from slixmpp.xmlstream.matcher import MatchXPath
+from slixmpp.xmlstream.metrics import SlowCall, StallDetector
 
 
 class TestEvents(SlixTest):
@@ -80,5 +83,116 @@ class TestEvents(SlixTest):
         msg = "Event was not triggered the correct number of times: %s"
         self.assertTrue(happened == [True], msg % happened)
 
+    def testHandlerRemovedDuringEvent(self):
+        """Test removing a handler while its event is running."""
+        happened = []
+
+        def first(event):
+            happened.append('first')
+            self.xmpp.del_event_handler("test_event", second)
+
+        def second(event):
+            happened.append('second')
+
+        self.xmpp.add_event_handler("test_event", first)
+        self.xmpp.add_event_handler("test_event", second)
+        self.xmpp.event("test_event", {})
+        self.xmpp.event("test_event", {})
+
+        self.assertEqual(happened, ['first', 'second', 'first'])
+        self.assertEqual(self.xmpp.event_handled("test_event"), 1)
+
+    def testBatchedCoroutineEvent(self):
+        """Test running the coroutine handlers of an event in one task."""
+        happened = []
+
+        async def first(event):
+            happened.append('first')
+
+        async def second(event):
+            raise ValueError('second')
+
+        async def third(event):
+            happened.append('third')
+
+        errors = []
+        self.xmpp.exception = errors.append
+        self.xmpp.batch_event_coroutines = True
+        self.xmpp.add_event_handler("test_event", first)
+        self.xmpp.add_event_handler("test_event", second)
+        self.xmpp.add_event_handler("test_event", third, disposable=True)
+        self.xmpp.event("test_event", {})
+        self.xmpp.event("test_event", {})
+        self.wait_()
+
+        self.assertEqual(happened, ['first', 'third', 'first'])
+        self.assertEqual([str(e) for e in errors], ['second', 'second'])
+
+    def testSlowHandler(self):
+        """Test reporting handlers which block the event loop"""
+        reports = []
+
+        def slow_handler(msg):
+            time.sleep(0.02)
+
+        self.xmpp.add_event_handler('message', slow_handler)
+        self.xmpp.add_event_handler('slow_handler', reports.append)
+        detector = self.xmpp.enable_stall_detector(threshold=0.01, size=2)
+
+        self.recv("""
+          <message from="a@example.com" id="1"><body>hi</body></message>
+        """)
+        self.xmpp.schedule('slow', 0, time.sleep, args=(0.03,))
+        self.wait_()
+
+        self.assertEqual([(call.kind, call.name) for call in reports][-1],
+                         ('scheduled', 'slow'))
+        event = [call for call in reports if call.kind == 'event'][0]
+        self.assertTrue(event.name.endswith('slow_handler'))
+        self.assertGreaterEqual(event.duration, 0.02)
+        self.assertEqual(event.summary,
+                         '<message from="a@example.com" '
+                         'to="tester@localhost/resource" id="1"><body/>')
+        self.assertEqual(len(detector.recent), 2)
+        self.assertEqual(detector.worst(1)[0].name, 'slow')
+
+        self.xmpp.disable_stall_detector()
+        self.recv("""<message><body>hi</body></message>""")
+        self.assertEqual(len(detector.recent), 2)
+
+
+    def testSlowStanza(self):
+        """Test reporting stanzas whose handlers together are too slow"""
+        reports = []
+
+        def handler(msg):
+            time.sleep(0.015)
+
+        for name in ('first', 'second'):
+            self.xmpp.register_handler(Callback(
+                name, MatchXPath('{jabber:client}message'), handler))
+        self.xmpp.add_event_handler('slow_handler', reports.append)
+        self.xmpp.enable_stall_detector(threshold=0.025)
+
+        self.recv("""
+          <message from="a@example.com" id="1"><body>hi</body></message>
+        """)
+        self.wait_()
+
+        self.assertEqual([(call.kind, call.name) for call in reports],
+                         [('stanza', 'message')])
+        self.assertGreaterEqual(reports[0].duration, 0.03)
+
+    def testWorstStalls(self):
+        """Test keeping the slowest reports apart from the last ones"""
+        detector = StallDetector(size=2)
+        for duration in (0.5, 0.1, 0.3, 0.2, 0.15):
+            detector.record(SlowCall('handler', str(duration), duration))
+        self.assertEqual([call.name for call in detector.recent],
+                         ['0.2', '0.15'])
+        self.assertEqual([call.name for call in detector.worst()],
+                         ['0.5', '0.3'])
+        detector.clear()
+        self.assertEqual(detector.worst(), [])
 
 suite = unittest.TestLoader().loadTestsFromTestCase(TestEvents)
@@ -3,7 +3,7 @@ from __future__ import unicode_literals
 import unittest
 from slixmpp.test import SlixTest
 from slixmpp import JID, InvalidJID
-from slixmpp.jid import nodeprep
+from slixmpp.jid import nodeprep, resourceprep, StringprepError, set_cache_size, cache_info, DEFAULT_CACHE_SIZE
 
 
 class TestJIDClass(SlixTest):
@@ -292,5 +292,36 @@ class TestJIDClass(SlixTest):
         node = 'ᴹᴵᴷᴬᴱᴸ'
         self.assertEqual(nodeprep(node), nodeprep(nodeprep(node)))
 
+    def testJIDCache(self):
+        """Test the cache of parsed JID strings."""
+        set_cache_size(2)
+        try:
+            first = JID('user@example.com/a')
+            second = JID('user@example.com/a')
+            self.assertEqual(cache_info().hits, 1)
+            self.assertEqual(cache_info().maxsize, 2)
+            self.assertTrue(first.bare is second.bare)
+
+            second.resource = 'b'
+            self.assertEqual(first.full, 'user@example.com/a')
+            self.assertEqual(second.full, 'user@example.com/b')
+
+            second.full = 'other@example.com'
+            self.assertEqual(second.bare, 'other@example.com')
+            self.assertEqual(second.resource, '')
+        finally:
+            set_cache_size(DEFAULT_CACHE_SIZE)
+
+    def testStringprepASCII(self):
+        """Test the nodeprep and resourceprep profiles on ASCII input."""
+        self.assertEqual(nodeprep('UsEr.Name'), 'user.name')
+        self.assertEqual(resourceprep('Laptop 42'), 'Laptop 42')
+        for char in ' \'"&/:<>@\x00\x7f':
+            self.assertRaises(StringprepError, nodeprep, 'a%sb' % char)
+        for char in '\x00\x1f\x7f':
+            self.assertRaises(StringprepError, resourceprep, 'a%sb' % char)
+        self.assertEqual(nodeprep('ÄSCII'), 'äscii')
+        self.assertEqual(resourceprep('\u00adfoo'), 'foo')
+
 
 suite = unittest.TestLoader().loadTestsFromTestCase(TestJIDClass)
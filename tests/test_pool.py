@@ -0,0 +1,120 @@
+import asyncio
+import ssl
+import unittest
+
+from pathlib import Path
+
+from slixmpp import ConnectionPool
+from slixmpp.stanza import Message
+from slixmpp.xmlstream import ElementBase, register_stanza_plugin
+from slixmpp.xmlstream.resolver import DNSCache
+from slixmpp.xmlstream.timers import TimerWheel
+from slixmpp.xmlstream.xmlstream import InvalidCABundle
+
+
+class TestPool(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def testTimerWheel(self):
+        """Test that the timer wheel runs callbacks in order."""
+        timers = TimerWheel(resolution=0.01, loop=self.loop)
+        fired = []
+        timers.call_later(0.03, fired.append, 3)
+        timers.call_later(0.01, fired.append, 1)
+        handle = timers.call_later(0.02, fired.append, 2)
+        handle.cancel()
+        self.assertEqual(len(timers), 2)
+        self.loop.run_until_complete(asyncio.sleep(0.08))
+        self.assertEqual(fired, [1, 3])
+        self.assertEqual(len(timers), 0)
+
+    def testDNSCache(self):
+        """Test that concurrent and later lookups share results."""
+        cache = DNSCache(ttl=60)
+
+        async def lookups():
+            return await asyncio.gather(*(
+                cache.resolve('localhost', 5222, loop=self.loop,
+                              use_ipv6=False, use_aiodns=False)
+                for _ in range(3)
+            ))
+
+        results = self.loop.run_until_complete(lookups())
+        self.assertIn(('localhost', '127.0.0.1', 5222), results[0])
+        self.assertEqual(results, [results[0]] * 3)
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(cache.hits, 2)
+        self.assertEqual(len(cache), 1)
+
+    def testSSLSettings(self):
+        """Test that clients with other SSL settings get another context."""
+        pool = ConnectionPool(loop=self.loop)
+        first = pool.add('a@localhost', 'secret')
+        second = pool.add('b@localhost', 'secret')
+        context = first.get_ssl_context()
+        ciphers = context.get_ciphers()
+        second.ciphers = 'ECDHE+AESGCM'
+        self.assertIsNot(second.get_ssl_context(), context)
+        self.assertEqual(context.get_ciphers(), ciphers)
+        self.assertIs(first.get_ssl_context(), context)
+        self.assertEqual(len(pool.ssl_contexts), 2)
+
+        missing = [Path('/nonexistent/ca.pem')]
+        second.ca_certs = missing
+        with self.assertRaises(InvalidCABundle):
+            second.get_ssl_context()
+        self.assertIs(second.ca_certs, missing)
+
+    def testAssignedSSLContext(self):
+        """Test that an SSL context assigned to a client is kept."""
+        pool = ConnectionPool(loop=self.loop)
+        client = pool.add('a@localhost', 'secret')
+        context = ssl.create_default_context()
+        context.set_alpn_protocols(['xmpp-client'])
+        client.ssl_context = context
+        self.assertIs(client.get_ssl_context(), context)
+        self.assertEqual(context.verify_mode, ssl.CERT_REQUIRED)
+        self.assertTrue(context.check_hostname)
+        self.assertEqual(pool.ssl_contexts, {})
+
+    def testSharedSetup(self):
+        """Test that pooled clients share their resources."""
+        pool = ConnectionPool(plugins=['xep_0030'], reconnect_jitter=1.0,
+                              loop=self.loop)
+        first = pool.add('a@localhost', 'secret')
+        second = pool.add('b@localhost', 'secret')
+        self.assertIs(first.get_ssl_context(), second.get_ssl_context())
+        self.assertIs(first.timers, pool.timers)
+        self.assertIs(second.dns_cache, pool.dns_cache)
+        self.assertEqual(second.reconnect_jitter, 1.0)
+        self.assertIn('xep_0030', second.plugin)
+        self.assertIs(pool['b@localhost'], second)
+
+        second.event('session_start')
+        stats = pool.stats()
+        self.assertEqual(stats['clients'], 2)
+        self.assertEqual(stats['connected'], 0)
+        self.assertEqual(stats['events'], {'session_start': 1})
+
+        pool.remove('a@localhost')
+        self.assertEqual(len(pool), 1)
+
+    def testRegisterPluginTwice(self):
+        """Test that registering a stanza plugin again is a no-op."""
+        class Thing(ElementBase):
+            name = 'thing'
+            namespace = 'test:pool'
+            plugin_attrib = 'pool_thing'
+
+        register_stanza_plugin(Message, Thing, iterable=True)
+        size = len(Message.plugin_iterables)
+        register_stanza_plugin(Message, Thing, iterable=True)
+        self.assertEqual(len(Message.plugin_iterables), size)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestPool)
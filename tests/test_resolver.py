@@ -0,0 +1,157 @@
+import asyncio
+import socket
+import unittest
+
+from slixmpp.xmlstream.connector import interleave, race
+from slixmpp.xmlstream.resolver import DNSCache
+
+
+class Answer:
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class Resolver:
+    """A resolver answering from fixed records."""
+
+    def __init__(self, loop, srv, addresses):
+        self.loop = loop
+        self.srv = srv
+        self.addresses = addresses
+        self.queries = []
+
+    def answer(self, result):
+        future = self.loop.create_future()
+        future.set_result(result)
+        return future
+
+    def query(self, name, querytype):
+        self.queries.append((querytype, name))
+        return self.answer(self.srv)
+
+    def gethostbyname(self, host, family):
+        querytype = 'AAAA' if family == socket.AF_INET6 else 'A'
+        self.queries.append((querytype, host))
+        addresses = self.addresses.get((querytype, host), [])
+        return self.answer(Answer(name=host, aliases=[], addresses=addresses))
+
+
+class TestResolver(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def resolve(self, cache, resolver):
+        return self.loop.run_until_complete(cache.resolve(
+            'example.com', 5222, loop=self.loop, service='xmpp-client',
+            resolver=resolver,
+        ))
+
+    def testCacheTTL(self):
+        """Test that cached records are kept for their TTL."""
+        resolver = Resolver(self.loop, [
+            Answer(host='xmpp.example.com.', port=5223, priority=0,
+                   weight=0, ttl=60),
+        ], {('A', 'xmpp.example.com'): ['192.0.2.1']})
+        cache = DNSCache(ttl=300, negative_ttl=30)
+        expected = [('xmpp.example.com', '192.0.2.1', 5223)]
+        self.assertEqual(self.resolve(cache, resolver), expected)
+        self.assertEqual(self.resolve(cache, resolver), expected)
+        self.assertEqual(resolver.queries, [
+            ('SRV', '_xmpp-client._tcp.example.com'),
+            ('AAAA', 'xmpp.example.com'),
+            ('A', 'xmpp.example.com'),
+        ])
+
+        now = self.loop.time()
+        expiries = {key[0]: expiry - now
+                    for key, (expiry, _) in cache._entries.items()}
+        self.assertAlmostEqual(expiries['SRV'], 60, delta=1)
+        self.assertAlmostEqual(expiries['A'], 300, delta=1)
+        # No AAAA record: cached as a negative answer.
+        self.assertAlmostEqual(expiries['AAAA'], 30, delta=1)
+
+    def testNegativeSRV(self):
+        """Test that a missing SRV record falls back to the domain."""
+        resolver = Resolver(self.loop, [],
+                            {('A', 'example.com'): ['192.0.2.2']})
+        cache = DNSCache()
+        expected = [('example.com', '192.0.2.2', 5222)]
+        self.assertEqual(self.resolve(cache, resolver), expected)
+        self.assertEqual(self.resolve(cache, resolver), expected)
+        self.assertEqual(len(resolver.queries), 3)
+        self.assertEqual(cache.hits, 3)
+
+    def testCancelledLookup(self):
+        """Test that cancelling a lookup does not cancel the others."""
+        cache = DNSCache()
+        queries = []
+
+        async def query():
+            queries.append(None)
+            await asyncio.sleep(0.01)
+            return ['192.0.2.1'], None
+
+        async def run():
+            key = ('A', 'example.com', True)
+            a = asyncio.ensure_future(cache._lookup(key, self.loop, query))
+            b = asyncio.ensure_future(cache._lookup(key, self.loop, query))
+            await asyncio.sleep(0)
+            a.cancel()
+            self.assertEqual(await b, ['192.0.2.1'])
+            self.assertTrue(a.cancelled())
+            self.assertEqual(len(queries), 1)
+
+            # Once no lookup waits for it, the query is cancelled.
+            key = ('A', 'example.org', True)
+            c = asyncio.ensure_future(cache._lookup(key, self.loop, query))
+            await asyncio.sleep(0)
+            c.cancel()
+            await asyncio.sleep(0.02)
+            self.assertNotIn(key, cache._entries)
+            self.assertNotIn(key, cache._pending)
+
+        self.loop.run_until_complete(run())
+
+    def testInterleave(self):
+        """Test that IPv6 and IPv4 addresses alternate."""
+        records = [
+            ('a', '2001:db8::1', 1), ('a', '2001:db8::2', 1),
+            ('a', '192.0.2.1', 1), ('b', '192.0.2.2', 2),
+        ]
+        self.assertEqual(interleave(records), [
+            ('a', '2001:db8::1', 1), ('a', '192.0.2.1', 1),
+            ('a', '2001:db8::2', 1), ('b', '192.0.2.2', 2),
+        ])
+
+    def testRace(self):
+        """Test that an unreachable address does not stop the race."""
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        listener.listen()
+        closed = socket.socket()
+        closed.bind(('127.0.0.1', 0))
+        port = listener.getsockname()[1]
+        closed_port = closed.getsockname()[1]
+        closed.close()
+        try:
+            record, sock = self.loop.run_until_complete(race([
+                ('down', '127.0.0.1', closed_port),
+                ('up', '127.0.0.1', port),
+            ], loop=self.loop, delay=5))
+            sock.close()
+            self.assertEqual(record, ('up', '127.0.0.1', port))
+
+            with self.assertRaises(OSError):
+                self.loop.run_until_complete(race([
+                    ('down', '127.0.0.1', closed_port),
+                ], loop=self.loop))
+        finally:
+            listener.close()
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestResolver)
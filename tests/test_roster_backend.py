@@ -0,0 +1,67 @@
+import unittest
+
+from slixmpp.roster import SQLiteRosterBackend, WriteBehindBuffer
+from slixmpp.test import SlixTest
+
+
+class TestRosterBackend(SlixTest):
+
+    def setUp(self):
+        self.stream_start(mode='component',
+                          jid='tester.localhost',
+                          plugins=[])
+        self.backend = SQLiteRosterBackend(':memory:')
+        self.buffer = WriteBehindBuffer(self.backend, interval=60)
+        self.run_coro(self.buffer.start(self.xmpp))
+        self.xmpp.roster.set_backend(self.buffer, save=False)
+
+    def tearDown(self):
+        self.run_coro(self.buffer.stop())
+        self.run_coro(self.backend.close())
+        self.stream_close()
+
+    def testCoalescedSaves(self):
+        """Test that saves of the same item make a single write."""
+        item = self.xmpp.roster['tester.localhost']['user@localhost']
+        item['name'] = 'User'
+        item['groups'] = ['Friends']
+        item.save()
+        item['to'] = True
+        item.save()
+        self.assertEqual(self.buffer.pending, 1)
+
+        self.run_coro(self.buffer.flush())
+        self.assertEqual(self.buffer.pending, 0)
+        stored = self.run_coro(self.backend.load_all())
+        self.assertEqual(stored, {'tester.localhost': {'user@localhost': {
+            'name': 'User',
+            'groups': ['Friends'],
+            'from': False,
+            'to': True,
+            'pending_in': False,
+            'pending_out': False,
+            'whitelisted': False,
+        }}})
+
+        other = WriteBehindBuffer(self.backend)
+        self.run_coro(other.preload())
+        self.assertEqual(other.entries(None), ['tester.localhost'])
+        self.assertEqual(other.entries('tester.localhost'),
+                         ['user@localhost'])
+
+        item.save(remove=True)
+        self.run_coro(self.buffer.flush())
+        self.assertEqual(self.run_coro(self.backend.load_all()), {})
+
+    def testFlushOnDisconnect(self):
+        """Test that changes are written on disconnection."""
+        self.xmpp.roster['tester.localhost']['user@localhost'].save()
+        self.xmpp.event('disconnected')
+        self.run_coro(self.buffer._flushing)
+        self.assertEqual(self.buffer.pending, 0)
+        stored = self.run_coro(self.backend.load_all('tester.localhost'))
+        self.assertEqual(list(stored['tester.localhost']),
+                         ['user@localhost'])
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestRosterBackend)
@@ -0,0 +1,69 @@
+import asyncio
+import unittest
+
+from slixmpp.test import SlixTest
+
+
+class TestRosterBroadcast(SlixTest):
+
+    def setUp(self):
+        self.stream_start(mode='component',
+                          jid='tester.localhost',
+                          plugins=[])
+        self.node = self.xmpp.roster['tester.localhost']
+        for i in range(25):
+            self.node.add('user%d@localhost' % i, afrom=True)
+        self.node.add('stranger@localhost')
+
+    def tearDown(self):
+        self.stream_close()
+
+    def sent(self):
+        result = []
+        while True:
+            data = self.xmpp.socket.next_sent()
+            if data is None:
+                return result
+            result.append(data)
+
+    def testBroadcast(self):
+        """Test that presence is sent to subscribed contacts in chunks."""
+        item = self.node['user0@localhost']
+        self.xmpp.send_presence(pto='user0@localhost', pshow='away')
+        self.send("""
+          <presence to="user0@localhost" from="tester.localhost">
+            <show>away</show>
+          </presence>
+        """)
+        self.assertEqual(item.last_status['show'], 'away')
+
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        sent = self.run_coro(self.node.broadcast_presence(
+            rate=200, chunk_size=10, pshow='dnd'))
+        self.assertEqual(sent, 25)
+        # Two full chunks: at least 20 presences at 200 per second.
+        self.assertGreaterEqual(loop.time() - start, 0.09)
+
+        self.wait_for_send_queue()
+        sent = self.sent()
+        self.assertEqual(len(sent), 25)
+        self.assertFalse(any(b'stranger' in data for data in sent))
+
+        self.assertEqual(self.node.status_epoch, 1)
+        self.assertIsNone(item.last_status)
+        # The broadcast presences are not stored for each contact.
+        self.assertIsNone(self.node['user1@localhost']._last_status)
+        self.assertEqual(self.node.last_status['show'], 'dnd')
+
+    def testRateBelowChunkSize(self):
+        """Test that a rate lower than the chunk size limits the chunks."""
+        task = asyncio.ensure_future(self.node.broadcast_presence(
+            rate=20, chunk_size=100))
+        self.wait_()
+        self.assertEqual(self.xmpp.waiting_queue.qsize(), 20)
+        task.cancel()
+        self.wait_()
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestRosterBroadcast)
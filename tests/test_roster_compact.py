@@ -0,0 +1,94 @@
+import unittest
+
+from slixmpp import ET
+from slixmpp.roster import CompactRosterItem
+from slixmpp.test import SlixTest
+
+
+class TestCompactRoster(SlixTest):
+
+    def setUp(self):
+        self.stream_start(mode='component',
+                          jid='tester.localhost',
+                          plugins=[])
+        self.xmpp.roster.compact = True
+
+    def tearDown(self):
+        self.stream_close()
+
+    def testState(self):
+        """Test the state fields of a compact roster item."""
+        node = self.xmpp.roster['tester.localhost']
+        node.add('user@localhost', name='User', groups=['Friends'],
+                 afrom=True, pending_out=True)
+        node.add('other@localhost', groups=['Friends'])
+        item = node['user@localhost']
+        self.assertIsInstance(item, CompactRosterItem)
+        self.assertFalse(hasattr(item, '__dict__') and item.__dict__)
+        self.assertIs(item._groups, node['other@localhost']._groups)
+
+        self.assertEqual(item['groups'], ['Friends'])
+        self.assertEqual(item['subscription'], 'from')
+        self.assertTrue(item['pending_out'])
+        item['to'] = 'true'
+        item['pending_out'] = False
+        self.assertEqual(item['subscription'], 'both')
+        self.assertEqual(item._state, {
+            'from': True,
+            'to': True,
+            'pending_in': False,
+            'pending_out': False,
+            'whitelisted': False,
+            'subscription': 'both',
+            'name': 'User',
+            'groups': ['Friends'],
+        })
+        with self.assertRaises(KeyError):
+            item['unknown'] = True
+
+    def testGroupTable(self):
+        """Test that group tuples are forgotten with their last item."""
+        table = self.xmpp.roster.group_table
+        node = self.xmpp.roster['tester.localhost']
+        node.add('user@localhost', groups=['Friends'])
+        node.add('other@localhost', groups=['Friends'])
+        self.assertEqual(len(table), 1)
+
+        node['user@localhost']['groups'] = ['Work']
+        self.assertEqual(len(table), 2)
+        del node['other@localhost']
+        self.assertEqual(len(table), 1)
+        node.add('user@localhost', groups=['Friends'])
+        self.assertEqual(len(table), 1)
+        self.assertEqual(node['user@localhost']['groups'], ['Friends'])
+        del node['user@localhost']
+        self.assertEqual(len(table), 0)
+
+    def testLastStatus(self):
+        """Test that the last directed presence is kept and resent."""
+        pres = self.xmpp.make_presence(pto='user@localhost/rsrc',
+                                       pfrom='tester.localhost',
+                                       pshow='dnd', pstatus='Busy')
+        pres.xml.append(ET.fromstring(
+            '<nick xmlns="http://jabber.org/protocol/nick">Tester</nick>'))
+        pres.send()
+        self.send("""
+          <presence to="user@localhost/rsrc" from="tester.localhost">
+            <show>dnd</show>
+            <status>Busy</status>
+            <nick xmlns="http://jabber.org/protocol/nick">Tester</nick>
+          </presence>
+        """, use_values=False)
+        item = self.xmpp.roster['tester.localhost']['user@localhost']
+        self.assertIsInstance(item._last_status, tuple)
+        item.send_last_presence()
+        self.send("""
+          <presence to="user@localhost/rsrc" from="tester.localhost">
+            <show>dnd</show>
+            <status>Busy</status>
+            <nick xmlns="http://jabber.org/protocol/nick">Tester</nick>
+          </presence>
+        """, use_values=False)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestCompactRoster)
@@ -0,0 +1,93 @@
+import asyncio
+import unittest
+
+from slixmpp.roster import PresenceIndex
+from slixmpp.test import SlixTest
+
+
+class TestPresenceIndex(SlixTest):
+
+    def tearDown(self):
+        self.stream_close()
+
+    def testIndex(self):
+        """Test that received presences update the presence index."""
+        self.stream_start(plugins=[])
+        index = self.xmpp.roster.index
+        self.recv("""
+          <presence from="user@localhost/phone" to="tester@localhost">
+            <show>away</show>
+            <priority>1</priority>
+            <c xmlns="http://jabber.org/protocol/caps"
+               hash="sha-1" node="https://example.com/phone" ver="abc" />
+          </presence>
+        """)
+        self.recv("""
+          <presence from="user@localhost/desktop" to="tester@localhost">
+            <priority>5</priority>
+          </presence>
+        """)
+        self.recv("""
+          <presence from="other@localhost/desktop" to="tester@localhost">
+            <show>dnd</show>
+          </presence>
+        """)
+        self.wait_()
+
+        owner = 'tester@localhost'
+        self.assertEqual(len(index), 3)
+        self.assertTrue(index.is_online(owner, 'user@localhost'))
+        self.assertEqual(sorted(index.online(owner)), [
+            (owner, 'other@localhost'),
+            (owner, 'user@localhost'),
+        ])
+        self.assertEqual(index.best(owner, 'user@localhost')[0], 'desktop')
+        self.assertEqual(list(index.with_show('dnd')),
+                         [(owner, 'other@localhost', 'desktop')])
+        self.assertEqual(list(index.with_caps('https://example.com/phone')),
+                         [(owner, 'user@localhost', 'phone')])
+        self.assertEqual(list(index.with_priority(minimum=1)), [
+            (owner, 'user@localhost', 'desktop'),
+            (owner, 'user@localhost', 'phone'),
+        ])
+
+        self.recv("""
+          <presence from="user@localhost/desktop" to="tester@localhost"
+                    type="unavailable" />
+        """)
+        self.wait_()
+        self.assertEqual(index.best(owner, 'user@localhost')[0], 'phone')
+        self.assertEqual(list(index.with_priority(minimum=2)), [])
+
+        self.xmpp.roster.reset()
+        self.assertEqual(len(index), 0)
+        self.assertFalse(index.is_online(owner, 'user@localhost'))
+
+    def testChanges(self):
+        """Test iterating over the changes of a presence index."""
+        index = PresenceIndex(max_changes=2)
+
+        async def consume():
+            changes = index.changes()
+            waiting = asyncio.ensure_future(changes.__anext__())
+            await asyncio.sleep(0)
+            index.update('a@localhost', 'b@localhost', 'r1', show='away')
+            first = await waiting
+            index.update('a@localhost', 'b@localhost', 'r1', show='away')
+            index.update('a@localhost', 'b@localhost', 'r2')
+            index.remove('a@localhost', 'b@localhost', 'r1')
+            index.remove('a@localhost', 'b@localhost', 'r2')
+            rest = [await changes.__anext__(), await changes.__anext__()]
+            await changes.aclose()
+            return first, rest
+
+        first, rest = self.run_coro(consume())
+        self.assertEqual((first.kind, first.resource, first.presence.show),
+                         ('available', 'r1', 'away'))
+        # Only the last two changes were kept.
+        self.assertEqual([(change.kind, change.resource) for change in rest],
+                         [('unavailable', 'r1'), ('unavailable', 'r2')])
+        self.assertEqual(index._consumers, [])
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestPresenceIndex)
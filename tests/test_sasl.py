@@ -0,0 +1,72 @@
+import unittest
+from unittest import mock
+
+from slixmpp import ClientXMPP
+from slixmpp.util.sasl.mechanisms import SCRAM, scram_keys, \
+    clear_scram_keys, _scram_cache
+
+
+class TestSASL(unittest.TestCase):
+
+    def scram(self, name, cnonce, server_first, client_final, server_final):
+        mech = SCRAM(name, {
+            'username': b'user',
+            'password': b'pencil',
+            'authzid': b'',
+            'channel_binding': b'',
+        }, {'encrypted': True})
+        mech.process()
+        mech.cnonce = cnonce
+        mech.client_first_message_bare = b'n=user,r=' + cnonce
+        self.assertEqual(mech.process(server_first), client_final)
+        self.assertEqual(mech.process(server_final), b'')
+
+    def testSCRAMSHA1(self):
+        """Test the SCRAM-SHA-1 example of RFC 5802"""
+        self.scram(
+            'SCRAM-SHA-1',
+            b'fyko+d2lbbFgONRv9qkxdawL',
+            b'r=fyko+d2lbbFgONRv9qkxdawL3rfcNHYJY1ZVvWVs7j,'
+            b's=QSXCR+Q6sek8bf92,i=4096',
+            b'c=biws,r=fyko+d2lbbFgONRv9qkxdawL3rfcNHYJY1ZVvWVs7j,'
+            b'p=v0X8v3Bz2T0CJGbJQyF0X+HI4Ts=',
+            b'v=rmF9pqV8S7suAoZWja4dJRkFsKQ=',
+        )
+
+    def testSCRAMSHA256(self):
+        """Test the SCRAM-SHA-256 example of RFC 7677"""
+        self.scram(
+            'SCRAM-SHA-256',
+            b'rOprNGfwEbeRWgbNEkqO',
+            b'r=rOprNGfwEbeRWgbNEkqO%hvYDpWUa2RaTCAfuxFIlj)hNlF$k0,'
+            b's=W22ZaJ0SNY7soEsUEjb6gQ==,i=4096',
+            b'c=biws,r=rOprNGfwEbeRWgbNEkqO%hvYDpWUa2RaTCAfuxFIlj)hNlF$k0,'
+            b'p=dHzbZapWIk4jUhN+Ute9ytag9zjfMHgsqmmiz7AndVQ=',
+            b'v=6rriTRBi23WpRR/wtup+mMhUZUn/dB5nLTJRsjl95G4=',
+        )
+
+    def testSCRAMKeysCache(self):
+        """Test that SCRAM keys are only derived once"""
+        clear_scram_keys()
+        keys = scram_keys('sha512', b'pencil', b'salt', 10000)
+        self.assertEqual(len(keys[0]), 64)
+        with mock.patch('slixmpp.util.sasl.mechanisms._derive_scram_keys') \
+                as derive:
+            self.assertEqual(scram_keys('sha512', b'pencil', b'salt', 10000),
+                             keys)
+            derive.assert_not_called()
+        self.assertNotIn(b'pencil', [key[1] for key in _scram_cache])
+
+    def testSCRAMKeysClear(self):
+        """Test forgetting the SCRAM keys of a changed password"""
+        clear_scram_keys()
+        scram_keys('sha1', b'pencil', b'salt', 4096)
+        scram_keys('sha1', b'pen', b'salt', 4096)
+        xmpp = ClientXMPP('user@example.com', 'pencil')
+        xmpp.password = 'eraser'
+        self.assertEqual(len(_scram_cache), 1)
+        clear_scram_keys()
+        self.assertEqual(len(_scram_cache), 0)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestSASL)
@@ -68,5 +68,24 @@ class TestStanzaBase(SlixTest):
         self.assertTrue(stanza['payload'] == [],
             "Stanza reply did not empty stanza payload.")
 
+    def testReplyKeepsOriginal(self):
+        """Test that replies do not modify the original stanza."""
+        stanza = StanzaBase()
+        stanza['to'] = "recipient@example.com"
+        stanza['from'] = "sender@example.com"
+        stanza['id'] = "abc"
+        stanza['payload'] = ET.Element("{foo}foo")
+
+        reply = stanza.reply()
+        self.assertEqual(reply['id'], 'abc')
+        self.assertEqual(reply['payload'], [])
+        self.assertEqual(len(stanza['payload']), 1)
+
+        reply = stanza.reply(clear=False)
+        self.assertEqual(reply['id'], 'abc')
+        self.assertEqual(len(reply['payload']), 1)
+        reply['payload'][0].set('bar', 'baz')
+        self.assertEqual(stanza['payload'][0].get('bar'), None)
+
 
 suite = unittest.TestLoader().loadTestsFromTestCase(TestStanzaBase)
@@ -1248,5 +1248,105 @@ class TestElementBase(SlixTest):
           <foo xmlns="test" />
         """)
 
+    def testLazyPlugins(self):
+        """Test that plugins of lazy stanzas are built when accessed."""
+
+        class TestStanza(ElementBase):
+            name = 'foo'
+            namespace = 'foo'
+            interfaces = {'bar'}
+            _lazy = True
+
+        class TestStanzaPlugin(ElementBase):
+            name = 'plugin'
+            namespace = 'foo'
+            interfaces = {'baz'}
+            plugin_attrib = 'plug'
+
+        class TestSubStanza(ElementBase):
+            name = 'sub'
+            namespace = 'foo'
+            interfaces = {'qux'}
+            plugin_attrib = 'sub'
+
+        register_stanza_plugin(TestStanza, TestStanzaPlugin)
+        register_stanza_plugin(TestStanza, TestSubStanza, iterable=True)
+
+        xml = ET.fromstring("""
+          <foo xmlns="foo">
+            <sub qux="a" />
+            <plugin baz="c" />
+            <sub qux="b" />
+          </foo>
+        """)
+        stanza = TestStanza(xml=xml)
+
+        self.assertEqual(stanza._lazy_plugins, {'plug': xml[1]})
+        self.assertTrue('plug' in stanza.loaded_plugins)
+        self.assertEqual([sub['qux'] for sub in stanza], ['a', 'b'])
+        self.assertTrue(stanza.match('foo/plug@baz=c'))
+        self.assertEqual(stanza._lazy_plugins, {})
+        self.assertEqual(stanza['plug']['baz'], 'c')
+        self.assertTrue(stanza['plug']._lazy)
+
+        class EagerStanza(TestStanza):
+            _lazy = False
+
+        eager = EagerStanza(xml=ET.fromstring(ET.tostring(xml)))
+        stanza = TestStanza(xml=ET.fromstring(ET.tostring(xml)))
+        self.assertEqual(stanza.values, eager.values)
+
+        stanza = TestStanza(xml=ET.fromstring(ET.tostring(xml)))
+        del stanza['plug']
+        self.check(stanza, """
+          <foo xmlns="foo">
+            <sub qux="a" />
+            <sub qux="b" />
+          </foo>
+        """, use_values=False)
+
+
+    def testAccessorTable(self):
+        """Test that resolved interface accessors are reset when needed."""
+
+        class TestStanza(ElementBase):
+            name = 'foo'
+            namespace = 'foo'
+            interfaces = {'bar', 'baz'}
+
+        class TestSubStanza(TestStanza):
+            pass
+
+        class TestStanzaPlugin(ElementBase):
+            name = 'plugin'
+            namespace = 'foo'
+            interfaces = {'qux'}
+            plugin_attrib = 'plugin'
+
+        stanza = TestSubStanza()
+        stanza['bar'] = 'a'
+        self.assertEqual(stanza['plugin'], '')
+        self.assertEqual(stanza['bar|en'], 'a')
+
+        register_stanza_plugin(TestStanza, TestStanzaPlugin)
+        stanza['plugin']['qux'] = 'b'
+
+        TestStanza.sub_interfaces = {'baz'}
+        stanza['baz'] = 'c'
+
+        # Access methods patched on a class which was already used.
+        TestStanza.get_bar = lambda self: 'patched'
+        self.assertEqual(stanza['bar'], 'patched')
+        del TestStanza.get_bar
+        self.assertEqual(stanza['bar'], 'a')
+
+        self.check(stanza, """
+          <foo xmlns="foo" bar="a">
+            <plugin qux="b" />
+            <baz>c</baz>
+          </foo>
+        """)
+
+
 
 suite = unittest.TestLoader().loadTestsFromTestCase(TestElementBase)
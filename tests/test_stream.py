@@ -58,4 +58,80 @@ class TestStreamTester(SlixTest):
         self.stream_start(mode='client', skip=False)
         self.send_header(sto='localhost')
 
+    def testStanzaSizeLimit(self):
+        """Test that oversized stanzas close the stream."""
+        self.stream_start(mode='client')
+        self.xmpp.parser.max_stanza_size = 200
+
+        messages = []
+        self.xmpp.add_event_handler('message', messages.append)
+
+        self.recv("""
+          <message to="tester@localhost" from="user@localhost">
+            <body>Hi!</body>
+          </message>
+        """)
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(self.xmpp.parser.stanzas_parsed, 1)
+
+        self.recv("""
+          <message to="tester@localhost" from="user@localhost">
+            <body>%s</body>
+          </message>
+        """ % ('a' * 500))
+        self.assertEqual(len(messages), 1)
+
+        self.send("""
+          <stream:error xmlns:stream="http://etherx.jabber.org/streams">
+            <policy-violation xmlns="urn:ietf:params:xml:ns:xmpp-streams" />
+            <text xmlns="urn:ietf:params:xml:ns:xmpp-streams">Stanza larger than 200 bytes</text>
+          </stream:error>
+        """, use_values=False)
+
+    def testStanzaDepthLimit(self):
+        """Test that deeply nested stanzas close the stream."""
+        self.stream_start(mode='client')
+        self.xmpp.parser.max_depth = 2
+
+        messages = []
+        self.xmpp.add_event_handler('message', messages.append)
+
+        self.recv("""
+          <message><body>Hi!</body></message>
+        """)
+        self.recv("""
+          <message><a xmlns="foo"><b /></a></message>
+        """)
+        self.assertEqual(len(messages), 1)
+
+        self.send("""
+          <stream:error xmlns:stream="http://etherx.jabber.org/streams">
+            <policy-violation xmlns="urn:ietf:params:xml:ns:xmpp-streams" />
+            <text xmlns="urn:ietf:params:xml:ns:xmpp-streams">Stanza deeper than 2 elements</text>
+          </stream:error>
+        """, use_values=False)
+
+    def testLazyPlugins(self):
+        """Test that lazy plugins are only used when enabled."""
+        self.stream_start(mode='client', plugins=['xep_0203'])
+
+        messages = []
+        self.xmpp.add_event_handler('message', messages.append)
+
+        for lazy in (False, True):
+            self.xmpp.lazy_plugins = lazy
+            self.recv("""
+              <message from="user@localhost">
+                <body>Hi!</body>
+                <delay xmlns="urn:xmpp:delay" stamp="2002-09-10T23:08:25Z" />
+              </message>
+            """)
+        eager, lazy = messages
+        self.assertFalse(eager._lazy_plugins)
+        self.assertIn(('delay', ''), eager._plugins)
+        self.assertIn('delay', lazy._lazy_plugins)
+        self.assertNotIn(('delay', ''), lazy._plugins)
+        self.assertEqual(lazy['delay']['stamp'], eager['delay']['stamp'])
+
+
 suite = unittest.TestLoader().loadTestsFromTestCase(TestStreamTester)
@@ -1,8 +1,10 @@
+import asyncio
 import time
 
 from slixmpp import Message
 import unittest
 from slixmpp.test import SlixTest
+from slixmpp.xmlstream.sendqueue import SendQueue
 
 
 class TestFilters(SlixTest):
@@ -80,6 +82,290 @@ class TestFilters(SlixTest):
           </message>
         """)
 
+    def testOutgoingBatch(self):
+        """Test that queued stanzas are written in a single call."""
+        writes = []
+        transport = self.xmpp.transport
+        original_write = transport.write
+        original_writelines = transport.writelines
+
+        def write(data):
+            writes.append([data])
+            return original_write(data)
+
+        def writelines(list_of_data):
+            writes.append(list(list_of_data))
+            return original_writelines(list_of_data)
+
+        transport.write = write
+        transport.writelines = writelines
+
+        def out_filter(stanza):
+            stanza['body'] = stanza['body'].upper()
+            return stanza
+
+        self.xmpp.add_filter('out', out_filter)
+
+        for body in ('one', 'two', 'three'):
+            msg = self.Message()
+            msg['body'] = body
+            msg.send()
+        self.xmpp.send_raw(' ')
+
+        self.wait_for_send_queue()
+        self.assertEqual(len(writes), 2)
+        self.assertEqual(writes[0], [b' '])
+        self.assertEqual(len(writes[1]), 3)
+
+        self.xmpp.socket.next_sent()
+        for body in ('ONE', 'TWO', 'THREE'):
+            self.send("""
+              <message>
+                <body>%s</body>
+              </message>
+            """ % body)
+
+    def testAsyncFilterNoYield(self):
+        """Test that async filters completing right away do not make the
+        send queue yield to the event loop."""
+        ran = []
+        seen = []
+
+        async def out_filter(stanza):
+            seen.append(list(ran))
+            asyncio.get_event_loop().call_soon(ran.append, stanza['body'])
+            return stanza
+
+        self.xmpp.add_filter('out', out_filter)
+
+        for body in ('one', 'two', 'three'):
+            msg = self.Message()
+            msg['body'] = body
+            msg.send()
+
+        self.wait_for_send_queue()
+        self.assertEqual(seen, [[], [], []])
+        for body in ('one', 'two', 'three'):
+            self.send("""
+              <message>
+                <body>%s</body>
+              </message>
+            """ % body)
+
+    def testRawFromFilter(self):
+        """Test that raw data sent by a filter follows its stanza."""
+
+        def out_filter(stanza):
+            self.xmpp.send_raw('<r xmlns="urn:xmpp:sm:3"/>')
+            return stanza
+
+        self.xmpp.add_filter('out_sync', out_filter)
+
+        for body in ('one', 'two'):
+            msg = self.Message()
+            msg['body'] = body
+            msg.send()
+        self.wait_for_send_queue()
+
+        sent = b''
+        while True:
+            data = self.xmpp.socket.next_sent()
+            if data is None:
+                break
+            sent += data
+        self.assertEqual(sent.count(b'<r xmlns="urn:xmpp:sm:3"/>'), 2)
+        parts = sent.split(b'<r xmlns="urn:xmpp:sm:3"/>')
+        self.assertIn(b'<body>one</body>', parts[0])
+        self.assertIn(b'<body>two</body>', parts[1])
+        self.assertEqual(parts[2], b'')
+
+    def testOutgoingNoBatch(self):
+        """Test that batching can be disabled."""
+        writes = []
+        transport = self.xmpp.transport
+        original_write = transport.write
+
+        def write(data):
+            writes.append(data)
+            return original_write(data)
+
+        transport.write = write
+        self.xmpp.max_send_batch = 0
+
+        for body in ('one', 'two'):
+            msg = self.Message()
+            msg['body'] = body
+            msg.send()
+
+        self.wait_for_send_queue()
+        self.assertEqual(len(writes), 2)
+
+    def testSendQueueWatermarks(self):
+        """Test waiting for the send queue to drain."""
+        events = []
+        self.xmpp.add_event_handler('send_queue_high',
+                                    lambda _: events.append('high'))
+        self.xmpp.add_event_handler('send_queue_low',
+                                    lambda _: events.append('low'))
+        self.xmpp.send_queue_high = 3
+        self.xmpp.send_queue_low = 1
+
+        sent = []
+
+        async def producer():
+            for i in range(5):
+                msg = self.Message()
+                msg['body'] = str(i)
+                await self.xmpp.send_async(msg)
+                sent.append(i)
+
+        task = asyncio.ensure_future(producer())
+        self.wait_()
+        self.assertEqual(sent, [0, 1, 2])
+        self.assertEqual(events, ['high'])
+
+        self.xmpp.pause_writing()
+        sender = asyncio.ensure_future(self.xmpp.run_filters())
+        self.wait_()
+        self.assertEqual(sent, [0, 1, 2])
+
+        self.xmpp.resume_writing()
+        self.run_coro(task)
+        self.wait_()
+        sender.cancel()
+        self.assertEqual(sent, [0, 1, 2, 3, 4])
+        self.assertEqual(events, ['high', 'low'])
+        self.assertTrue(self.xmpp.waiting_queue.empty())
+
+    def testSlowFilterConcurrency(self):
+        """Test that a slow filter only delays stanzas to the same recipient."""
+        release = asyncio.Event()
+
+        async def slow_filter(stanza):
+            if stanza['to'] == 'slow@example.com' and stanza['body'] == '1':
+                await release.wait()
+            return stanza
+
+        self.xmpp.add_filter('out', slow_filter)
+
+        for to, body in (('slow@example.com', '1'),
+                         ('slow@example.com', '2'),
+                         ('fast@example.com', '3')):
+            msg = self.Message()
+            msg['to'] = to
+            msg['body'] = body
+            msg.send()
+
+        sender = asyncio.ensure_future(self.xmpp.run_filters())
+        self.wait_()
+        sent = self.xmpp.socket.next_sent()
+        self.assertIn('fast@example.com', sent.decode())
+        self.assertIsNone(self.xmpp.socket.next_sent())
+
+        release.set()
+        self.run_coro(self.xmpp.waiting_queue.join())
+        sender.cancel()
+        for body in ('1', '2'):
+            self.send("""
+              <message to="slow@example.com">
+                <body>%s</body>
+              </message>
+            """ % body)
+
+        stats = self.xmpp.filter_latency.snapshot()
+        name = [name for name in stats if name.endswith('slow_filter')][0]
+        self.assertEqual(stats[name]['count'], 3)
+        self.assertGreaterEqual(stats[name]['max'], stats[name]['mean'])
+
+    def testSlowFilterResources(self):
+        """Test that a slow filter delays the stanzas to every resource
+        of the same contact."""
+        release = asyncio.Event()
+
+        async def slow_filter(stanza):
+            if stanza['body'] == '1':
+                await release.wait()
+            return stanza
+
+        self.xmpp.add_filter('out', slow_filter)
+
+        for to, body in (('slow@example.com/a', '1'),
+                         ('slow@example.com/b', '2')):
+            msg = self.Message()
+            msg['to'] = to
+            msg['body'] = body
+            msg.send()
+
+        sender = asyncio.ensure_future(self.xmpp.run_filters())
+        self.wait_()
+        self.assertIsNone(self.xmpp.socket.next_sent())
+
+        release.set()
+        self.run_coro(self.xmpp.waiting_queue.join())
+        sender.cancel()
+        for to, body in (('slow@example.com/a', '1'),
+                         ('slow@example.com/b', '2')):
+            self.send("""
+              <message to="%s">
+                <body>%s</body>
+              </message>
+            """ % (to, body))
+
+    def testSendLanes(self):
+        """Test that iq stanzas are not stuck behind bulk traffic."""
+        for i in range(3):
+            msg = self.Message()
+            msg['body'] = str(i)
+            msg.send(lane='bulk')
+        iq = self.Iq()
+        iq['type'] = 'result'
+        iq['id'] = 'ping'
+        iq.send()
+
+        self.wait_for_send_queue()
+        self.send("""
+          <iq type="result" id="ping" />
+        """)
+        for i in range(3):
+            self.send("""
+              <message>
+                <body>%s</body>
+              </message>
+            """ % i)
+
+    def testUnknownLane(self):
+        """Test that sending on an unknown lane fails right away."""
+        msg = self.Message()
+        msg['body'] = 'lost'
+        with self.assertRaises(ValueError):
+            msg.send(lane='urgent')
+        self.xmpp._session_started = False
+        self.xmpp._always_send_everything = False
+        with self.assertRaises(ValueError):
+            msg.send(lane='urgent')
+        self.assertTrue(self.xmpp.waiting_queue.empty())
+
+    def testSendQueueWeights(self):
+        """Test the share of each lane of the send queue."""
+        queue = SendQueue({'iq': 3, 'normal': 2, 'bulk': 1})
+        for lane in ('bulk', 'normal', 'iq'):
+            for i in range(6):
+                queue.put_nowait((lane, i, lane))
+        queue.put_nowait(('control', 0, 'control'))
+        self.assertEqual(queue.qsize(), 19)
+        self.assertEqual(queue.lane_size('bulk'), 6)
+
+        order = [queue.get_nowait()[0] for _ in range(7)]
+        self.assertEqual(order[0], 'control')
+        self.assertEqual(order[1:].count('iq'), 3)
+        self.assertEqual(order[1:].count('normal'), 2)
+        self.assertEqual(order[1:].count('bulk'), 1)
+
+        taken = [queue.get_nowait() for _ in range(12)]
+        self.assertTrue(queue.empty())
+        for lane in ('bulk', 'normal', 'iq'):
+            self.assertEqual([i for name, i, _ in taken if name == lane],
+                             sorted(i for name, i, _ in taken if name == lane))
 
 
 suite = unittest.TestLoader().loadTestsFromTestCase(TestFilters)
@@ -1,3 +1,4 @@
+import asyncio
 import time
 import threading
 
@@ -5,6 +6,8 @@ import unittest
 from slixmpp.test import SlixTest
 from slixmpp.exceptions import IqTimeout
 from slixmpp import Callback, MatchXPath
+from slixmpp.xmlstream import offload
+from slixmpp.xmlstream.matcher import MatcherId, MatchXMLMask, StanzaPath
 
 
 class TestHandlers(SlixTest):
@@ -235,5 +238,182 @@ class TestHandlers(SlixTest):
 
       self.assertEqual(events, ['tester@slixmpp.com/test'], "Did not timeout on bad sender")
 
+    def testIndexedHandlersOrder(self):
+        """
+        Test that indexed and generic handlers matching the same
+        stanza run in registration order.
+        """
+        events = []
+
+        def make_handler(name):
+            def handler(stanza):
+                events.append(name)
+            return handler
+
+        self.xmpp.register_handler(
+            Callback('Path', StanzaPath('message@type=chat'),
+                     make_handler('path')))
+        self.xmpp.register_handler(
+            Callback('Generic', MatchXPath('{jabber:client}message'),
+                     make_handler('generic')))
+        self.xmpp.register_handler(
+            Callback('Id', MatcherId('msg-1'), make_handler('id')))
+        self.xmpp.register_handler(
+            Callback('Mask',
+                     MatchXMLMask('<message xmlns="jabber:client">'
+                                  '<test xmlns="urn:test" /></message>'),
+                     make_handler('mask')))
+        self.xmpp.register_handler(
+            Callback('Other Id', MatcherId('msg-2'), make_handler('other')))
+
+        self.recv("""
+          <message id="msg-1" type="chat">
+            <test xmlns="urn:test" />
+          </message>
+        """)
+
+        self.assertEqual(events, ['path', 'generic', 'id', 'mask'])
+
+        events.clear()
+        self.recv("""
+          <message id="msg-2" type="normal" />
+        """)
+        self.assertEqual(events, ['generic', 'other'])
+
+    def testRemoveIndexedHandler(self):
+        """Test removing an id-indexed handler by name."""
+        events = []
+
+        self.xmpp.register_handler(
+            Callback('Id', MatcherId('msg-1'), events.append))
+        self.assertTrue(self.xmpp.remove_handler('Id'))
+        self.assertFalse(self.xmpp.remove_handler('Id'))
+
+        self.recv("""
+          <message id="msg-1" />
+        """)
+        self.assertEqual(events, [])
+
+
+    def testIqTimeoutCallback(self):
+        """Test that a pending iq times out and is no longer tracked."""
+        events = []
+
+        iq = self.Iq()
+        iq['id'] = 'test-timeout'
+        iq['type'] = 'get'
+        iq['query'] = 'foo'
+        future = iq.send(timeout=0.1, timeout_callback=events.append)
+        self.assertIn('test-timeout', self.xmpp.iq_tracker)
+
+        with self.assertRaises(IqTimeout):
+            self.run_coro(future)
+        self.assertEqual(events, [iq])
+        self.assertNotIn('test-timeout', self.xmpp.iq_tracker)
+        self.assertEqual(len(self.xmpp.iq_tracker), 0)
+
+        # A late response is not given to the request anymore.
+        self.recv("""
+          <iq type="result" id="test-timeout" />
+        """)
+        self.assertEqual(events, [iq])
+
+    def testIqCoroutineCallback(self):
+        """Test that iq.send() accepts a coroutine callback."""
+        events = []
+
+        async def handle_foo(iq):
+            events.append(iq['id'])
+
+        iq = self.Iq()
+        iq['type'] = 'get'
+        iq['id'] = 'test-coro'
+        iq['query'] = 'foo'
+        iq.send(callback=handle_foo)
+
+        self.recv("""
+          <iq type="result" id="test-coro" />
+        """)
+        self.wait_()
+        self.assertEqual(events, ['test-coro'])
+
+    def testMetrics(self):
+        """Test recording the time spent in filters and handlers."""
+        exported = []
+
+        def in_filter(stanza):
+            return stanza
+
+        def message_handler(msg):
+            msg.reply('pong').send()
+
+        self.xmpp.add_filter('in', in_filter)
+        self.xmpp.add_event_handler('message', message_handler)
+        self.xmpp.register_handler(
+            Callback('Test Metrics', MatchXPath('{test}tester'),
+                     lambda stanza: None))
+
+        self.recv("""<message from="a@example.com"><body>ping</body></message>""")
+        self.assertIsNone(self.xmpp.metrics)
+
+        metrics = self.xmpp.enable_metrics()
+        metrics.add_exporter(exported.append)
+        self.recv("""<message from="a@example.com"><body>ping</body></message>""")
+        self.recv("""<tester xmlns="test" />""")
+        self.send("""
+          <message to="a@example.com"><body>pong</body></message>
+        """)
+        self.send("""
+          <message to="a@example.com"><body>pong</body></message>
+        """)
+
+        metrics.export()
+        self.assertEqual(len(exported), 1)
+        latency = exported[0]['latency']
+        self.assertEqual(latency['event']['message']['count'], 1)
+        self.assertEqual(latency['handler']['Test Metrics']['count'], 1)
+        self.assertEqual(
+            [stats['count'] for name, stats in latency['filter_in'].items()
+             if name.endswith('in_filter')], [2])
+        self.assertEqual(
+            [stats['count'] for name, stats
+             in latency['event_handler'].items()
+             if name.endswith('message_handler')], [1])
+        self.assertEqual(latency['stream']['dispatch']['count'], 2)
+        self.assertEqual(latency['stream']['serialize']['count'], 2)
+        self.assertEqual(sum(latency['stream']['parse']['histogram']), 2)
+        self.assertEqual(exported[0]['gauges']['send_queue'], 0)
+
+        self.xmpp.disable_metrics()
+        self.assertIsNone(self.xmpp.metrics)
+
+    def testOffloadedCallback(self):
+        """Test running handlers in the executor of the stream."""
+        loop = asyncio.get_event_loop()
+        results = loop.create_future()
+        threads = []
+
+        def callback_handler(stanza):
+            threads.append(threading.current_thread())
+            loop.call_soon_threadsafe(results.set_result, stanza['id'])
+
+        @offload
+        def event_handler(msg):
+            threads.append(threading.current_thread())
+            return msg['body']
+
+        self.xmpp.register_handler(
+            Callback('Test Offload', MatchXPath('{test}tester'),
+                     callback_handler, offload=True))
+        self.recv("""<tester xmlns="test" id="offloaded" />""")
+        self.assertEqual(self.run_coro(asyncio.wait_for(results, 1)),
+                         'offloaded')
+
+        msg = self.Message()
+        msg['body'] = 'hi'
+        self.assertEqual(self.run_coro(event_handler(msg)), 'hi')
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.main_thread(), threads)
+
 
 suite = unittest.TestLoader().loadTestsFromTestCase(TestHandlers)
@@ -0,0 +1,214 @@
+import asyncio
+import re
+import unittest
+from slixmpp.test import SlixTest
+from slixmpp.plugins.xep_0198 import UnackedQueue
+
+
+class TestUnackedQueue(unittest.TestCase):
+
+    def testOrder(self):
+        """Test that spilled and dropped stanzas keep their order."""
+        queue = UnackedQueue()
+        for i in range(5):
+            queue.append(b'<message id="%d"/>' % i)
+        queue.spill()
+        queue.spill()
+        queue.drop()
+        self.assertEqual(len(queue), 5)
+        self.assertEqual(queue.dropped, 1)
+        self.assertEqual(queue.spilled_count, 1)
+        self.assertEqual(queue.memory_count, 3)
+        self.assertEqual(list(queue), [None, b'<message id="1"/>',
+                                       b'<message id="2"/>',
+                                       b'<message id="3"/>',
+                                       b'<message id="4"/>'])
+        self.assertEqual(queue.popleft(), None)
+        self.assertEqual(queue.popleft(), b'<message id="1"/>')
+        self.assertEqual(queue.spilled_size, 0)
+        queue.append(b'<message id="5"/>')
+        queue.spill()
+        self.assertEqual(queue.spilled_count, 1)
+        self.assertEqual(queue.popleft(), b'<message id="2"/>')
+        self.assertEqual(queue.popleft(), b'<message id="3"/>')
+        self.assertEqual(len(queue), 2)
+        queue.close()
+
+
+    def testSteadyBacklog(self):
+        """Test that the spill file does not grow with a steady backlog."""
+        queue = UnackedQueue(compact_size=1000)
+        for i in range(10):
+            queue.append(b'<message id="%04d"/>' % i)
+            queue.spill()
+        for i in range(10, 5000):
+            queue.append(b'<message id="%04d"/>' % i)
+            queue.spill()
+            self.assertEqual(queue.popleft(),
+                             b'<message id="%04d"/>' % (i - 10))
+        queue._file.seek(0, 2)
+        self.assertLess(queue._file.tell(), 2500)
+        self.assertEqual(queue.spilled_size, 10 * 20)
+        self.assertEqual(list(queue), [b'<message id="%04d"/>' % i
+                                       for i in range(4990, 5000)])
+        queue.close()
+
+
+class TestStreamManagement(SlixTest):
+
+    def setUp(self):
+        self.stream_start(mode='client', plugins=['xep_0198'])
+        self.sm = self.xmpp['xep_0198']
+        self.sm.enabled_out = True
+
+    def tearDown(self):
+        self.stream_close()
+
+    def send_messages(self, count):
+        for i in range(count):
+            msg = self.xmpp.make_message('user@example.com',
+                                         'message %d' % i)
+            msg['id'] = str(i)
+            msg.send()
+        self.wait_for_send_queue()
+
+    def sent(self):
+        sent = b''
+        while True:
+            data = self.xmpp.socket.next_sent()
+            if data is None:
+                return sent
+            sent += data
+
+    def testSerializedQueue(self):
+        """Test that unacked stanzas are stored as sent."""
+        msg = self.xmpp.make_message('user@example.com', 'hello')
+        msg['id'] = '1'
+        msg.send()
+        self.wait_for_send_queue()
+        msg['body'] = 'changed'
+        queued = list(self.sm.unacked_queue)
+        self.assertEqual(len(queued), 1)
+        self.assertIsInstance(queued[0], bytes)
+        self.assertIn(b'<body>hello</body>', queued[0])
+        self.assertEqual(self.sent(), queued[0])
+
+    def testStanzaAcked(self):
+        """Test that acked stanzas are given back as stanza objects."""
+        acked = []
+        self.xmpp.add_event_handler('stanza_acked', acked.append)
+        self.send_messages(2)
+        self.recv("""<a xmlns="urn:xmpp:sm:3" h="1" />""")
+        self.assertEqual(len(self.sm.unacked_queue), 1)
+        self.assertEqual(len(acked), 1)
+        self.assertEqual(acked[0]['id'], '0')
+        self.assertEqual(acked[0]['body'], 'message 0')
+        self.assertEqual(acked[0]['to'], 'user@example.com')
+
+    def testQueueFull(self):
+        """Test dropping the oldest stanzas over the limit."""
+        full = []
+        acked = []
+        self.xmpp.add_event_handler('sm_queue_full', full.append)
+        self.xmpp.add_event_handler('stanza_acked', acked.append)
+        self.sm.window = 100
+        self.sm.window_counter = 100
+        self.sm.ack_pressure = None
+        self.sm.max_unacked = 2
+        self.send_messages(4)
+        queue = self.sm.unacked_queue
+        self.assertEqual(full, [queue])
+        self.assertTrue(self.sm.queue_full)
+        self.assertEqual(len(queue), 4)
+        self.assertEqual(queue.dropped, 2)
+        self.assertEqual(queue.memory_count, 2)
+        self.assertEqual(self.sent().count(b'<r xmlns="urn:xmpp:sm:3" />'),
+                         1)
+
+        self.recv("""<a xmlns="urn:xmpp:sm:3" h="3" />""")
+        self.assertEqual(len(queue), 1)
+        self.assertFalse(self.sm.queue_full)
+        # The forgotten stanzas are not given back.
+        self.assertEqual([stanza['id'] for stanza in acked], ['2'])
+
+    def testSpillToDisk(self):
+        """Test moving the oldest stanzas to the disk over the limit."""
+        self.sm.spill_to_disk = True
+        self.sm.max_unacked_bytes = 200
+        self.send_messages(5)
+        queue = self.sm.unacked_queue
+        self.assertEqual(len(queue), 5)
+        self.assertEqual(queue.dropped, 0)
+        self.assertTrue(queue.spilled_count)
+        self.assertLessEqual(queue.memory_size, 200)
+        queued = list(queue)
+        for i, data in enumerate(queued):
+            self.assertIn(b'<body>message %d</body>' % i, data)
+
+    def testResumeResend(self):
+        """Test resending the spilled and in-memory unacked stanzas."""
+        self.sm.spill_to_disk = True
+        self.sm.max_unacked = 1
+        self.sm.ack_pressure = None
+        self.send_messages(3)
+        self.sent()
+        self.recv("""<resumed xmlns="urn:xmpp:sm:3" h="1" previd="sm" />""")
+        self.wait_for_send_queue()
+        self.send("""
+          <message to="user@example.com" id="1">
+            <body>message 1</body>
+          </message>
+        """, use_values=False)
+        self.send("""
+          <message to="user@example.com" id="2">
+            <body>message 2</body>
+          </message>
+        """, use_values=False)
+        self.assertEqual(len(self.sm.unacked_queue), 2)
+
+    def testAckPressure(self):
+        """Test requesting acks more often as the queue fills up."""
+        self.sm.window = 4
+        self.sm.window_counter = 4
+        self.sm.max_unacked = 8
+        self.send_messages(8)
+        requests = self.sent().count(b'<r xmlns="urn:xmpp:sm:3" />')
+        # 1 after 4 stanzas, then 1 for each of the last 2 ones.
+        self.assertEqual(requests, 3)
+
+    def testBackgroundFilterOrder(self):
+        """Test that stanzas filtered in the background are written in
+        the order they are counted as unacked."""
+        release = asyncio.Event()
+
+        async def slow_filter(stanza):
+            if stanza['to'].bare == 'slow@example.com':
+                await release.wait()
+            elif stanza['id'] == '2':
+                release.set()
+            return stanza
+
+        self.xmpp.add_filter('out', slow_filter)
+        sender = asyncio.ensure_future(self.xmpp.run_filters())
+        for i, to in enumerate(('slow@example.com/res', 'fast@example.com',
+                                'fast@example.com', 'fast@example.com')):
+            msg = self.xmpp.make_message(to, 'message %d' % i)
+            msg['id'] = str(i)
+            msg.send()
+            if i == 0:
+                self.wait_()
+        self.run_coro(self.xmpp.waiting_queue.join())
+        sender.cancel()
+
+        def ids(data):
+            return re.findall(rb'<message [^>]*id="(\d)"', data)
+
+        queued = b''.join(self.sm.unacked_queue)
+        self.assertEqual(sorted(ids(queued)), [b'0', b'1', b'2', b'3'])
+        self.assertEqual(ids(self.sent()), ids(queued))
+
+
+suite = unittest.TestSuite([
+    unittest.TestLoader().loadTestsFromTestCase(TestUnackedQueue),
+    unittest.TestLoader().loadTestsFromTestCase(TestStreamManagement),
+])
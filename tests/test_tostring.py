@@ -1,3 +1,4 @@
+import sys
 import unittest
 from slixmpp.test import SlixTest
 from slixmpp.xmlstream.stanzabase import ET
@@ -116,4 +117,23 @@ class TestToString(SlixTest):
             "Serialization with xml:lang failed: %s" % result)
 
 
+    def testXMLEscapeUnchanged(self):
+        """Test that text without special characters is returned as is."""
+        original = 'Nothing to escape here.'
+        self.assertIs(escape(original), original)
+        self.assertIs(escape(original, use_cdata=True), original)
+
+    def testDeepNesting(self):
+        """Test serializing a tree deeper than the recursion limit."""
+        depth = sys.getrecursionlimit() + 100
+        root = ET.Element('{foo}bar')
+        current = root
+        for _ in range(depth):
+            current = ET.SubElement(current, '{foo}baz')
+        current.text = 'deep'
+        expected = '<bar xmlns="foo">' + '<baz>' * depth + 'deep'
+        expected += '</baz>' * depth + '</bar>'
+        self.assertEqual(tostring(root), expected)
+
+
 suite = unittest.TestLoader().loadTestsFromTestCase(TestToString)
@@ -32,6 +32,25 @@ class TestMediaSharing(SlixTest):
 
         self.assertEqual(plain, result)
 
+    def testEncryptDecryptBlockBoundary(self):
+        plain = b'a' * 65536
+        ciphertext, fragment = XEP_0454.encrypt(input_file=BytesIO(plain))
+        result = XEP_0454.decrypt(BytesIO(ciphertext), fragment)
+
+        self.assertEqual(plain, result)
+
+    def testDecryptFile(self):
+        self.stream_start(plugins=['xep_0454'])
+        plugin = self.xmpp['xep_0454']
+        plain = b'a' * 4096 + b'qwertyuiop'
+        ciphertext, fragment = XEP_0454.encrypt(input_file=BytesIO(plain))
+        for offload_size in (1024 * 1024, 0):
+            plugin.offload_size = offload_size
+            result = self.run_coro(
+                plugin.decrypt_file(BytesIO(ciphertext), fragment))
+            self.assertEqual(plain, result)
+        self.stream_close()
+
     def testFormatURL(self):
         url = 'https://foo.bar'
         fragment = 'a' * 88